@@ -1,12 +1,22 @@
 """
 Initialization file for the agents module.
 This module contains the developer and debugger agents for the Crew AI system.
+Exports are imported on first access so agents.models can be read without loading crewai.
 """
+import importlib
 
-from .developer_agent import DeveloperAgent
-from .debugger_agent import DebuggerAgent
+_EXPORTS = {
+    "DeveloperAgent": ".developer_agent",
+    "DebuggerAgent": ".debugger_agent"
+}
 
 __all__ = [
     "DeveloperAgent",
     "DebuggerAgent"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
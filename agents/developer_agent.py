@@ -1,16 +1,18 @@
 import os
 from textwrap import dedent
 from crewai import Agent, LLM
+from agents.models import DEVELOPER_MODEL, DEBUGGER_MODEL, SAMBANOVA_BASE_URL
 
 class DeveloperAgent:
-    def __init__(self, api_key):
+    def __init__(self, api_key, model=DEVELOPER_MODEL, temperature=None, timeout=None):
         self.api_key = api_key
 
         self.llm = LLM(
-            model="DeepSeek-V3-0324",
-            base_url="https://api.sambanova.ai/v1",
+            model=model,
+            base_url=os.getenv("SAMBANOVA_BASE_URL", SAMBANOVA_BASE_URL),
             api_key=self.api_key,
-            temperature=0.7
+            temperature=0.7 if temperature is None else temperature,
+            timeout=timeout
         )
 
     def create_developer_agent(self):
@@ -166,14 +168,15 @@ NOW OUTPUT THE COMPLETE HTML FILE.
 
 
 class DebuggerAgent:
-    def __init__(self, api_key):
+    def __init__(self, api_key, model=DEBUGGER_MODEL, temperature=None, timeout=None):
         self.api_key = api_key
 
         self.llm = LLM(
-            model="Meta-Llama-3.3-70B-Instruct",
-            base_url="https://api.sambanova.ai/v1",
+            model=model,
+            base_url=os.getenv("SAMBANOVA_BASE_URL", SAMBANOVA_BASE_URL),
             api_key=self.api_key,
-            temperature=0.2
+            temperature=0.2 if temperature is None else temperature,
+            timeout=timeout
         )
 
     def create_debugger_agent(self):
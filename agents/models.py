@@ -0,0 +1,9 @@
+"""
+Model names and endpoint shared by the agents and the model router.
+Kept apart from the agent definitions so they can be read without importing crewai.
+"""
+
+DEVELOPER_MODEL = "DeepSeek-V3-0324"
+DEBUGGER_MODEL = "Meta-Llama-3.3-70B-Instruct"
+# Overridable with the SAMBANOVA_BASE_URL env var, e.g. to point at a local fake endpoint
+SAMBANOVA_BASE_URL = "https://api.sambanova.ai/v1"
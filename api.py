@@ -5,26 +5,59 @@ Simple API for Render deployment that streams updates to Vercel app
 import os
 import sys
 import json
+import time
+import uuid
+IMPORT_STARTED = time.monotonic()
 from flask import Flask, request, Response
 from flask_cors import CORS
 from core.executor_client import ExecutorClient
+from core.options import parse_generate_request, OptionsError
+from core.jobs import QueueFull, get_job_manager
+from core.batch import Batch, BatchBusy, parse_items, check_id
+from core.metrics import CONTENT_TYPE, get_registry
+from core.warmup import get_startup
 
 app = Flask(__name__)
 CORS(app)  # Enable CORS for all routes
 
+get_startup().record("import_server", time.monotonic() - IMPORT_STARTED)
+
+@app.before_request
+def start_warm_up():
+    # Under a WSGI server that imports app directly, warm up on the first request (usually a health check)
+    get_startup().start()
+
 @app.route('/')
 def home():
     return {
         "message": "AI Developer & Debugger System API",
         "endpoints": {
             "health": "GET /health",
-            "generate": "POST /generate"
+            "ready": "GET /ready",
+            "metrics": "GET /metrics",
+            "generate": "POST /generate",
+            "generate_batch": "POST /generate/batch",
+            "job": "GET /jobs/<job_id>",
+            "job_events": "GET /jobs/<job_id>/events",
+            "cancel_job": "DELETE /jobs/<job_id>"
         }
     }
 
 @app.route('/health')
 def health():
-    return {'status': 'ok'}
+    return {'status': 'ok', 'jobs': get_job_manager().stats()}
+
+@app.route('/ready')
+def ready():
+    """
+    Readiness: 200 once crewai is loaded and the agent pool is warm, 503 until then
+    """
+    startup = get_startup()
+    return startup.to_dict(), 200 if startup.ready.is_set() else 503
+
+@app.route('/metrics')
+def metrics():
+    return Response(get_registry().render(), mimetype=CONTENT_TYPE)
 
 @app.route('/generate', methods=['POST'])
 def generate_code():
@@ -34,21 +67,24 @@ def generate_code():
     """
     try:
         # Get requirements from request
-        data = request.get_json()
-        requirements = data.get('requirements', '')
-        max_iterations = data.get('max_iterations', 5)
-        
-        if not requirements:
-            return {'error': 'No requirements provided'}, 400
+        try:
+            requirements, options = parse_generate_request(request.get_json())
+        except OptionsError as e:
+            return {'error': str(e)}, 400
         
+        # Admit the job before streaming so a full queue can be refused with 429
+        client = ExecutorClient()
+        try:
+            job, updates = client.submit(requirements, **options)
+        except QueueFull as e:
+            return {'error': 'Server is busy, try again later', 'retry_after': e.retry_after}, 429, \
+                {'Retry-After': str(e.retry_after)}
+
         # Create a generator function for streaming
         def generate():
             try:
-                # Initialize executor client
-                client = ExecutorClient()
-                
-                # Run the development process and stream updates
-                for update in client.run_development_process(requirements, max_iterations):
+                # Stream the job's updates
+                for update in updates:
                     yield update
                     
             except Exception as e:
@@ -59,11 +95,78 @@ def generate_code():
                 }
                 yield f"data: {json.dumps(error_update)}\n\n"
         
-        return Response(generate(), mimetype='text/event-stream')
+        return Response(generate(), mimetype='text/event-stream', headers={'X-Job-ID': job.id})
         
     except Exception as e:
         return {'error': str(e)}, 500
 
+@app.route('/generate/batch', methods=['POST'])
+def generate_batch():
+    """
+    Run many requirement sets, streaming NDJSON progress records
+    Expects JSON with an 'items' list; sending the same 'batch_id' again resumes the batch
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        return {'error': 'Request body must be a JSON object'}, 400
+    try:
+        items = parse_items(data.get('items') or [], data.get('defaults'))
+        batch_id = check_id(data.get('batch_id') or uuid.uuid4().hex, 'batch_id')
+        concurrency = int(data['concurrency']) if data.get('concurrency') else None
+    except OptionsError as e:
+        return {'error': str(e)}, 400
+    except (TypeError, ValueError):
+        return {'error': 'concurrency must be an integer'}, 400
+    if concurrency is not None and concurrency < 1:
+        return {'error': 'concurrency must be at least 1'}, 400
+
+    output_dir = os.path.join(os.environ.get('BATCH_DIR', '.cache/batches'), batch_id)
+    batch = Batch(ExecutorClient(), items, output_dir, concurrency=concurrency)
+    try:
+        batch.acquire()
+    except BatchBusy as e:
+        return {'error': str(e)}, 409
+
+    def generate():
+        for record in batch.run():
+            yield json.dumps(dict(record, batch_id=batch_id)) + "\n"
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={'X-Batch-ID': batch_id})
+
+@app.route('/jobs/<job_id>', methods=['GET'])
+def job_status(job_id):
+    job = get_job_manager().get(job_id)
+    if job is None:
+        return {'error': 'Unknown job'}, 404
+    return job.to_dict()
+
+@app.route('/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """
+    Stream a job's events, replaying from after Last-Event-ID before following live ones
+    """
+    jobs = get_job_manager()
+    job = jobs.get(job_id)
+    if job is None:
+        return {'error': 'Unknown job'}, 404
+    last_event_id = request.headers.get('Last-Event-ID', request.args.get('last_event_id'))
+    try:
+        start = int(last_event_id) + 1 if last_event_id not in (None, '') else 0
+    except ValueError:
+        return {'error': 'Last-Event-ID must be an integer'}, 400
+    return Response(jobs.follow(job, start), mimetype='text/event-stream', headers={'X-Job-ID': job.id})
+
+@app.route('/jobs/<job_id>', methods=['DELETE'])
+def cancel_job(job_id):
+    jobs = get_job_manager()
+    job = jobs.get(job_id)
+    if job is None:
+        return {'error': 'Unknown job'}, 404
+    jobs.cancel(job)
+    return job.to_dict()
+
 if __name__ == '__main__':
     port = int(os.environ.get('PORT', 8000))
+    # Build the shared agent pool in the background while the server binds
+    get_startup().start()
     app.run(host='0.0.0.0', port=port, threaded=True)
\ No newline at end of file
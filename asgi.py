@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+ASGI app with the same contract as api.py. Jobs go through the same job queue,
+so they are shed with 429 when it is full, checkpointed and resumable by
+Last-Event-ID. They run on the async crew engine (DevelopmentCrew.arun_crew) and
+streams follow them on the event loop, so neither holds a thread.
+Run with: uvicorn asgi:app --host 0.0.0.0 --port 8000
+"""
+import os
+import json
+import time
+import uuid
+import asyncio
+import threading
+from urllib.parse import parse_qs
+IMPORT_STARTED = time.monotonic()
+from core.executor_client import ExecutorClient
+from core.options import parse_generate_request, OptionsError
+from core.jobs import QueueFull, get_job_manager
+from core.batch import Batch, BatchBusy, parse_items, check_id
+from core.metrics import CONTENT_TYPE, get_registry
+from core.warmup import get_startup
+
+get_startup().record("import_server", time.monotonic() - IMPORT_STARTED)
+
+CORS_HEADERS = [
+    (b"access-control-allow-origin", b"*"),
+    (b"access-control-allow-methods", b"GET, POST, DELETE, OPTIONS"),
+    (b"access-control-allow-headers", b"Content-Type, Last-Event-ID"),
+]
+
+
+async def send_json(send, body, status=200, headers=()):
+    payload = json.dumps(body).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(payload)).encode())]
+                   + list(headers) + CORS_HEADERS
+    })
+    await send({"type": "http.response.body", "body": payload})
+
+
+async def read_body(receive):
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return None
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def read_json(send, receive):
+    """The request body as JSON; None after sending a 400 (or when the client went away)"""
+    body = await read_body(receive)
+    if body is None:
+        return None
+    try:
+        return json.loads(body or b"null")
+    except ValueError:
+        await send_json(send, {"error": "Request body must be valid JSON"}, 400)
+        return None
+
+
+async def iterate_in_thread(iterator):
+    """Run a blocking iterator (e.g. a batch) in a thread of its own, yielding its items on the event loop"""
+    loop = asyncio.get_running_loop()
+    items = asyncio.Queue()
+    stop = threading.Event()
+    done = object()
+
+    def pump():
+        try:
+            for item in iterator:
+                loop.call_soon_threadsafe(items.put_nowait, item)
+                if stop.is_set():
+                    break
+        except Exception as e:
+            loop.call_soon_threadsafe(items.put_nowait, e)
+        finally:
+            # Closing a generator runs its cleanup, e.g. a batch stops items that haven't started
+            getattr(iterator, "close", lambda: None)()
+            loop.call_soon_threadsafe(items.put_nowait, done)
+
+    threading.Thread(target=pump, daemon=True, name="asgi-iterate").start()
+    try:
+        while True:
+            item = await items.get()
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stop.set()
+
+
+async def stream(send, receive, chunks, content_type, headers=()):
+    """Stream byte chunks from an async iterator until it ends or the client goes away"""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", content_type), (b"cache-control", b"no-cache")] + list(headers) + CORS_HEADERS
+    })
+
+    async def produce():
+        try:
+            async for chunk in chunks:
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+        finally:
+            await chunks.aclose()
+
+    async def watch_disconnect():
+        while (await receive())["type"] != "http.disconnect":
+            pass
+
+    producer = asyncio.create_task(produce())
+    watcher = asyncio.create_task(watch_disconnect())
+    done, _ = await asyncio.wait({producer, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    if watcher in done:
+        # Client disconnected; a job carries on detached and can be followed again by its ID
+        producer.cancel()
+        await asyncio.gather(producer, return_exceptions=True)
+        return
+    watcher.cancel()
+    await send({"type": "http.response.body", "body": b""})
+
+
+async def generate(send, receive):
+    data = await read_json(send, receive)
+    if data is None:
+        return
+    try:
+        requirements, options = parse_generate_request(data)
+    except OptionsError as e:
+        await send_json(send, {"error": str(e)}, 400)
+        return
+    # Admit the job before streaming so a full queue can be refused with 429; the result
+    # cache lookup and the checkpoint write happen off the event loop
+    try:
+        job, _ = await asyncio.to_thread(ExecutorClient().submit, requirements, run_async=True, **options)
+    except QueueFull as e:
+        await send_json(send, {"error": "Server is busy, try again later", "retry_after": e.retry_after}, 429,
+                        [(b"retry-after", str(e.retry_after).encode())])
+        return
+    await stream(send, receive, get_job_manager().afollow(job), b"text/event-stream",
+                 [(b"x-job-id", job.id.encode())])
+
+
+async def generate_batch(send, receive):
+    data = await read_json(send, receive)
+    if data is None:
+        return
+    if not isinstance(data, dict):
+        await send_json(send, {"error": "Request body must be a JSON object"}, 400)
+        return
+    try:
+        items = parse_items(data.get("items") or [], data.get("defaults"))
+        batch_id = check_id(data.get("batch_id") or uuid.uuid4().hex, "batch_id")
+        concurrency = int(data["concurrency"]) if data.get("concurrency") else None
+    except OptionsError as e:
+        await send_json(send, {"error": str(e)}, 400)
+        return
+    except (TypeError, ValueError):
+        await send_json(send, {"error": "concurrency must be an integer"}, 400)
+        return
+    if concurrency is not None and concurrency < 1:
+        await send_json(send, {"error": "concurrency must be at least 1"}, 400)
+        return
+
+    output_dir = os.path.join(os.environ.get("BATCH_DIR", ".cache/batches"), batch_id)
+    batch = Batch(ExecutorClient(), items, output_dir, concurrency=concurrency)
+    try:
+        batch.acquire()
+    except BatchBusy as e:
+        await send_json(send, {"error": str(e)}, 409)
+        return
+
+    async def lines():
+        records = iterate_in_thread(batch.run())
+        try:
+            async for record in records:
+                yield (json.dumps(dict(record, batch_id=batch_id)) + "\n").encode("utf-8")
+        finally:
+            await records.aclose()
+
+    await stream(send, receive, lines(), b"application/x-ndjson", [(b"x-batch-id", batch_id.encode())])
+
+
+async def job_route(scope, send, receive, job_id, events):
+    jobs = get_job_manager()
+    job = jobs.get(job_id)
+    if job is None:
+        await send_json(send, {"error": "Unknown job"}, 404)
+    elif events and scope["method"] == "GET":
+        # Replay from after Last-Event-ID before following live events
+        headers = dict(scope["headers"])
+        last_event_id = headers.get(b"last-event-id", b"").decode("latin-1")
+        if not last_event_id:
+            last_event_id = parse_qs(scope.get("query_string", b"").decode("latin-1")).get("last_event_id", [""])[0]
+        try:
+            start = int(last_event_id) + 1 if last_event_id else 0
+        except ValueError:
+            await send_json(send, {"error": "Last-Event-ID must be an integer"}, 400)
+            return
+        await stream(send, receive, jobs.afollow(job, start), b"text/event-stream", [(b"x-job-id", job.id.encode())])
+    elif not events and scope["method"] == "GET":
+        await send_json(send, job.to_dict())
+    elif not events and scope["method"] == "DELETE":
+        jobs.cancel(job)
+        await send_json(send, job.to_dict())
+    else:
+        await send_json(send, {"error": "Not found"}, 404)
+
+
+async def lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            # Build the shared agent pool and resume unfinished jobs in the background; /ready reports when it's done
+            get_startup().start()
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+    if scope["type"] != "http":
+        return
+
+    path, method = scope["path"], scope["method"]
+    if method == "OPTIONS":
+        await send({"type": "http.response.start", "status": 204, "headers": CORS_HEADERS})
+        await send({"type": "http.response.body", "body": b""})
+    elif path == "/" and method == "GET":
+        await send_json(send, {
+            "message": "AI Developer & Debugger System API",
+            "endpoints": {
+                "health": "GET /health",
+                "ready": "GET /ready",
+                "metrics": "GET /metrics",
+                "generate": "POST /generate",
+                "generate_batch": "POST /generate/batch",
+                "job": "GET /jobs/<job_id>",
+                "job_events": "GET /jobs/<job_id>/events",
+                "cancel_job": "DELETE /jobs/<job_id>"
+            }
+        })
+    elif path == "/health" and method == "GET":
+        await send_json(send, {"status": "ok", "jobs": get_job_manager().stats()})
+    elif path == "/ready" and method == "GET":
+        startup = get_startup()
+        await send_json(send, startup.to_dict(), 200 if startup.ready.is_set() else 503)
+    elif path == "/metrics" and method == "GET":
+        payload = get_registry().render().encode("utf-8")
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", CONTENT_TYPE.encode()), (b"content-length", str(len(payload)).encode())] + CORS_HEADERS
+        })
+        await send({"type": "http.response.body", "body": payload})
+    elif path == "/generate" and method == "POST":
+        await generate(send, receive)
+    elif path == "/generate/batch" and method == "POST":
+        await generate_batch(send, receive)
+    elif path.startswith("/jobs/"):
+        job_id, _, rest = path[len("/jobs/"):].partition("/")
+        if rest not in ("", "events"):
+            await send_json(send, {"error": "Not found"}, 404)
+            return
+        await job_route(scope, send, receive, job_id, rest == "events")
+    else:
+        await send_json(send, {"error": "Not found"}, 404)
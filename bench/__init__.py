@@ -0,0 +1 @@
+"""Offline benchmarks: a fake OpenAI-compatible LLM server and a load driver for /generate"""
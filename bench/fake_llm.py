@@ -0,0 +1,280 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions endpoint.
+Answers developer prompts with a valid landing page, debugger prompts with a
+scripted verdict and deployment prompts with the code, after a configurable
+time to first token and at a configurable token rate, streaming or not.
+Point the agents at it with SAMBANOVA_BASE_URL=http://127.0.0.1:<port>/v1.
+
+    python -m bench.fake_llm --port 8900 --latency lognormal:0.8,0.5 --tokens-per-second 300 --verdicts reject,approve
+
+Verdicts are scripted per job: prompts that carry a "[bench-job N]" marker
+(added by bench/load.py) get their own position in the script, so with
+"reject,approve" every job is rejected once and approved on its second review.
+Other prompts share one position. Each developer call for a job returns a new
+revision of the page, and each rejection names a different problem, so the
+crew's convergence detection (core/convergence.py) sees the loop progressing.
+"""
+import re
+import json
+import math
+import time
+import uuid
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+JOB_MARKER = re.compile(r"\[bench-job (\d+)\]|<!-- bench-job (\d+) -->")
+
+# Roughly 4 characters per token, as for real tokenizers on code
+CHARS_PER_TOKEN = 4
+
+
+def parse_distribution(spec):
+    """
+    A sampler for a latency spec in seconds:
+    fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(value) for value in args.split(",") if value]
+    if kind == "fixed" and len(values) == 1:
+        return lambda: values[0]
+    if kind == "uniform" and len(values) == 2:
+        return lambda: random.uniform(*values)
+    if kind == "normal" and len(values) == 2:
+        return lambda: max(0.0, random.gauss(*values))
+    if kind == "lognormal" and len(values) == 2:
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    raise ValueError(f"Invalid latency distribution: {spec}")
+
+
+SECTION = (
+    "<section id=\"section-{n}\">\n<h2>Section {n}</h2>\n"
+    "<div class=\"card\"><h3>Feature</h3><p>Fast, simple and reliable landing pages for every product.</p></div>\n"
+    "<div class=\"card\"><h3>Pricing</h3><p>Start free, upgrade when your traffic grows.</p></div>\n"
+    "</section>\n"
+)
+
+
+REJECTIONS = (
+    "The hero section is missing a call to action button.",
+    "The pricing cards are not responsive on narrow screens.",
+    "The signup form has no email validation.",
+    "The footer links have no accessible names.",
+)
+
+
+def landing_page(size_kb, job=None, revision=0):
+    """A page that passes core/validator.py, padded with sections to about size_kb"""
+    marker = f"<!-- bench-job {job} -->\n" if job is not None else ""
+    marker += f"<!-- revision {revision} -->\n"
+    body = []
+    while sum(len(part) for part in body) < size_kb * 1024:
+        body.append(SECTION.replace("{n}", str(len(body) + 1)))
+    return (
+        "<!DOCTYPE html>\n<html lang=\"en\">\n<head>\n<meta charset=\"UTF-8\">\n"
+        "<meta name=\"viewport\" content=\"width=device-width, initial-scale=1.0\">\n"
+        "<title>Benchmark</title>\n<style>\nbody { font-family: Inter, sans-serif; margin: 0; }\n"
+        ".card { padding: 1rem; border-radius: 8px; }\n</style>\n</head>\n<body>\n" + marker +
+        "<nav><a href=\"#top\">Home</a></nav>\n" + "".join(body) +
+        "<footer><p>Footer</p></footer>\n<script>\ndocument.querySelectorAll('.card').forEach(function (card) { card.dataset.ready = '1'; });\n"
+        "</script>\n</body>\n</html>"
+    )
+
+
+class Counter:
+    """Per-job call counts"""
+
+    def __init__(self):
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def next(self, job):
+        """This job's count before the call, starting at 0"""
+        with self._lock:
+            count = self._counts.get(job, 0)
+            self._counts[job] = count + 1
+        return count
+
+
+class Script:
+    """Per-job positions in the verdict script"""
+
+    def __init__(self, verdicts):
+        self.verdicts = verdicts
+        self._positions = Counter()
+
+    def next(self, job):
+        """The verdict for this job's next review and its position in the script"""
+        position = self._positions.next(job)
+        return self.verdicts[min(position, len(self.verdicts) - 1)], position
+
+
+class FakeLLM:
+    def __init__(self, latency="fixed:0.2", tokens_per_second=200.0, verdicts=("approve",), page_kb=8,
+                 error_rate=0.0, error_status=429, seed=None):
+        self.latency = parse_distribution(latency)
+        self.tokens_per_second = tokens_per_second
+        self.script = Script(list(verdicts))
+        self.revisions = Counter()
+        self.page_kb = page_kb
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def respond(self, prompt):
+        """The completion text for a prompt"""
+        match = JOB_MARKER.search(prompt)
+        job = (match.group(1) or match.group(2)) if match else None
+        if "-11 if the code is approved" in prompt:
+            verdict, position = self.script.next(job)
+            if verdict == "approve":
+                return "The page is complete and well structured.\n-11"
+            return REJECTIONS[position % len(REJECTIONS)] + "\n-00"
+        # Developer prompts (including fix-ups; patch repairs fall back to full regeneration) and deployment prompts
+        return landing_page(self.page_kb, job, self.revisions.next(job))
+
+    def fail(self):
+        """Whether to answer this request with an injected error"""
+        with self._lock:
+            return self.error_rate and self.random.random() < self.error_rate
+
+    def generation_time(self, text):
+        if not self.tokens_per_second:
+            return 0.0
+        return len(text) / CHARS_PER_TOKEN / self.tokens_per_second
+
+
+def completion_id():
+    return "chatcmpl-" + uuid.uuid4().hex[:24]
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    fake = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body, headers=()):
+        payload = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def do_GET(self):
+        if self.path.rstrip("/").endswith("/models"):
+            self.send_json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        else:
+            self.send_json(404, {"error": {"message": "Not found"}})
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"message": "Not found"}})
+            return
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.fake.fail():
+            self.send_json(self.fake.error_status, {"error": {"message": "Injected failure"}}, [("Retry-After", "1")])
+            return
+        prompt = "\n".join(str(message.get("content", "")) for message in body.get("messages", []))
+        text = self.fake.respond(prompt)
+        model = body.get("model", "fake")
+        usage = {
+            "prompt_tokens": len(prompt) // CHARS_PER_TOKEN,
+            "completion_tokens": len(text) // CHARS_PER_TOKEN,
+            "total_tokens": (len(prompt) + len(text)) // CHARS_PER_TOKEN
+        }
+        time.sleep(self.fake.latency())
+        if body.get("stream"):
+            self.stream(text, model, usage, (body.get("stream_options") or {}).get("include_usage"))
+            return
+        time.sleep(self.fake.generation_time(text))
+        self.send_json(200, {
+            "id": completion_id(),
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": text}, "finish_reason": "stop"}],
+            "usage": usage
+        })
+
+    def stream(self, text, model, usage, include_usage):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        chunk_id = completion_id()
+
+        def send(choices, **fields):
+            chunk = dict({"id": chunk_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                          "model": model, "choices": choices}, **fields)
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        # ~8 tokens per chunk, paced at the token rate
+        step = 8 * CHARS_PER_TOKEN
+        for start in range(0, len(text), step):
+            piece = text[start:start + step]
+            send([{"index": 0, "delta": {"content": piece}, "finish_reason": None}])
+            time.sleep(self.fake.generation_time(piece))
+        send([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if include_usage:
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+        self.close_connection = True
+
+
+def serve(fake, host="127.0.0.1", port=8900):
+    """Start the server on a background thread; returns it (server.server_port has the bound port)"""
+    handler = type("FakeLLMHandler", (Handler,), {"fake": fake})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True, name="fake-llm").start()
+    return server
+
+
+def add_arguments(parser):
+    parser.add_argument("--latency", default="fixed:0.2",
+                        help="time to first token: fixed:S, uniform:LOW,HIGH, normal:MEAN,SD or lognormal:MEDIAN,SIGMA")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="generation speed (0 = instant)")
+    parser.add_argument("--verdicts", default="approve",
+                        help="comma-separated debugger verdicts per job (approve/reject); the last one repeats")
+    parser.add_argument("--page-kb", type=float, default=8, help="size of generated pages")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of requests answered with an error")
+    parser.add_argument("--error-status", type=int, default=429)
+    parser.add_argument("--seed", type=int)
+
+
+def from_arguments(args):
+    verdicts = [verdict.strip() for verdict in args.verdicts.split(",") if verdict.strip()]
+    for verdict in verdicts:
+        if verdict not in ("approve", "reject"):
+            raise ValueError(f"Unknown verdict: {verdict}")
+    return FakeLLM(args.latency, args.tokens_per_second, verdicts or ["approve"], args.page_kb,
+                   args.error_rate, args.error_status, args.seed)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible chat completions server")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    add_arguments(parser)
+    args = parser.parse_args()
+    server = serve(from_arguments(args), args.host, args.port)
+    print(f"Fake LLM listening on http://{args.host}:{server.server_port}/v1")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
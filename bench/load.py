@@ -0,0 +1,324 @@
+"""
+Load driver for the /generate endpoint.
+Fires requests at a fixed concurrency and reports throughput, time to first
+event, completion latency percentiles and server memory per open stream.
+With --serve it also starts the fake LLM (bench/fake_llm.py) and the server
+under test pointed at it, so no model quota is used:
+
+    python -m bench.load --serve api --concurrency 8 --requests 32 --latency lognormal:0.5,0.4
+    python -m bench.load --serve asgi --output asgi.json --baseline api.json
+
+--baseline compares against an earlier --output report and exits non-zero when
+p95 latency, p95 time to first event or memory per stream got worse (or
+throughput dropped) by more than --tolerance.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import argparse
+import threading
+import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+import httpx
+from bench.fake_llm import serve, add_arguments, from_arguments
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Report fields and whether a larger value is worse, for --baseline comparisons
+COMPARED = {
+    "throughput": False,
+    "latency_p95": True,
+    "first_event_p95": True,
+    "memory_per_stream_mb": True,
+}
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB (Linux only; None elsewhere)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class MemorySampler:
+    """Samples a process's RSS alongside the number of open streams"""
+
+    def __init__(self, pid, interval=0.1):
+        self.pid = pid
+        self.interval = interval
+        self.streams = 0
+        self.baseline = rss_mb(pid) if pid else None
+        self.peak = self.baseline
+        self.peak_streams = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def opened(self):
+        with self._lock:
+            self.streams += 1
+            self.peak_streams = max(self.peak_streams, self.streams)
+
+    def closed(self):
+        with self._lock:
+            self.streams -= 1
+
+    def run(self):
+        while not self._stop.wait(self.interval):
+            rss = rss_mb(self.pid)
+            if rss is not None:
+                self.peak = max(self.peak or 0, rss)
+
+    def start(self):
+        if self.pid:
+            threading.Thread(target=self.run, daemon=True, name="memory-sampler").start()
+
+    def stop(self):
+        self._stop.set()
+
+    def per_stream(self):
+        if self.baseline is None or self.peak is None or not self.peak_streams:
+            return None
+        return (self.peak - self.baseline) / self.peak_streams
+
+
+def outcome(result):
+    """approved, or the status of an unapproved result (e.g. not_converging)"""
+    if isinstance(result, dict) and "status" not in result:
+        return "approved"
+    return result.get("status", "unapproved") if isinstance(result, dict) else "unapproved"
+
+
+def run_request(client, url, body, sampler):
+    """POST one job and follow its stream; returns a result dict"""
+    started = time.perf_counter()
+    result = {"status": None, "outcome": None, "http_status": None, "first_event": None, "latency": None, "events": 0}
+    sampler.opened()
+    try:
+        with client.stream("POST", url + "/generate", json=body) as response:
+            result["http_status"] = response.status_code
+            if response.status_code != 200:
+                result["status"] = "rejected" if response.status_code == 429 else "http_error"
+                return result
+            for line in response.iter_lines():
+                if not line.startswith("data: "):
+                    continue
+                if result["first_event"] is None:
+                    result["first_event"] = time.perf_counter() - started
+                result["events"] += 1
+                try:
+                    event = json.loads(line[len("data: "):])
+                except ValueError:
+                    continue
+                result["status"] = event.get("status")
+                if result["status"] == "completed":
+                    result["outcome"] = outcome(event.get("result"))
+        result["latency"] = time.perf_counter() - started
+    except httpx.HTTPError as e:
+        result["status"] = "connection_error"
+        result["error"] = str(e)
+    finally:
+        sampler.closed()
+    return result
+
+
+def run_load(url, concurrency, requests, requirements, options, timeout, sampler):
+    client = httpx.Client(timeout=httpx.Timeout(timeout, connect=10.0),
+                          limits=httpx.Limits(max_connections=concurrency * 2))
+    bodies = [
+        # The marker keeps jobs distinct (no single-flight joins) and scripts the fake LLM per job
+        dict({"requirements": f"{requirements} [bench-job {n}]", "cache": False}, **options)
+        for n in range(requests)
+    ]
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            results = list(executor.map(lambda body: run_request(client, url, body, sampler), bodies))
+    finally:
+        sampler.stop()
+        client.close()
+    return results, time.perf_counter() - started
+
+
+def summarize(results, elapsed, sampler, config):
+    completed = [result for result in results if result["status"] == "completed"]
+    latencies = [result["latency"] for result in completed]
+    first_events = [result["first_event"] for result in results if result["first_event"] is not None]
+    statuses, outcomes = {}, {}
+    for result in results:
+        statuses[result["status"]] = statuses.get(result["status"], 0) + 1
+    # Completed jobs may have stopped without approval (max_iterations_reached, not_converging)
+    for result in completed:
+        outcomes[result["outcome"]] = outcomes.get(result["outcome"], 0) + 1
+    report = {
+        "config": config,
+        "requests": len(results),
+        "completed": len(completed),
+        "approved": outcomes.get("approved", 0),
+        "statuses": statuses,
+        "outcomes": outcomes,
+        "elapsed": round(elapsed, 3),
+        "throughput": round(len(completed) / elapsed, 4) if elapsed else None,
+        "events_per_job": round(sum(result["events"] for result in completed) / len(completed), 1) if completed else None,
+        "peak_rss_mb": round(sampler.peak, 1) if sampler.peak is not None else None,
+        "peak_streams": sampler.peak_streams,
+        "memory_per_stream_mb": round(sampler.per_stream(), 3) if sampler.per_stream() is not None else None,
+    }
+    for name, values in (("latency", latencies), ("first_event", first_events)):
+        for q in (50, 95, 99):
+            value = percentile(values, q)
+            report[f"{name}_p{q}"] = round(value, 4) if value is not None else None
+    return report
+
+
+def compare(report, baseline, tolerance):
+    """Regressions against a baseline report, as messages"""
+    regressions = []
+    for name, larger_is_worse in COMPARED.items():
+        old, new = baseline.get(name), report.get(name)
+        if not old or new is None:
+            continue
+        change = (new - old) / old
+        if (change > tolerance) if larger_is_worse else (change < -tolerance):
+            regressions.append(f"{name}: {old} -> {new} ({change:+.0%})")
+    return regressions
+
+
+def wait_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+        try:
+            if httpx.get(url + "/ready", timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError(f"Server not ready after {timeout}s")
+
+
+def start_server(mode, port, llm_url, extra_env, state_dir, log=None):
+    # Checkpoints and traces go to a directory of the run's own, so bench jobs are never
+    # resumed by (and never resume jobs of) a real server sharing .cache
+    env = dict(os.environ, SAMBANOVA_BASE_URL=llm_url, SAMBANOVA_API_KEY="bench", RESULT_CACHE="0", PORT=str(port),
+               CHECKPOINT_DB=os.path.join(state_dir, "jobs.sqlite3"),
+               TRACE_FILE=os.path.join(state_dir, "traces.jsonl"))
+    env.update(extra_env)
+    if mode == "api":
+        command = [sys.executable, "api.py"]
+    else:
+        command = [sys.executable, "-m", "uvicorn", "asgi:app", "--host", "127.0.0.1", "--port", str(port)]
+    output = open(log, "w") if log else subprocess.DEVNULL
+    return subprocess.Popen(command, cwd=ROOT, env=env, stdout=output, stderr=subprocess.STDOUT)
+
+
+def parse_pairs(pairs, values_as_json=False):
+    parsed = {}
+    for pair in pairs or []:
+        name, _, value = pair.partition("=")
+        if values_as_json:
+            try:
+                value = json.loads(value)
+            except ValueError:
+                pass
+        parsed[name] = value
+    return parsed
+
+
+def print_report(report):
+    print(f"requests     {report['requests']} ({report['statuses']})")
+    print(f"completed    {report['completed']}, {report['approved']} approved ({report['outcomes']})")
+    print(f"elapsed      {report['elapsed']}s, throughput {report['throughput']} jobs/s")
+    print(f"first event  p50 {report['first_event_p50']}s  p95 {report['first_event_p95']}s  p99 {report['first_event_p99']}s")
+    print(f"latency      p50 {report['latency_p50']}s  p95 {report['latency_p95']}s  p99 {report['latency_p99']}s")
+    print(f"memory       peak {report['peak_rss_mb']} MB, {report['memory_per_stream_mb']} MB per stream "
+          f"({report['peak_streams']} streams)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the /generate endpoint")
+    parser.add_argument("--url", default="http://127.0.0.1:8000", help="server under test (ignored with --serve)")
+    parser.add_argument("--serve", choices=["api", "asgi"], help="start the fake LLM and this server locally")
+    parser.add_argument("--port", type=int, default=8765, help="port for the server started with --serve")
+    parser.add_argument("--server-pid", type=int, help="sample this process's memory when not using --serve")
+    parser.add_argument("--env", action="append", help="extra KEY=VALUE for the server started with --serve")
+    parser.add_argument("--server-log", help="write the output of the server started with --serve here")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--requirements", default="Create a landing page for a coffee shop")
+    parser.add_argument("--option", action="append", help="extra /generate field as KEY=JSON, e.g. review_mode=\"llm\"")
+    parser.add_argument("--timeout", type=float, default=600)
+    parser.add_argument("--output", help="write the JSON report here")
+    parser.add_argument("--baseline", help="compare against an earlier JSON report")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression (0.2 = 20%%)")
+    add_arguments(parser)
+    args = parser.parse_args()
+
+    url, server, llm, state_dir = args.url.rstrip("/"), None, None, None
+    pid = args.server_pid
+    try:
+        if args.serve:
+            llm = serve(from_arguments(args), port=0)
+            llm_url = f"http://127.0.0.1:{llm.server_port}/v1"
+            url = f"http://127.0.0.1:{args.port}"
+            state_dir = tempfile.mkdtemp(prefix="bench-")
+            server = start_server(args.serve, args.port, llm_url, parse_pairs(args.env), state_dir, args.server_log)
+            wait_ready(url, server)
+            pid = server.pid
+        config = {
+            "serve": args.serve,
+            "concurrency": args.concurrency,
+            "options": parse_pairs(args.option, values_as_json=True),
+            "latency": args.latency,
+            "tokens_per_second": args.tokens_per_second,
+            "verdicts": args.verdicts,
+            "page_kb": args.page_kb,
+        }
+        sampler = MemorySampler(pid)
+        results, elapsed = run_load(url, args.concurrency, args.requests, args.requirements, config["options"],
+                                    args.timeout, sampler)
+    finally:
+        if server is not None:
+            server.send_signal(signal.SIGTERM)
+            try:
+                server.wait(10)
+            except subprocess.TimeoutExpired:
+                server.kill()
+        if llm is not None:
+            llm.shutdown()
+        if state_dir is not None:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+    report = summarize(results, elapsed, sampler, config)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,22 @@
 """
 Initialization file for the core module.
 This module contains the core functionality for the Crew AI system including the crew configuration and executor client.
+Exports are imported on first access so importing a light submodule (e.g. core.options) doesn't load crewai.
 """
+import importlib
 
-from .crew import DevelopmentCrew
-from .executor_client import ExecutorClient
+_EXPORTS = {
+    "DevelopmentCrew": ".crew",
+    "ExecutorClient": ".executor_client"
+}
 
 __all__ = [
     "DevelopmentCrew",
     "ExecutorClient"
-]
\ No newline at end of file
+]
+
+
+def __getattr__(name):
+    if name not in _EXPORTS:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    return getattr(importlib.import_module(_EXPORTS[name], __name__), name)
@@ -0,0 +1,278 @@
+"""
+Batch generation.
+Runs many requirement sets through the job queue, writes each item's page and
+final event to an output directory and reports progress as one JSON record
+per line (NDJSON). Batch items share a cap on how many run at once
+(BATCH_CONCURRENCY), so batches can't take every job worker from interactive
+requests; like the job queue the cap is per process. Finished items are
+appended to the directory's manifest.jsonl; running a batch again into the
+same directory skips them and only runs items that are new or failed. A
+lock file in the directory keeps the same batch from running twice at once,
+even from two processes.
+"""
+import os
+import re
+import json
+import time
+import fcntl
+import queue
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.options import parse_generate_request, OptionsError
+from core.jobs import QueueFull, job_key
+
+# Item and batch IDs name directories, so keep them to safe characters
+SAFE_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{0,127}$")
+
+# Item outcomes that count as finished when a batch is resumed; failed items run again
+FINISHED = ("approved", "unapproved")
+
+MANIFEST = "manifest.jsonl"
+LOCK = ".lock"
+
+
+class BatchBusy(Exception):
+    """The batch is already running, in this process or another one"""
+
+
+class BatchItem:
+    def __init__(self, item_id, requirements, options):
+        self.id = item_id
+        self.requirements = requirements
+        self.options = options
+
+
+def check_id(value, what):
+    value = str(value)
+    if not SAFE_ID.match(value):
+        raise OptionsError(f"{what} may only contain letters, digits, '.', '_' and '-'")
+    return value
+
+
+def parse_items(records, defaults=None):
+    """
+    Validate batch items: objects with the /generate fields (defaults fill in missing ones) and an
+    optional id. Items without an id are named after their requirements and options.
+    Raises OptionsError naming the first invalid item.
+    """
+    if not isinstance(records, list):
+        raise OptionsError("Batch items must be a list")
+    if defaults is not None and not isinstance(defaults, dict):
+        raise OptionsError("Batch defaults must be a JSON object")
+    items = []
+    seen = set()
+    for n, record in enumerate(records, 1):
+        if not isinstance(record, dict):
+            raise OptionsError(f"Item {n}: must be a JSON object")
+        record = dict(defaults or {}, **record)
+        item_id = record.pop("id", None)
+        try:
+            requirements, options = parse_generate_request(record)
+            item_id = check_id(item_id if item_id is not None else job_key(requirements, options)[:16], "id")
+        except OptionsError as e:
+            raise OptionsError(f"Item {n}: {e}")
+        if item_id in seen:
+            raise OptionsError(f"Item {n}: duplicate id {item_id}")
+        seen.add(item_id)
+        items.append(BatchItem(item_id, requirements, options))
+    if not items:
+        raise OptionsError("No batch items provided")
+    return items
+
+
+def read_items(path, defaults=None):
+    """Batch items from a JSONL file, one item per line"""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                raise OptionsError(f"Line {number}: invalid JSON")
+    return parse_items(records, defaults)
+
+
+def event_data(update):
+    """The JSON payload of an encoded SSE event"""
+    return json.loads(update[update.index(b"data: ") + len(b"data: "):])
+
+
+class BatchScheduler:
+    """Process-wide limit on running batch items, shared by every batch"""
+
+    def __init__(self, concurrency=2):
+        self.concurrency = concurrency
+        self.slots = threading.BoundedSemaphore(concurrency)
+
+
+class Batch:
+    def __init__(self, client, items, output_dir, scheduler=None, concurrency=None):
+        self.client = client
+        self.items = items
+        self.output_dir = output_dir
+        self.scheduler = scheduler or get_batch_scheduler()
+        # A batch can ask for fewer parallel items than the shared limit, not more
+        self.concurrency = min(concurrency or self.scheduler.concurrency, self.scheduler.concurrency)
+        self._manifest_lock = threading.Lock()
+        self._lock_file = None
+
+    def acquire(self):
+        """
+        Claim the batch's output directory for this run, so callers can refuse a busy batch
+        before streaming. Raises BatchBusy when the batch is already running.
+        """
+        if self._lock_file is not None:
+            return
+        os.makedirs(self.output_dir, exist_ok=True)
+        lock_file = open(os.path.join(self.output_dir, LOCK), "a")
+        try:
+            # A file lock, so it also holds against other server processes
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            lock_file.close()
+            raise BatchBusy(f"Batch {os.path.basename(self.output_dir)} is already running")
+        self._lock_file = lock_file
+
+    def release(self):
+        if self._lock_file is not None:
+            # Closing the file releases the lock
+            self._lock_file.close()
+            self._lock_file = None
+
+    def finished(self):
+        """IDs of items a previous run finished, from the manifest"""
+        finished = set()
+        path = os.path.join(self.output_dir, MANIFEST)
+        if not os.path.exists(path):
+            return finished
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A line cut off by a crash
+                    continue
+                if entry.get("status") in FINISHED:
+                    finished.add(entry["id"])
+        return finished
+
+    def record(self, entry):
+        with self._manifest_lock:
+            with open(os.path.join(self.output_dir, MANIFEST), "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry) + "\n")
+
+    def save(self, item, completed, elapsed):
+        """Write an item's page and final event; returns its progress record"""
+        result = completed.get("result")
+        status = "unapproved" if not isinstance(result, dict) or "status" in result else "approved"
+        directory = os.path.join(self.output_dir, item.id)
+        os.makedirs(directory, exist_ok=True)
+        if isinstance(result, dict) and result.get("code"):
+            with open(os.path.join(directory, "index.html"), "w", encoding="utf-8") as f:
+                f.write(result["code"])
+        with open(os.path.join(directory, "result.json"), "w", encoding="utf-8") as f:
+            json.dump(completed, f, indent=2)
+        entry = {"id": item.id, "status": status, "path": directory, "elapsed": round(elapsed, 3),
+                 "finished_at": time.time()}
+        self.record(entry)
+        return dict(entry, progress=100)
+
+    def submit(self, item, stop):
+        """Admit an item's job, waiting out a full queue; None if the batch was stopped meanwhile"""
+        while not stop.is_set():
+            try:
+                return self.client.submit(item.requirements, **item.options)
+            except QueueFull as e:
+                stop.wait(e.retry_after)
+        return None
+
+    def run_item(self, item, records, stop):
+        with self.scheduler.slots:
+            if stop.is_set():
+                return
+            started = time.monotonic()
+            records.put({"id": item.id, "status": "submitted", "progress": 0})
+            try:
+                submitted = self.submit(item, stop)
+                if submitted is None:
+                    return
+                job, updates = submitted
+                completed, error = None, None
+                for update in updates:
+                    if stop.is_set():
+                        # The job carries on detached; an approved result lands in the result cache
+                        return
+                    data = event_data(update)
+                    if data["status"] == "completed":
+                        completed = data
+                    elif data["status"] == "error":
+                        error = data["message"]
+                    elif data["status"] != "delta":
+                        records.put({"id": item.id, "status": data["status"], "message": data["message"],
+                                     "progress": data["progress"], "job_id": job.id})
+                if completed is None:
+                    raise RuntimeError(error or "Job ended without a result")
+                records.put(self.save(item, completed, time.monotonic() - started))
+            except Exception as e:
+                entry = {"id": item.id, "status": "failed", "error": str(e),
+                         "elapsed": round(time.monotonic() - started, 3), "finished_at": time.time()}
+                self.record(entry)
+                records.put(entry)
+
+    def run(self):
+        """
+        Run the batch, yielding progress records: one per item event, then a summary.
+        Closing the generator stops items that haven't started; running ones finish detached.
+        Raises BatchBusy when the batch is already running.
+        """
+        started = time.monotonic()
+        self.acquire()
+        try:
+            yield from self._run(started)
+        finally:
+            self.release()
+
+    def _run(self, started):
+        finished = self.finished()
+        pending = [item for item in self.items if item.id not in finished]
+        counts = {"approved": 0, "unapproved": 0, "failed": 0, "skipped": len(self.items) - len(pending)}
+        yield {"status": "batch_started", "total": len(self.items), "pending": len(pending),
+               "skipped": counts["skipped"], "output_dir": self.output_dir}
+        for item in self.items:
+            if item.id in finished:
+                yield {"id": item.id, "status": "skipped"}
+
+        records = queue.Queue()
+        stop = threading.Event()
+        executor = ThreadPoolExecutor(max_workers=max(1, min(self.concurrency, len(pending))),
+                                      thread_name_prefix="batch")
+        try:
+            for item in pending:
+                executor.submit(self.run_item, item, records, stop)
+            remaining = len(pending)
+            while remaining:
+                record = records.get()
+                if record["status"] in counts:
+                    counts[record["status"]] += 1
+                    remaining -= 1
+                yield record
+        finally:
+            stop.set()
+            executor.shutdown(wait=False, cancel_futures=True)
+        yield dict({"status": "batch_finished", "total": len(self.items),
+                    "elapsed": round(time.monotonic() - started, 3)}, **counts)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_batch_scheduler():
+    """Return the process-wide batch scheduler"""
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = BatchScheduler(int(os.getenv("BATCH_CONCURRENCY", "2")))
+        return _scheduler
@@ -0,0 +1,183 @@
+"""
+Token budgets for crew prompts.
+Each role gets a prompt and completion cap, bounded by the model's context
+window. The developer's completion cap grows with the code it has to rewrite.
+The fix-up prompt the developer gets after a rejection (requirements,
+previous code and feedback) drops repeated feedback when it doesn't fit.
+Code is only ever elided from patch repair prompts: their edits are applied
+to the full code, whereas a full regeneration would lose the omitted lines.
+"""
+import os
+import re
+import json
+import difflib
+import threading
+
+try:
+    import tiktoken
+except ImportError:  # tiktoken is optional; the regex approximation is close enough for budgeting
+    tiktoken = None
+
+# Roughly how BPE tokenizers split code: short word pieces and single symbols
+TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]")
+
+# Context windows of the models we route to; others fall back to DEFAULT_CONTEXT_WINDOW
+CONTEXT_WINDOWS = {
+    "DeepSeek-V3-0324": 32768,
+    "DeepSeek-R1-0528": 32768,
+    "Meta-Llama-3.3-70B-Instruct": 131072,
+}
+DEFAULT_CONTEXT_WINDOW = 32768
+
+DEFAULT_CAPS = {
+    "developer": {"prompt": 24000, "completion": 16384},
+    "debugger": {"prompt": 24000, "completion": 1024},
+}
+
+# Code lines kept around each line the feedback refers to
+CONTEXT_LINES = 3
+
+# Completion room for rewriting code, relative to the code's size
+COMPLETION_HEADROOM = 1.5
+
+OMITTED_MARKER = re.compile(r"<!-- \.\.\. \d+ unchanged lines omitted \.\.\. -->")
+
+_encoding = None
+
+
+def estimate_tokens(text):
+    """Token count of text, exact with tiktoken installed and approximate otherwise"""
+    global _encoding
+    text = str(text or "")
+    if tiktoken is not None:
+        if _encoding is None:
+            _encoding = tiktoken.get_encoding("cl100k_base")
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(TOKEN_PATTERN.findall(text))
+
+
+class Budget:
+    """Prompt and completion limits for one call"""
+
+    def __init__(self, role, model, prompt, completion):
+        self.role = role
+        self.model = model
+        self.prompt = prompt
+        self.completion = completion
+
+    def to_dict(self):
+        return {"role": self.role, "model": self.model, "prompt": self.prompt, "completion": self.completion}
+
+
+class BudgetManager:
+    def __init__(self, caps=None, context_windows=None):
+        self.caps = {role: dict(DEFAULT_CAPS[role], **(caps or {}).get(role, {})) for role in DEFAULT_CAPS}
+        self.context_windows = dict(CONTEXT_WINDOWS, **(context_windows or {}))
+
+    def budget(self, role, model, expected_tokens=0):
+        """
+        Limits for a call to model. expected_tokens is the size of the output the call must be able
+        to produce (e.g. the code being regenerated); the completion cap grows to fit it.
+        """
+        caps = self.caps[role]
+        window = self.context_windows.get(model, DEFAULT_CONTEXT_WINDOW)
+        completion = min(max(caps["completion"], int(expected_tokens * COMPLETION_HEADROOM)), window // 2)
+        return Budget(role, model, min(caps["prompt"], window - completion), completion)
+
+
+def dedupe_feedback(feedback):
+    """Drop repeated lines from debugger feedback, keeping the latest occurrence"""
+    seen = set()
+    lines = []
+    for line in reversed(str(feedback).splitlines()):
+        key = " ".join(line.lower().split())
+        if key and key in seen:
+            continue
+        seen.add(key)
+        lines.append(line)
+    return "\n".join(reversed(lines))
+
+
+def referenced_lines(code_lines, feedback):
+    """Indexes of code lines that share a distinctive word with the feedback"""
+    words = {word.lower() for word in re.findall(r"[A-Za-z_][\w-]{3,}", str(feedback))}
+    return {
+        index for index, line in enumerate(code_lines)
+        if any(word.lower() in words for word in re.findall(r"[A-Za-z_][\w-]{3,}", line))
+    }
+
+
+def elide_code(code, feedback, previous_code=None, context=CONTEXT_LINES):
+    """
+    Replace code regions that are irrelevant to the feedback with a marker.
+    With previous_code, only regions unchanged since then are candidates.
+    Only for prompts whose answer is applied to the full code (edit scripts).
+    """
+    lines = str(code).splitlines()
+    keep = set()
+    for index in referenced_lines(lines, feedback):
+        keep.update(range(max(0, index - context), min(len(lines), index + context + 1)))
+    # Always keep the document framing
+    keep.update(range(min(len(lines), context)))
+    keep.update(range(max(0, len(lines) - context), len(lines)))
+    if previous_code is not None:
+        matcher = difflib.SequenceMatcher(None, str(previous_code).splitlines(), lines, autojunk=False)
+        for tag, _, _, start, end in matcher.get_opcodes():
+            if tag != "equal":
+                keep.update(range(start, end))
+
+    output = []
+    skipped = 0
+    for index, line in enumerate(lines):
+        if index in keep:
+            if skipped:
+                output.append(f"<!-- ... {skipped} unchanged lines omitted ... -->")
+                skipped = 0
+            output.append(line)
+        else:
+            skipped += 1
+    if skipped:
+        output.append(f"<!-- ... {skipped} unchanged lines omitted ... -->")
+    return "\n".join(output)
+
+
+def fit_prompt(render, requirements, code, feedback, budget, overhead=0):
+    """
+    Render a fix-up prompt within budget.prompt tokens (less overhead for the fixed parts of the prompt).
+    render(requirements, code, feedback) builds the prompt. Returns the prompt and a report of what was done.
+    The code is never elided: the developer regenerates the page from it.
+    """
+    limit = budget.prompt - overhead
+    prompt = render(requirements, code, feedback)
+    tokens = estimate_tokens(prompt)
+    compacted = []
+    if tokens > limit:
+        feedback = dedupe_feedback(feedback)
+        prompt = render(requirements, code, feedback)
+        tokens = estimate_tokens(prompt)
+        compacted.append("feedback")
+    report = dict(budget.to_dict(), prompt_tokens=tokens + overhead, compacted=compacted)
+    if tokens > limit:
+        report["over_budget"] = True
+    return prompt, report
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_budget_manager():
+    """Return the process-wide budget manager, configured from the environment"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            caps = {
+                role: {
+                    "prompt": int(os.getenv(f"BUDGET_{role.upper()}_PROMPT", DEFAULT_CAPS[role]["prompt"])),
+                    "completion": int(os.getenv(f"BUDGET_{role.upper()}_COMPLETION", DEFAULT_CAPS[role]["completion"]))
+                }
+                for role in DEFAULT_CAPS
+            }
+            windows = os.getenv("MODEL_CONTEXT_WINDOWS")
+            _manager = BudgetManager(caps, json.loads(windows) if windows else None)
+        return _manager
@@ -0,0 +1,223 @@
+"""
+Content-addressed cache of completed development runs.
+Results are keyed on normalized requirements plus everything that changes the
+output (models, prompt version, review/deploy modes). Lookups go through an
+in-memory LRU, then an on-disk tier, and optionally (off by default) a MinHash
+near-duplicate search so "landing page for a fitness app" can reuse "a landing
+page for fitness apps". Templated requirements that differ only in a product name or a
+colour can score above 0.9, so near-duplicate lookups would serve one
+product's page for another.
+"""
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import threading
+from collections import OrderedDict
+
+SHINGLE_SIZE = 4
+NUM_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(20240601)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+
+def normalize_requirements(text):
+    """Case-fold, drop punctuation and collapse whitespace"""
+    text = re.sub(r"[^\w\s]", " ", str(text).lower())
+    return " ".join(text.split())
+
+
+def cache_key(normalized, variant):
+    """Hash of the normalized requirements and the output-affecting settings"""
+    payload = json.dumps({"requirements": normalized, "variant": variant}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def minhash_signature(normalized):
+    """MinHash signature over character shingles of the normalized text"""
+    text = f" {normalized} "
+    shingles = {text[i:i + SHINGLE_SIZE] for i in range(max(1, len(text) - SHINGLE_SIZE + 1))}
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in shingles
+    ]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+
+def similarity(sig_a, sig_b):
+    """Estimated Jaccard similarity of two signatures"""
+    return sum(1 for a, b in zip(sig_a, sig_b) if a == b) / len(sig_a)
+
+
+class ResultCache:
+    def __init__(self, directory=None, memory_items=128, max_bytes=256 * 1024 * 1024, ttl=7 * 24 * 3600,
+                 similarity_threshold=0):
+        self.directory = directory
+        self.memory_items = memory_items
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        # key -> (variant, signature, created_at) for near-duplicate search
+        self._index = {}
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._load_index()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _expired(self, entry):
+        return self.ttl and time.time() - entry["created_at"] > self.ttl
+
+    def _load_index(self):
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    entry = json.load(f)
+                self._index[entry["key"]] = (entry["variant"], entry["signature"], entry["created_at"])
+            except (OSError, ValueError, KeyError):
+                continue
+
+    def _remember(self, entry):
+        self._memory[entry["key"]] = entry
+        self._memory.move_to_end(entry["key"])
+        while len(self._memory) > self.memory_items:
+            evicted, _ = self._memory.popitem(last=False)
+            if not self.directory:
+                # Without a disk tier the entry is gone for good
+                self._index.pop(evicted, None)
+
+    def _forget(self, key):
+        self._memory.pop(key, None)
+        self._index.pop(key, None)
+        if self.directory:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def _get(self, key):
+        entry = self._memory.get(key)
+        if entry is None and self.directory and os.path.exists(self._path(key)):
+            try:
+                with open(self._path(key)) as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                entry = None
+        if entry is None:
+            return None
+        if self._expired(entry):
+            self._forget(key)
+            return None
+        self._remember(entry)
+        return entry
+
+    def lookup(self, requirements, variant):
+        """
+        Find a cached result for the requirements.
+        Returns (entry, similarity) where similarity is 1.0 for an exact hit, or None.
+        """
+        normalized = normalize_requirements(requirements)
+        with self._lock:
+            entry = self._get(cache_key(normalized, variant))
+            if entry is not None:
+                return entry, 1.0
+            if not self.similarity_threshold:
+                return None
+
+            signature = minhash_signature(normalized)
+            best_key, best_score = None, 0.0
+            for key, (entry_variant, entry_signature, created_at) in self._index.items():
+                if entry_variant != variant:
+                    continue
+                if self.ttl and time.time() - created_at > self.ttl:
+                    continue
+                score = similarity(signature, entry_signature)
+                if score > best_score:
+                    best_key, best_score = key, score
+            if best_key is None or best_score < self.similarity_threshold:
+                return None
+            entry = self._get(best_key)
+            return (entry, best_score) if entry is not None else None
+
+    def store(self, requirements, variant, result):
+        """Cache a completed result"""
+        normalized = normalize_requirements(requirements)
+        key = cache_key(normalized, variant)
+        entry = {
+            "key": key,
+            "requirements": requirements,
+            "variant": variant,
+            "signature": minhash_signature(normalized),
+            "created_at": time.time(),
+            "result": result
+        }
+        with self._lock:
+            self._remember(entry)
+            self._index[key] = (variant, entry["signature"], entry["created_at"])
+            if self.directory:
+                tmp = self._path(key) + ".tmp"
+                with open(tmp, "w") as f:
+                    json.dump(entry, f)
+                os.replace(tmp, self._path(key))
+                self._evict_disk()
+        return key
+
+    def _evict_disk(self):
+        """Drop expired entries, then the oldest ones until the tier fits in max_bytes"""
+        files = []
+        total = 0
+        now = time.time()
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            key = name[:-len(".json")]
+            if self.ttl and now - stat.st_mtime > self.ttl:
+                self._forget(key)
+                continue
+            files.append((stat.st_mtime, stat.st_size, key))
+            total += stat.st_size
+        for _, size, key in sorted(files):
+            if total <= self.max_bytes:
+                break
+            self._forget(key)
+            total -= size
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide result cache, or None when caching is disabled"""
+    global _cache
+    if os.getenv("RESULT_CACHE", "1").lower() in ("0", "false", "no", "off"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = ResultCache(
+                directory=os.getenv("RESULT_CACHE_DIR", ".cache/results") or None,
+                memory_items=int(os.getenv("RESULT_CACHE_MEMORY_ITEMS", "128")),
+                max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024),
+                ttl=float(os.getenv("RESULT_CACHE_TTL", str(7 * 24 * 3600))),
+                similarity_threshold=float(os.getenv("RESULT_CACHE_SIMILARITY", "0"))
+            )
+        return _cache
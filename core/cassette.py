@@ -0,0 +1,291 @@
+"""
+Record and replay of LLM traffic.
+In record mode every chat completion request going through the shared HTTP
+clients (core/http.py) is passed on to the network and its response, with
+the time to first byte and the arrival time of each chunk, is appended to a
+cassette file: gzip-compressed JSON lines, one interaction per line.
+In replay mode the network is never used: responses are served from the
+cassette, either immediately or with their recorded timings, so end-to-end
+runs are repeatable and the crew's own overhead can be measured without
+model latency.
+
+Requests are matched on a hash of their body, so a replay fails with
+CassetteMiss as soon as the crew sends a request that wasn't recorded (e.g.
+because a prompt or the loop changed). With loose matching such a request
+gets the next unused recording for the same model and streaming mode instead,
+which keeps replays of edited prompts running but no longer checks them.
+"""
+import os
+import gzip
+import json
+import time
+import base64
+import asyncio
+import hashlib
+import threading
+from collections import deque
+import httpx
+
+MODES = ("record", "replay", "replay_timed")
+MATCHES = ("exact", "loose")
+
+# Hop-by-hop headers that don't describe the recorded body
+SKIPPED_HEADERS = ("transfer-encoding", "connection", "keep-alive", "date")
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for a request the cassette has no recording for"""
+
+
+def request_key(request):
+    """(key, model, streaming) of a chat completion request, or None for other traffic"""
+    if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+        return None
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return None
+    canonical = json.dumps(body, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:32], body.get("model", ""), bool(body.get("stream"))
+
+
+def encode_chunk(chunk):
+    try:
+        return chunk.decode("utf-8")
+    except UnicodeDecodeError:
+        return {"base64": base64.b64encode(chunk).decode("ascii")}
+
+
+def decode_chunk(chunk):
+    if isinstance(chunk, dict):
+        return base64.b64decode(chunk["base64"])
+    return chunk.encode("utf-8")
+
+
+class Cassette:
+    def __init__(self, path, mode, match="exact"):
+        if mode not in MODES:
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        if match not in MATCHES:
+            raise ValueError(f"Unknown cassette match: {match}")
+        self.path = path
+        self.mode = mode
+        self.match = match
+        self._lock = threading.Lock()
+        self._by_key = {}
+        self._by_model = {}
+        if mode != "record":
+            self.load()
+        else:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+
+    @property
+    def timed(self):
+        return self.mode == "replay_timed"
+
+    def load(self):
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                entry["used"] = False
+                self._by_key.setdefault(entry["key"], deque()).append(entry)
+                self._by_model.setdefault((entry["model"], entry["stream"]), deque()).append(entry)
+
+    def record(self, entry):
+        line = json.dumps(entry, separators=(",", ":")) + "\n"
+        with self._lock:
+            # Each append is its own gzip member; readers see one continuous stream
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                f.write(line)
+
+    def _next_unused(self, entries):
+        while entries:
+            entry = entries.popleft()
+            if not entry["used"]:
+                entry["used"] = True
+                return entry
+        return None
+
+    def find(self, key, model, streaming):
+        """The recording for a request: an exact match, or with loose matching the next one for the same model"""
+        with self._lock:
+            entry = self._next_unused(self._by_key.get(key, deque()))
+            if entry is None and self.match == "loose":
+                entry = self._next_unused(self._by_model.get((model, streaming), deque()))
+        if entry is None:
+            raise CassetteMiss(f"No recorded response for {model} (request {key}) in {self.path}")
+        return entry
+
+
+def recorded_headers(response):
+    return [[name, value] for name, value in response.headers.multi_items() if name.lower() not in SKIPPED_HEADERS]
+
+
+class Recorder:
+    """Collects a response's chunks as they are read and writes the entry when the body ends"""
+
+    def __init__(self, cassette, described, response, started, first_byte):
+        key, model, streaming = described
+        self.cassette = cassette
+        self.entry = {
+            "key": key,
+            "model": model,
+            "stream": streaming,
+            "status": response.status_code,
+            "headers": recorded_headers(response),
+            "ttfb": round(first_byte - started, 4),
+            "chunks": [],
+            "recorded_at": time.time()
+        }
+        self.first_byte = first_byte
+        self.done = False
+
+    def add(self, chunk):
+        self.entry["chunks"].append([round(time.monotonic() - self.first_byte, 4), encode_chunk(chunk)])
+
+    def finish(self):
+        if not self.done:
+            self.done = True
+            self.cassette.record(self.entry)
+
+
+class RecordingStream(httpx.SyncByteStream):
+    def __init__(self, stream, recorder):
+        self.stream = stream
+        self.recorder = recorder
+
+    def __iter__(self):
+        for chunk in self.stream:
+            self.recorder.add(chunk)
+            yield chunk
+        self.recorder.finish()
+
+    def close(self):
+        self.stream.close()
+
+
+class AsyncRecordingStream(httpx.AsyncByteStream):
+    def __init__(self, stream, recorder):
+        self.stream = stream
+        self.recorder = recorder
+
+    async def __aiter__(self):
+        async for chunk in self.stream:
+            self.recorder.add(chunk)
+            yield chunk
+        self.recorder.finish()
+
+    async def aclose(self):
+        await self.stream.aclose()
+
+
+class ReplayStream(httpx.SyncByteStream):
+    def __init__(self, chunks, timed):
+        self.chunks = chunks
+        self.timed = timed
+
+    def __iter__(self):
+        started = time.monotonic()
+        for offset, chunk in self.chunks:
+            if self.timed:
+                delay = offset - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+            yield decode_chunk(chunk)
+
+
+class AsyncReplayStream(httpx.AsyncByteStream):
+    def __init__(self, chunks, timed):
+        self.chunks = chunks
+        self.timed = timed
+
+    async def __aiter__(self):
+        started = time.monotonic()
+        for offset, chunk in self.chunks:
+            if self.timed:
+                delay = offset - (time.monotonic() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            yield decode_chunk(chunk)
+
+
+def replayed_response(entry, request, stream):
+    return httpx.Response(entry["status"], headers=entry["headers"], stream=stream, request=request)
+
+
+class CassetteTransport(httpx.BaseTransport):
+    """
+    httpx transport that records chat completions passing through transport, or replays
+    them from the cassette without touching it
+    """
+
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    def handle_request(self, request):
+        described = request_key(request)
+        if self.cassette.mode == "record":
+            started = time.monotonic()
+            response = self.transport.handle_request(request)
+            if described is not None:
+                recorder = Recorder(self.cassette, described, response, started, time.monotonic())
+                response.stream = RecordingStream(response.stream, recorder)
+            return response
+        if described is None:
+            return self.transport.handle_request(request)
+        entry = self.cassette.find(*described)
+        if self.cassette.timed:
+            time.sleep(entry["ttfb"])
+        return replayed_response(entry, request, ReplayStream(entry["chunks"], self.cassette.timed))
+
+    def close(self):
+        self.transport.close()
+
+
+class AsyncCassetteTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of CassetteTransport"""
+
+    def __init__(self, transport, cassette):
+        self.transport = transport
+        self.cassette = cassette
+
+    async def handle_async_request(self, request):
+        described = request_key(request)
+        if self.cassette.mode == "record":
+            started = time.monotonic()
+            response = await self.transport.handle_async_request(request)
+            if described is not None:
+                recorder = Recorder(self.cassette, described, response, started, time.monotonic())
+                response.stream = AsyncRecordingStream(response.stream, recorder)
+            return response
+        if described is None:
+            return await self.transport.handle_async_request(request)
+        entry = self.cassette.find(*described)
+        if self.cassette.timed:
+            await asyncio.sleep(entry["ttfb"])
+        return replayed_response(entry, request, AsyncReplayStream(entry["chunks"], self.cassette.timed))
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_cassette = None
+_cassette_lock = threading.Lock()
+
+
+def get_cassette():
+    """Return the process-wide cassette, or None when LLM_CASSETTE_MODE is not set"""
+    global _cassette
+    mode = os.getenv("LLM_CASSETTE_MODE", "")
+    if not mode:
+        return None
+    with _cassette_lock:
+        if _cassette is None:
+            _cassette = Cassette(os.getenv("LLM_CASSETTE", ".cache/llm.cassette.jsonl.gz"), mode,
+                                 os.getenv("LLM_CASSETTE_MATCH", "exact"))
+        return _cassette
@@ -0,0 +1,162 @@
+"""
+Durable job checkpoints.
+Jobs record their parameters, every event they emit and the crew loop's state
+after each developer and debugger step in a local SQLite database, so a job cut
+off by a redeploy or crash can be picked up from its last completed step by
+the next process instead of starting over.
+"""
+import os
+import json
+import time
+import uuid
+import socket
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    job_key TEXT,
+    params TEXT NOT NULL,
+    state TEXT NOT NULL,
+    owner TEXT NOT NULL,
+    checkpoint TEXT,
+    created_at REAL NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    job_id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    PRIMARY KEY (job_id, seq)
+);
+"""
+
+
+_boot_id = None
+
+
+def process_owner():
+    """
+    Identifies this process, so jobs left behind by dead ones can be told apart. A random boot ID
+    keeps a restarted process that got the same hostname and PID (PID 1 in a container, say)
+    from being taken for the one that died.
+    """
+    global _boot_id
+    if _boot_id is None or _boot_id[0] != os.getpid():
+        # Forked children get their own
+        _boot_id = (os.getpid(), uuid.uuid4().hex)
+    return f"{socket.gethostname()}:{os.getpid()}:{_boot_id[1]}"
+
+
+def owner_alive(owner):
+    host, _, rest = owner.partition(":")
+    pid = rest.partition(":")[0]
+    if host != socket.gethostname():
+        # Another host (or a previous container) - its process is gone for our purposes
+        return False
+    if pid == str(os.getpid()):
+        # This process, or one before a restart that had the same PID
+        return owner == process_owner()
+    try:
+        os.kill(int(pid), 0)
+    except PermissionError:
+        # Running, but as another user
+        return True
+    except (ValueError, OSError):
+        return False
+    return True
+
+
+class CheckpointStore:
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+        self.owner = process_owner()
+
+    def _execute(self, sql, args=()):
+        with self._lock:
+            return self._db.execute(sql, args).fetchall()
+
+    def create_job(self, job_id, key, params):
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (job_id, job_key, params, state, owner, created_at, updated_at) VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+            (job_id, key, json.dumps(params), self.owner, now, now)
+        )
+
+    def append_event(self, job_id, seq, event):
+        self._execute("INSERT OR REPLACE INTO events (job_id, seq, event) VALUES (?, ?, ?)", (job_id, seq, event))
+
+    def save(self, job_id, checkpoint):
+        """Record the crew loop's state after a completed step"""
+        self._execute(
+            "UPDATE jobs SET checkpoint = ?, state = 'running', updated_at = ? WHERE job_id = ?",
+            (json.dumps(checkpoint), time.time(), job_id)
+        )
+
+    def finish(self, job_id, state):
+        self._execute("UPDATE jobs SET state = ?, updated_at = ? WHERE job_id = ?", (state, time.time(), job_id))
+
+    def delete(self, job_id):
+        with self._lock:
+            self._db.execute("DELETE FROM events WHERE job_id = ?", (job_id,))
+            self._db.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+
+    def events(self, job_id):
+        return [row[0] for row in self._execute("SELECT event FROM events WHERE job_id = ? ORDER BY seq", (job_id,))]
+
+    def claim_orphans(self, retention):
+        """
+        Take over jobs whose owning process is gone.
+        Returns dicts with job_id, key, params, state, checkpoint and updated_at; jobs that
+        finished more than retention seconds ago are deleted instead.
+        """
+        cutoff = time.time() - retention
+        claimed = []
+        rows = self._execute("SELECT job_id, job_key, params, state, owner, checkpoint, updated_at FROM jobs")
+        for job_id, key, params, state, owner, checkpoint, updated_at in rows:
+            if owner == self.owner or owner_alive(owner):
+                continue
+            finished = state in ("done", "cancelled")
+            if finished and updated_at < cutoff:
+                self.delete(job_id)
+                continue
+            # Only one process wins the claim
+            with self._lock:
+                changed = self._db.execute(
+                    "UPDATE jobs SET owner = ? WHERE job_id = ? AND owner = ?", (self.owner, job_id, owner)
+                ).rowcount
+            if changed:
+                claimed.append({
+                    "job_id": job_id,
+                    "key": key,
+                    "params": json.loads(params),
+                    "state": state,
+                    "checkpoint": json.loads(checkpoint) if checkpoint else None,
+                    "updated_at": updated_at
+                })
+        return claimed
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_checkpoint_store():
+    """Return the process-wide checkpoint store, or None when checkpointing is disabled"""
+    global _store
+    path = os.getenv("CHECKPOINT_DB", ".cache/jobs.sqlite3")
+    if not path:
+        return None
+    with _store_lock:
+        if _store is None:
+            _store = CheckpointStore(path)
+        return _store
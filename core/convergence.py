@@ -0,0 +1,163 @@
+"""
+Convergence detection for the development loop.
+Fingerprints the code and rejection reason of every iteration so the loop can
+tell when it has stopped making progress: the developer returning the same
+code, flipping between two variants, or making only a small change that the
+debugger rejects for the same reason as before. Code that was already
+reviewed keeps its verdict instead of being reviewed again. When the loop
+stalls the crew tries the next strategy (a bigger developer model, a higher
+temperature) and once those are used up stops early with the best code it
+has seen.
+"""
+import os
+import re
+import hashlib
+import threading
+from difflib import SequenceMatcher
+
+STRATEGIES = ("escalate", "temperature")
+
+VERDICT_CODE = re.compile(r"-(?:00|11)\b")
+NUMBER = re.compile(r"\d+")
+
+
+def code_fingerprint(code):
+    """Hash of the code with whitespace differences ignored"""
+    return hashlib.sha256(" ".join(str(code).split()).encode("utf-8")).hexdigest()
+
+
+def reason_fingerprint(debug_result):
+    """Hash of a rejection with the verdict code, case, spacing and numbers (e.g. line numbers) ignored"""
+    text = NUMBER.sub("#", VERDICT_CODE.sub("", str(debug_result)).lower())
+    return hashlib.sha256(" ".join(text.split()).encode("utf-8")).hexdigest()
+
+
+def code_similarity(a, b):
+    """Share of lines two versions of the code have in common, from 0 to 1"""
+    return SequenceMatcher(None, str(a).splitlines(), str(b).splitlines()).ratio()
+
+
+class ConvergenceTracker:
+    """One job's progress: what was generated and reviewed so far, and how the loop has stalled"""
+
+    def __init__(self, policy, state=None):
+        state = state or {}
+        self.policy = policy
+        # [fingerprint, iteration] of each iteration's code, in order
+        self.history = [list(entry) for entry in state.get("history", [])]
+        self.previous = state.get("previous")
+        self.last_reason = state.get("last_reason")
+        # Consecutive stalled iterations and strategies used up so far
+        self.stalls = state.get("stalls", 0)
+        self.switches = state.get("switches", 0)
+        self.temperature = state.get("temperature")
+        # Verdicts by debugger model and code fingerprint
+        self.reviews = dict(state.get("reviews", {}))
+        self.best = state.get("best")
+
+    def reviewed(self, code, model):
+        """The (debug_result, review) this model already gave the same code, or None"""
+        entry = self.reviews.get(f"{model}:{code_fingerprint(code)}")
+        if entry is None:
+            return None
+        return entry["debug_result"], dict(entry["review"], reused=entry["iteration"] + 1)
+
+    def remember(self, iteration, code, model, debug_result, review):
+        """Record a review, keeping the code with the fewest structural issues (the latest on a tie)"""
+        self.reviews[f"{model}:{code_fingerprint(code)}"] = {
+            "iteration": iteration,
+            "debug_result": str(debug_result),
+            "review": review
+        }
+        issues = len(review.get("validation", {}).get("issues", ()))
+        if self.best is None or issues <= self.best["issues"]:
+            self.best = {"iteration": iteration, "code": code, "feedback": str(debug_result), "issues": issues}
+
+    def observe(self, iteration, code, debug_result):
+        """
+        Record a rejected iteration. Returns why the loop has stalled once it has for
+        the policy's patience in a row, otherwise None.
+        """
+        fingerprint = code_fingerprint(code)
+        reason = reason_fingerprint(debug_result)
+        earlier = {entry[0]: entry[1] for entry in self.history}
+        stall = None
+        if self.history and self.history[-1][0] == fingerprint:
+            stall = f"the developer returned the same code as in iteration {self.history[-1][1] + 1}"
+        elif fingerprint in earlier:
+            stall = f"the developer is alternating between versions, this one matches iteration {earlier[fingerprint] + 1}"
+        elif reason == self.last_reason and self.policy.similarity:
+            # A small targeted fix is normal progress; it is only a stall if it didn't change the verdict
+            similarity = code_similarity(self.previous, code)
+            if similarity >= self.policy.similarity:
+                stall = (f"the developer changed only {1 - similarity:.1%} of the code since iteration "
+                         f"{self.history[-1][1] + 1} and the debugger repeated its rejection")
+
+        self.history.append([fingerprint, iteration])
+        self.previous = code
+        self.last_reason = reason
+        self.stalls = self.stalls + 1 if stall else 0
+        if stall and self.policy.patience and self.stalls >= self.policy.patience:
+            return stall
+        return None
+
+    def next_strategy(self):
+        """The next strategy to try after a stall, or None when all have been used"""
+        self.stalls = 0
+        if self.switches >= len(self.policy.strategies):
+            return None
+        self.switches += 1
+        return self.policy.strategies[self.switches - 1]
+
+    def overrides(self):
+        """LLM overrides for the developer's kickoffs"""
+        return {"temperature": self.temperature} if self.temperature is not None else {}
+
+    def to_dict(self):
+        return {
+            "history": self.history,
+            "previous": self.previous,
+            "last_reason": self.last_reason,
+            "stalls": self.stalls,
+            "switches": self.switches,
+            "temperature": self.temperature,
+            "reviews": self.reviews,
+            "best": self.best
+        }
+
+
+class ConvergencePolicy:
+    def __init__(self, patience=1, similarity=0.98, strategies=STRATEGIES, temperature=1.0):
+        for strategy in strategies:
+            if strategy not in STRATEGIES:
+                raise ValueError(f"Unknown convergence strategy: {strategy}")
+        # Stalled iterations in a row before acting on them; 0 turns detection off
+        self.patience = patience
+        # Line similarity to the previous iteration's code that, with the same rejection, counts as
+        # no progress; 0 to only match code exactly
+        self.similarity = similarity
+        self.strategies = tuple(strategies)
+        self.temperature = temperature
+
+    def start(self, state=None):
+        """A new job's tracker, or one restored from ConvergenceTracker.to_dict()"""
+        return ConvergenceTracker(self, state)
+
+
+_policy = None
+_policy_lock = threading.Lock()
+
+
+def get_convergence_policy():
+    """Return the process-wide convergence policy, configured from the environment"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            strategies = os.getenv("CONVERGENCE_STRATEGIES", ",".join(STRATEGIES))
+            _policy = ConvergencePolicy(
+                patience=int(os.getenv("CONVERGENCE_PATIENCE", "1")),
+                similarity=float(os.getenv("CONVERGENCE_SIMILARITY", "0.98")),
+                strategies=[s.strip() for s in strategies.split(",") if s.strip()],
+                temperature=float(os.getenv("CONVERGENCE_TEMPERATURE", "1.0"))
+            )
+        return _policy
@@ -1,17 +1,300 @@
 import os
-import json
 import sys
+import time
+import asyncio
+import inspect
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from textwrap import dedent
 from crewai import Crew, Process, Task
 from agents.developer_agent import DeveloperAgent
 from agents.debugger_agent import DebuggerAgent
+from core.validator import validate_html
+from core.http import bind_http_clients
+from core.streaming import DeltaCoalescer
+from core.packager import package_code
+from core.patching import EDIT_FORMAT, PatchError, parse_edit_script, apply_edit_script
+from core.router import get_model_router
+from core.convergence import get_convergence_policy
+from core.budget import get_budget_manager, estimate_tokens, fit_prompt, elide_code, CONTEXT_LINES, OMITTED_MARKER
+from core.modes import REVIEW_MODES, REPAIR_MODES, DEPLOY_MODES
+from core.metrics import STAGE_SECONDS, STAGE_TOKENS, STAGE_INFLIGHT, REVIEWS, ITERATIONS, JOBS, STALLS
+from core.tracing import get_tracer, current_span
+from core.events import Event
+
+# Bump when task prompts change so cached results from older prompts aren't reused
+PROMPT_VERSION = "2"
+
+# Sampling temperatures cycled through by speculative candidates
+CANDIDATE_TEMPERATURES = (0.7, 0.9, 0.5, 1.0, 0.3)
+
+
+class Kickoff:
+    """
+    Request from the pipeline to run a crew. The driver (run_crew or arun_crew)
+    executes it and sends the crew's output back as a string.
+    """
+
+    def __init__(self, crew, agent, stream=False, iteration=None, overrides=None, stage="developer"):
+        self.crew = crew
+        self.agent = agent
+        # Pipeline stage the kickoff's time and tokens are recorded under
+        self.stage = stage
+        self.stream = stream
+        self.iteration = iteration
+        # LLM attributes (temperature, seed, ...) to set for the duration of the kickoff
+        self.overrides = dict(overrides or {})
+        if stream:
+            # crewai switches the LLM to streaming; pooled agents are shared, so it gets put back
+            self.overrides["stream"] = True
+
+
+class Race:
+    """Request to start several kickoffs concurrently; the driver sends back a race handle"""
+
+    def __init__(self, kickoffs):
+        self.kickoffs = kickoffs
+
+
+class NextFinished:
+    """Request for the next kickoff of a race to finish: (index, output, error), or None once all have"""
+
+    def __init__(self, race):
+        self.race = race
+
+
+class CancelRace:
+    """Request to drop the kickoffs of a race that haven't finished"""
+
+    def __init__(self, race):
+        self.race = race
+
+
+class Checkpoint:
+    """Request to durably record the loop's state after a completed step"""
+
+    def __init__(self, state):
+        self.state = state
+
+
+class Checkout:
+    """
+    Request for an agent running a different model; the driver sends back the agent.
+    Optional checkouts get None back when no agent is free.
+    """
+
+    def __init__(self, role, model, optional=False):
+        self.role = role
+        self.model = model
+        self.optional = optional
+
+
+@contextmanager
+def llm_overrides(agent, overrides):
+    """Temporarily set attributes on an agent's LLM"""
+    llm = getattr(agent, "llm", None)
+    saved = {}
+    if llm is not None:
+        for name, value in (overrides or {}).items():
+            if hasattr(llm, name):
+                saved[name] = getattr(llm, name)
+                setattr(llm, name, value)
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(llm, name, value)
+
+
+def agent_model(agent):
+    """Name of the model an agent runs on"""
+    return getattr(getattr(agent, "llm", None), "model", None)
+
+
+def render_fix_context(requirements, code, feedback):
+    """The developer's prompt after a rejection"""
+    return f"""
+Original requirements:
+{requirements}
+
+Current code generated:
+{code}
+
+Debugger feedback:
+{feedback}
+
+Please fix the code based on the feedback above.
+"""
+
+
+def verdict_confidence(debug_result):
+    """1.0 for a clear approve/reject verdict, 0.0 when the debugger gave neither code or both"""
+    text = str(debug_result)
+    return 1.0 if ("-11" in text) != ("-00" in text) else 0.0
+
+
+def drain(generator):
+    """Run a generator to completion and return its return value"""
+    try:
+        while True:
+            next(generator)
+    except StopIteration as stop:
+        return stop.value
 
 class DevelopmentCrew:
-    def __init__(self, api_key, max_iterations=5):
+    def __init__(self, api_key, max_iterations=5, review_mode="hybrid", developer_agent=None, debugger_agent=None,
+                 stream=False, delta_chars=512, delta_interval=0.25, candidates=1, max_inflight=None,
+                 candidate_agents=None, repair_mode="full", deploy_mode="local", package_dir=None,
+                 checkpoint=None, resume=None, agent_provider=None, sink=None):
+        if review_mode not in REVIEW_MODES:
+            raise ValueError(f"Unknown review mode: {review_mode}")
+        if repair_mode not in REPAIR_MODES:
+            raise ValueError(f"Unknown repair mode: {repair_mode}")
+        if deploy_mode not in DEPLOY_MODES:
+            raise ValueError(f"Unknown deploy mode: {deploy_mode}")
+        if candidates < 1:
+            raise ValueError("candidates must be at least 1")
         self.api_key = api_key
         self.max_iterations = max_iterations
-        self.developer_agent = DeveloperAgent(api_key).create_developer_agent()
-        self.debugger_agent = DebuggerAgent(api_key).create_debugger_agent()
+        self.review_mode = review_mode
+        self.repair_mode = repair_mode
+        self.deploy_mode = deploy_mode
+        # Bundles are also written to disk when a directory is given
+        self.package_dir = package_dir
+        # When streaming, developer tokens are relayed as coalesced "delta" events
+        self.stream = stream
+        self.delta_chars = delta_chars
+        self.delta_interval = delta_interval
+        # checkpoint(state) is called after each developer and debugger step;
+        # a state saved that way can be passed back as resume to continue from it
+        self.checkpoint = checkpoint
+        self.resume = resume
+        # Prompt and completion caps per role, see core/budget.py
+        self.budgets = get_budget_manager()
+        # Which model of each role's cascade the job is on
+        self.router = get_model_router()
+        self.route = self.router.start(resume.get("route") if resume else None)
+        # Fingerprints of each iteration's code and verdict, to stop the loop when it stops making progress
+        self.convergence = get_convergence_policy().start(resume.get("convergence") if resume else None)
+        # Per-stage time, call and token totals for this job, attached to the completed event
+        self.timings = {}
+        self._timings_lock = threading.Lock()
+        self.started_at = time.monotonic()
+        # Iteration and kickoff spans nest under the span that was current when the driver started
+        self.tracer = get_tracer()
+        self.trace_parent = None
+        self.iteration_span = None
+        # Events are also emitted to the sink (see core/events.py) as the drivers yield them
+        self.sink = sink
+        # agent_provider(role, model, optional) supplies agents when the route changes model
+        # (e.g. from the agent pool); without one the crew builds them itself
+        self.agent_provider = agent_provider
+        # Agents can be supplied by the caller (e.g. checked out of the agent pool)
+        self.developer_agent = developer_agent or self.build_agent("developer", self.route.current("developer").model)
+        self.debugger_agent = debugger_agent or self.build_agent("debugger", self.route.current("debugger").model)
+        # Speculative mode: N developer generations race each iteration, first approved wins
+        self.candidates = candidates
+        # Caps the LLM calls this job has in flight at once (developers and debugger)
+        self.max_inflight = max_inflight or candidates
+        self.candidate_agents = [self.developer_agent] + list(candidate_agents or [])
+        while len(self.candidate_agents) < candidates:
+            self.candidate_agents.append(self.build_agent("developer", agent_model(self.developer_agent)))
+
+    def build_agent(self, role, model):
+        """Create an agent for one of the cascade's models"""
+        route = self.router.find(role, model)
+        with self.timed("agent_build", model):
+            if role == "developer":
+                factory = DeveloperAgent(self.api_key, model=model, temperature=route.temperature, timeout=route.timeout)
+                bind_http_clients(factory.llm)
+                return factory.create_developer_agent()
+            factory = DebuggerAgent(self.api_key, model=model, temperature=route.temperature, timeout=route.timeout)
+            bind_http_clients(factory.llm)
+            return factory.create_debugger_agent()
+
+    def record_stage(self, stage, model, seconds, tokens=None):
+        """Add one run of a stage to the job's timings and the process metrics"""
+        STAGE_SECONDS.observe(seconds, stage=stage, model=model or "")
+        if tokens is not None:
+            STAGE_TOKENS.inc(tokens, stage=stage, model=model or "")
+        with self._timings_lock:
+            timing = self.timings.setdefault(stage, {"seconds": 0.0, "calls": 0})
+            timing["seconds"] += seconds
+            timing["calls"] += 1
+            if tokens is not None:
+                timing["tokens"] = timing.get("tokens", 0) + tokens
+
+    @contextmanager
+    def timed(self, stage, model=None):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record_stage(stage, model, time.perf_counter() - started)
+
+    def timings_summary(self):
+        """The job's stage timings, rounded for the completed event"""
+        with self._timings_lock:
+            stages = {
+                stage: dict(timing, seconds=round(timing["seconds"], 3))
+                for stage, timing in self.timings.items()
+            }
+        return {"stages": stages, "total": round(time.monotonic() - self.started_at, 3)}
+
+    def begin_iteration(self, iteration):
+        self.end_iteration()
+        self.iteration_span = self.tracer.start("iteration", parent=self.trace_parent, iteration=iteration + 1)
+
+    def end_iteration(self):
+        if self.iteration_span is not None:
+            self.iteration_span.end()
+            self.iteration_span = None
+
+    def finish(self, outcome, iterations):
+        """Record how the job ended; returns the fields for the completed event"""
+        ITERATIONS.observe(iterations, outcome=outcome)
+        JOBS.inc(outcome=outcome)
+        self.end_iteration()
+        return {"models": self.route.models(), "timings": self.timings_summary()}
+
+    def budget(self, role, expected=None):
+        """Token budget for the model the role is routed to, with room to reproduce expected (e.g. the previous code)"""
+        return self.budgets.budget(role, self.route.current(role).model, estimate_tokens(expected) if expected else 0)
+
+    def measure(self, role, task):
+        """Budget report for a task: its estimated prompt size against the role's budget"""
+        agent = task.agent
+        system = " ".join(str(getattr(agent, name, "") or "") for name in ("role", "goal", "backstory", "instructions"))
+        budget = self.budget(role)
+        tokens = estimate_tokens(system) + estimate_tokens(task.description)
+        report = dict(budget.to_dict(), prompt_tokens=tokens, compacted=[])
+        if tokens > budget.prompt:
+            report["over_budget"] = True
+        return report
+
+    def fix_context(self, requirements, code, feedback):
+        """
+        Build the developer's next prompt from the rejected code and feedback, compacted to fit
+        the developer's budget. Returns the prompt and its budget report.
+        """
+        overhead = self.measure("developer", self.create_development_task(""))["prompt_tokens"]
+        return fit_prompt(render_fix_context, requirements, code, feedback, self.budget("developer", code), overhead)
+
+    def use_routed_models(self):
+        """Switch to new agents for any role whose routed model changed"""
+        developer_model = self.route.current("developer").model
+        if agent_model(self.developer_agent) != developer_model:
+            agents = []
+            for k in range(self.candidates):
+                # Only the main developer may wait for the pool; extra candidates are built if none are free
+                agent = yield Checkout("developer", developer_model, optional=k > 0)
+                agents.append(agent or self.build_agent("developer", developer_model))
+            self.developer_agent = agents[0]
+            self.candidate_agents = agents
+        debugger_model = self.route.current("debugger").model
+        if agent_model(self.debugger_agent) != debugger_model:
+            self.debugger_agent = yield Checkout("debugger", debugger_model)
 
     def create_development_task(self, requirements):
         return Task(
@@ -42,6 +325,25 @@ class DevelopmentCrew:
             expected_output="Detailed feedback on the code including any issues found and suggestions for improvements, ending with either '-00' for rejection or '-11' for approval."
         )
 
+    def create_repair_task(self, code, feedback):
+        return Task(
+            description=dedent("""\
+                The code below was rejected. Fix ONLY the problems described in the feedback.
+                Do NOT output the whole page. Output one or more edit blocks in exactly this format:
+
+            """) + EDIT_FORMAT + dedent("""
+
+                Rules:
+                - The SEARCH part must be copied exactly from the current code and match it in one place only
+                - Keep each SEARCH part as short as possible while still being unique
+                - Output nothing except the edit blocks
+
+                Feedback:
+            """) + str(feedback) + "\n\nCurrent code:\n" + str(code),
+            agent=self.developer_agent,
+            expected_output="SEARCH/REPLACE edit blocks that fix the reported problems."
+        )
+
     def create_deployment_task(self, final_code):
         return Task(
             description=dedent(f"""\
@@ -55,66 +357,339 @@ class DevelopmentCrew:
             expected_output="Final code ready for deployment."
         )
 
-    def generate_updates(self, status, message, progress, result=None):
-        """Generate update as JSON"""
-        update = {
-            "status": status,
-            "message": message,
-            "progress": progress
-        }
+    def generate_updates(self, status, message, progress, result=None, **fields):
+        """Generate an update event; it is encoded once, when published"""
         if result:
-            # Convert result to string if it's not already serializable
-            try:
-                json.dumps(result)
-                update["result"] = result
-            except TypeError:
-                update["result"] = str(result)
-            
-        return f"data: {json.dumps(update)}\n\n"
+            fields["result"] = result
+        return Event(status, message, progress, **fields)
 
-    def run_crew(self, requirements):
+    def publish(self, event):
+        """Encode an event for every consumer and hand it to the sink"""
+        with self.timed("serialize"):
+            event.encode()
+        if self.sink is not None:
+            self.sink.emit(event)
+        return event
+
+    def run_developer(self, dev_task, iteration, previous_code=None):
+        """Run the developer task and return the generated code"""
+        dev_crew = Crew(
+            agents=[self.developer_agent],
+            tasks=[dev_task],
+            process=Process.sequential,
+            stream=self.stream,
+        )
+        overrides = dict(self.convergence.overrides(), max_tokens=self.budget("developer", previous_code).completion)
+        return (yield Kickoff(dev_crew, self.developer_agent, stream=self.stream, iteration=iteration, overrides=overrides,
+                              stage="developer"))
+
+    def package(self, code):
+        """Build the deployment bundle locally and return its manifest"""
+        with self.timed("package"):
+            bundle = package_code(code)
+            manifest = dict(bundle.manifest)
+            if self.package_dir:
+                manifest["path"] = bundle.write(self.package_dir)
+        return manifest
+
+    def run_repair(self, code, feedback):
+        """
+        Ask the developer for an edit script and apply it to the previous code.
+        Returns the repaired code, or None when the patch can't be used.
+        """
+        repair_task = self.create_repair_task(code, feedback)
+        if self.measure("developer", repair_task).get("over_budget"):
+            # Edits are applied to the full code, so the developer can be shown only the regions that matter
+            for context in range(CONTEXT_LINES, -1, -1):
+                repair_task = self.create_repair_task(elide_code(code, feedback, context=context), feedback)
+                if not self.measure("developer", repair_task).get("over_budget"):
+                    break
+            else:
+                return None
+        repair_crew = Crew(
+            agents=[self.developer_agent],
+            tasks=[repair_task],
+            process=Process.sequential,
+        )
+        overrides = dict(self.convergence.overrides(), max_tokens=self.budget("developer").completion)
+        response = yield Kickoff(repair_crew, self.developer_agent, overrides=overrides, stage="repair")
+        try:
+            repaired = apply_edit_script(code, parse_edit_script(response))
+        except PatchError:
+            return None
+        if OMITTED_MARKER.search(repaired):
+            # The developer copied an omission marker into its replacement
+            return None
+        # A patch that leaves the page structurally worse than before isn't a fix
+        if len(validate_html(repaired).issues) > len(validate_html(code).issues):
+            return None
+        return repaired
+
+    def review_code(self, code):
+        """
+        Review generated code according to the review mode.
+        Returns the debugger result and a summary of how the review was done.
+        """
+        debug_result, review = yield from self.run_review(code)
+        REVIEWS.inc(verdict="approved" if "-11" in str(debug_result) else "rejected", source=review["source"])
+        return debug_result, review
+
+    def review_iteration(self, code, iteration):
+        """
+        Review an iteration's code, or reuse the verdict when the debugger already reviewed the
+        same code. Returns the debugger result and review summary.
+        """
+        debugger_model = agent_model(self.debugger_agent)
+        reused = self.convergence.reviewed(code, debugger_model)
+        if reused is not None:
+            yield self.generate_updates("processing", f"Code unchanged since iteration {reused[1]['reused']}, reusing its review (iteration {iteration+1})",
+                                        25 + (iteration * 20), model=debugger_model)
+            return reused
+        yield self.generate_updates("processing", f"Debugger agent reviewing code (iteration {iteration+1})", 25 + (iteration * 20),
+                                    model=debugger_model)
+        debug_result, review = yield from self.review_code(code)
+        self.convergence.remember(iteration, code, debugger_model, debug_result, review)
+        return debug_result, review
+
+    def run_review(self, code):
+        with self.timed("validate"):
+            validation = validate_html(code)
+        if self.review_mode == "local" or (self.review_mode == "hybrid" and not validation.approved):
+            # Structural failures don't need a model to point them out
+            return validation.feedback(), {"source": "local", "confidence": 1.0, "validation": validation.to_dict()}
+
+        debug_task = self.create_debugging_task(code)
+        budget = self.measure("debugger", debug_task)
+        if budget.get("over_budget"):
+            # Too big for the debugger's context; the local validator has no size limit
+            return validation.feedback(), {"source": "local", "confidence": 1.0, "budget": budget,
+                                           "validation": validation.to_dict()}
+        debug_crew = Crew(
+            agents=[self.debugger_agent],
+            tasks=[debug_task],
+            process=Process.sequential,
+        )
+        debug_result = yield Kickoff(debug_crew, self.debugger_agent, overrides={"max_tokens": budget["completion"]},
+                                     stage="debugger")
+        return debug_result, {
+            "source": "llm",
+            "model": agent_model(self.debugger_agent),
+            "confidence": verdict_confidence(debug_result),
+            "budget": budget,
+            "validation": validation.to_dict()
+        }
+
+    def run_candidates(self, code_context, iteration, previous_code=None):
+        """
+        Generate several candidates concurrently and review them as they finish.
+        Returns the first approved candidate, or the one with the fewest structural issues.
+        """
+        kickoffs = []
+        for k, agent in enumerate(self.candidate_agents[:self.candidates]):
+            dev_crew = Crew(
+                agents=[agent],
+                tasks=[self.create_development_task(code_context)],
+                process=Process.sequential,
+            )
+            # Each candidate samples differently
+            overrides = {
+                "temperature": CANDIDATE_TEMPERATURES[k % len(CANDIDATE_TEMPERATURES)],
+                "seed": k,
+                "max_tokens": self.budget("developer", previous_code).completion
+            }
+            kickoffs.append(Kickoff(dev_crew, agent, iteration=iteration, overrides=overrides, stage="candidate"))
+
+        race = yield Race(kickoffs)
+        best = None
+        winner = None
+        while True:
+            finished = yield NextFinished(race)
+            if finished is None:
+                break
+            k, code, error = finished
+            if error is not None:
+                yield self.generate_updates("warning", f"Candidate {k+1} failed: {str(error)} (iteration {iteration+1})",
+                                            20 + (iteration * 20), candidate=k + 1)
+                continue
+            yield self.generate_updates("processing", f"Candidate {k+1} of {self.candidates} generated, reviewing (iteration {iteration+1})",
+                                        25 + (iteration * 20), candidate=k + 1)
+            reused = self.convergence.reviewed(code, agent_model(self.debugger_agent))
+            if reused is not None:
+                debug_result, review = reused
+            else:
+                debug_result, review = yield from self.review_code(code)
+                self.convergence.remember(iteration, code, agent_model(self.debugger_agent), debug_result, review)
+            review = dict(review, candidate=k + 1)
+            if "-11" in str(debug_result):
+                winner = (code, debug_result, review)
+                break
+            issues = len(review["validation"]["issues"])
+            if best is None or issues < best[0]:
+                best = (issues, code, debug_result, review)
+
+        # Drop the candidates that haven't finished yet
+        yield CancelRace(race)
+        if winner is not None:
+            return winner
+        if best is None:
+            raise RuntimeError(f"All {self.candidates} candidates failed (iteration {iteration+1})")
+        return best[1], best[2], best[3]
+
+    def save_state(self, iteration, step, code_context, last_code, debug_result, review=None):
+        """Yield a Checkpoint request if the crew has somewhere to save it"""
+        if self.checkpoint is not None:
+            yield Checkpoint({
+                "iteration": iteration,
+                "step": step,
+                "code_context": code_context,
+                "last_code": last_code,
+                "debug_result": debug_result,
+                "review": review,
+                "route": self.route.to_dict(),
+                "convergence": self.convergence.to_dict()
+            })
+
+    def switch_strategy(self, stall, iteration):
+        """
+        Try the next convergence strategy after the loop stalled.
+        Returns False when there are none left and the job should stop.
+        """
+        while True:
+            strategy = self.convergence.next_strategy()
+            if strategy is None:
+                STALLS.inc(action="stop")
+                return False
+            if strategy == "escalate":
+                route = self.route.escalate("developer")
+                if route is None:
+                    continue
+                self.route.rejections = 0
+                change = f"escalating developer to {route.model}"
+            elif strategy == "temperature":
+                if self.candidates > 1:
+                    # Candidates already sample at several temperatures
+                    continue
+                self.convergence.temperature = self.convergence.policy.temperature
+                change = f"raising developer temperature to {self.convergence.temperature}"
+            STALLS.inc(action=strategy)
+            yield self.generate_updates("processing", f"Not converging, {stall}; {change} (iteration {iteration+1})",
+                                        35 + (iteration * 20), strategy=strategy)
+            return True
+
+    def pipeline(self, requirements):
+        """
+        The development loop. Yields SSE updates for the client and Kickoff/Race
+        requests that the driver (run_crew or arun_crew) executes and answers.
+        """
         code_context = requirements
         approved = False
         last_code = None
         debug_result = None
+        review = None
+        context_budget = None
+        start, resumed_step = 0, None
 
-        # Send initial update
-        yield self.generate_updates("started", "Starting development process...", 0)
+        if self.resume:
+            # Pick up after the last step that was checkpointed
+            start, resumed_step = self.resume["iteration"], self.resume["step"]
+            code_context = self.resume["code_context"]
+            last_code = self.resume["last_code"]
+            debug_result = self.resume["debug_result"]
+            review = self.resume.get("review")
+            yield self.generate_updates("resumed", f"Resuming iteration {start+1} after the {resumed_step} step", 10 + (start * 20))
+        else:
+            # Send initial update
+            yield self.generate_updates("started", "Starting development process...", 0)
 
-        for i in range(self.max_iterations):
-            yield self.generate_updates("processing", f"Starting iteration {i+1} of {self.max_iterations}", 10 + (i * 20))
-            
-            # Developer writes or fixes code
-            yield self.generate_updates("processing", f"Developer agent generating code (iteration {i+1})", 15 + (i * 20))
-            dev_task = self.create_development_task(code_context)
-            dev_crew = Crew(
-                agents=[self.developer_agent],
-                tasks=[dev_task],
-                process=Process.sequential,
-            )
-            dev_result = dev_crew.kickoff()
-
-            # Convert CrewOutput to string
-            last_code = str(dev_result)
-            yield self.generate_updates("processing", f"Developer completed code generation (iteration {i+1})", 20 + (i * 20))
-
-            # Debugger reviews the actual code
-            yield self.generate_updates("processing", f"Debugger agent reviewing code (iteration {i+1})", 25 + (i * 20))
-            debug_task = self.create_debugging_task(last_code)
-            debug_crew = Crew(
-                agents=[self.debugger_agent],
-                tasks=[debug_task],
-                process=Process.sequential,
-            )
-            debug_result = debug_crew.kickoff()
-            
-            yield self.generate_updates("processing", f"Debugger completed review (iteration {i+1})", 30 + (i * 20))
+        for i in range(start, self.max_iterations):
+            self.begin_iteration(i)
+            yield from self.use_routed_models()
+            developer_model = agent_model(self.developer_agent)
+            if context_budget is None:
+                context_budget = self.measure("developer", self.create_development_task(code_context))
+            step = resumed_step if i == start else None
+            if step is None:
+                yield self.generate_updates("processing", f"Starting iteration {i+1} of {self.max_iterations}", 10 + (i * 20))
+
+                repaired = None
+                if last_code is not None and (self.repair_mode == "patch" or context_budget.get("over_budget")):
+                    # Fix the rejected code in place instead of regenerating the page; also tried when
+                    # the page is too big to regenerate from a prompt that fits
+                    yield self.generate_updates("processing", f"Developer agent patching code (iteration {i+1})", 15 + (i * 20),
+                                                model=developer_model)
+                    repaired = yield from self.run_repair(last_code, debug_result)
+                    if repaired is None:
+                        yield self.generate_updates("warning", f"Patch could not be applied, regenerating full code (iteration {i+1})", 15 + (i * 20))
+
+                if repaired is not None:
+                    last_code = repaired
+                    yield self.generate_updates("processing", f"Developer patch applied (iteration {i+1})", 20 + (i * 20),
+                                                model=developer_model)
+                    debug_result, review = yield from self.review_iteration(last_code, i)
+                    review = dict(review, patched=True)
+                    step = "debugger"
+                elif self.candidates > 1:
+                    # Several developers race; the first approved candidate wins
+                    yield self.generate_updates("processing", f"Generating {self.candidates} candidates (iteration {i+1})", 15 + (i * 20),
+                                                model=developer_model, budget=context_budget)
+                    last_code, debug_result, review = yield from self.run_candidates(code_context, i, last_code)
+                    step = "debugger"
+                else:
+                    # Developer writes or fixes code
+                    yield self.generate_updates("processing", f"Developer agent generating code (iteration {i+1})", 15 + (i * 20),
+                                                model=developer_model, budget=context_budget)
+                    dev_task = self.create_development_task(code_context)
+                    last_code = yield from self.run_developer(dev_task, i, last_code)
+                    yield self.generate_updates("processing", f"Developer completed code generation (iteration {i+1})", 20 + (i * 20),
+                                                model=developer_model)
+                    step = "developer"
+                yield from self.save_state(i, step, code_context, last_code, debug_result, review)
+
+            if step == "developer":
+                # Debugger reviews the actual code
+                debug_result, review = yield from self.review_iteration(last_code, i)
+                yield from self.save_state(i, "debugger", code_context, last_code, debug_result, review)
+
+            yield self.generate_updates("processing", f"Debugger completed review (iteration {i+1})", 30 + (i * 20),
+                                        review=review)
+            self.iteration_span.set(verdict="approved" if "-11" in str(debug_result) else "rejected",
+                                    review_source=review.get("source"), confidence=review.get("confidence"))
+
+            if "-11" not in str(debug_result):
+                # Move to a bigger model when the current one keeps failing or wasn't sure of its verdict
+                escalated = self.route.record_review(False, review.get("confidence", 1.0))
+                for role in escalated:
+                    yield self.generate_updates("processing", f"Escalating {role} to {self.route.current(role).model} (iteration {i+1})",
+                                                30 + (i * 20), role=role, model=self.route.current(role).model)
+                stall = self.convergence.observe(i, last_code, debug_result)
+                if stall is not None and "developer" in escalated:
+                    # The developer just moved to a new model, which is already a change of strategy
+                    self.convergence.stalls = 0
+                elif stall is not None and not (yield from self.switch_strategy(stall, i)):
+                    best = self.convergence.best
+                    yield self.generate_updates("completed", f"Stopped early, not converging: {stall}", 100, {
+                        "code": best["code"],
+                        "feedback": best["feedback"],
+                        "status": "not_converging",
+                        "reason": stall,
+                        "best_iteration": best["iteration"] + 1
+                    }, **self.finish("not_converging", i + 1))
+                    return
 
             # Check for approval codes
             if "-11" in str(debug_result):
                 approved = True
                 yield self.generate_updates("processing", f"Code approved by debugger (iteration {i+1})", 35 + (i * 20))
                 # Only deploy approved code
+                if self.deploy_mode == "local":
+                    yield self.generate_updates("processing", "Packaging approved code", 80)
+                    package = self.package(last_code)
+                    yield self.generate_updates("completed", "Process completed successfully", 100, {
+                        "code": last_code,
+                        "package": package
+                    }, **self.finish("approved", i + 1))
+                    return
+
                 yield self.generate_updates("processing", "Deploying approved code", 80)
                 deploy_task = self.create_deployment_task(last_code)
                 deploy_crew = Crew(
@@ -122,47 +697,273 @@ class DevelopmentCrew:
                     tasks=[deploy_task],
                     process=Process.sequential,
                 )
-                deploy_result = deploy_crew.kickoff()
+                deploy_result = yield Kickoff(deploy_crew, self.debugger_agent, stage="deploy")
 
                 yield self.generate_updates("completed", "Process completed successfully", 100, {
                     "code": last_code,
                     "deployment": str(deploy_result)
-                })
+                }, **self.finish("approved", i + 1))
                 return
             elif "-00" in str(debug_result):
                 # Feed feedback back to developer (not debugger)
-                code_context = f"""
-Original requirements:
-{requirements}
-
-Current code generated:
-{last_code}
-
-Debugger feedback:
-{debug_result}
-
-Please fix the code based on the feedback above.
-"""
+                code_context, context_budget = self.fix_context(requirements, last_code, debug_result)
                 yield self.generate_updates("processing", f"Code not approved, sending back to developer (iteration {i+1})", 35 + (i * 20))
             else:
                 # Handle case where neither code is found (fallback)
                 yield self.generate_updates("warning", f"Neither approval nor rejection code found, treating as rejection (iteration {i+1})", 35 + (i * 20))
-                code_context = f"""
-Original requirements:
-{requirements}
+                code_context, context_budget = self.fix_context(requirements, last_code, debug_result)
 
-Current code generated:
-{last_code}
+        # If we reach here, max iterations were reached without approval; return the best code seen
+        best = self.convergence.best or {"code": last_code, "feedback": str(debug_result), "iteration": self.max_iterations - 1}
+        yield self.generate_updates("completed", "Max iterations reached without approval", 100, {
+            "code": best["code"],
+            "feedback": best["feedback"],
+            "status": "max_iterations_reached",
+            "best_iteration": best["iteration"] + 1
+        }, **self.finish("max_iterations", self.max_iterations))
 
-Debugger feedback:
-{debug_result}
+    def delta_update(self, delta, iteration):
+        return self.generate_updates("delta", f"Developer output (iteration {iteration+1})", 15 + (iteration * 20),
+                                     delta=delta, iteration=iteration + 1)
 
-Please fix the code based on the feedback above.
-"""
+    def checkout(self, op):
+        """Answer a Checkout request from the agent provider, or build the agent"""
+        if self.agent_provider is not None:
+            return self.agent_provider(op.role, op.model, op.optional)
+        return None if op.optional else self.build_agent(op.role, op.model)
 
-        # If we reach here, max iterations were reached without approval
-        yield self.generate_updates("completed", "Max iterations reached without approval", 100, {
-            "code": last_code,
-            "feedback": str(debug_result),
-            "status": "max_iterations_reached"
-        })
\ No newline at end of file
+    def kickoff_span(self, op, model):
+        """Span for a kickoff; LLM requests made during it become its children"""
+        prompt_chars = sum(len(str(task.description)) for task in getattr(op.crew, "tasks", []))
+        return self.tracer.span("kickoff", parent=self.iteration_span or self.trace_parent, stage=op.stage,
+                                model=model, prompt_chars=prompt_chars, stream=op.stream)
+
+    def flush_span(self, update):
+        """Span for the consumer handling one SSE update (sending it, storing it)"""
+        return self.tracer.span("sse_flush", parent=self.trace_parent, bytes=len(update.encode()))
+
+    # Synchronous driver
+
+    def kickoff(self, op, inflight):
+        """Run a kickoff request on this thread; in streaming mode yields delta updates"""
+        model = agent_model(op.agent)
+        with inflight, llm_overrides(op.agent, op.overrides), STAGE_INFLIGHT.track(stage=op.stage, model=model), \
+                self.kickoff_span(op, model):
+            started = time.perf_counter()
+            if not op.stream:
+                # Convert CrewOutput to string
+                output = str(op.crew.kickoff())
+            else:
+                coalescer = DeltaCoalescer(self.delta_chars, self.delta_interval)
+                streaming = op.crew.kickoff()
+                for chunk in streaming:
+                    delta = coalescer.push(getattr(chunk, "content", ""))
+                    if delta:
+                        yield self.publish(self.delta_update(delta, op.iteration))
+                delta = coalescer.flush()
+                if delta:
+                    yield self.publish(self.delta_update(delta, op.iteration))
+                output = str(streaming.result)
+            self.record_stage(op.stage, model, time.perf_counter() - started, estimate_tokens(output))
+            return output
+
+    def run_crew(self, requirements):
+        """Run the pipeline synchronously, yielding update events"""
+        inflight = threading.BoundedSemaphore(self.max_inflight)
+        races = []
+        self.trace_parent = current_span()
+        pipeline = self.pipeline(requirements)
+        value, error = None, None
+        try:
+            while True:
+                try:
+                    op = pipeline.throw(error) if error is not None else pipeline.send(value)
+                except StopIteration:
+                    return
+                value, error = None, None
+                if isinstance(op, Event):
+                    self.publish(op)
+                    with self.flush_span(op):
+                        yield op
+                    continue
+                try:
+                    if isinstance(op, Kickoff):
+                        value = yield from self.kickoff(op, inflight)
+                    elif isinstance(op, Race):
+                        executor = ThreadPoolExecutor(max_workers=self.max_inflight)
+                        futures = {executor.submit(drain, self.kickoff(k, inflight)): i for i, k in enumerate(op.kickoffs)}
+                        value = SyncRace(executor, futures)
+                        races.append(value)
+                    elif isinstance(op, NextFinished):
+                        value = op.race.next_finished()
+                    elif isinstance(op, CancelRace):
+                        op.race.cancel()
+                    elif isinstance(op, Checkpoint):
+                        self.checkpoint(op.state)
+                    elif isinstance(op, Checkout):
+                        value = self.checkout(op)
+                except Exception as e:
+                    error = e
+        finally:
+            pipeline.close()
+            self.end_iteration()
+            if self.sink is not None:
+                self.sink.close()
+            # Agents may be returned to a pool after this, so generations that
+            # lost a race and couldn't be interrupted must finish first
+            for race in races:
+                race.wait()
+
+    # Asynchronous driver
+
+    async def akickoff(self, op, inflight, updates=None):
+        """Run a kickoff request with native async execution; delta updates go to updates"""
+        model = agent_model(op.agent)
+        async with inflight:
+            with llm_overrides(op.agent, op.overrides), STAGE_INFLIGHT.track(stage=op.stage, model=model), \
+                    self.kickoff_span(op, model):
+                started = time.perf_counter()
+                if not op.stream:
+                    output = str(await op.crew.akickoff())
+                else:
+                    coalescer = DeltaCoalescer(self.delta_chars, self.delta_interval)
+                    streaming = await op.crew.akickoff()
+                    async for chunk in streaming:
+                        delta = coalescer.push(getattr(chunk, "content", ""))
+                        if delta:
+                            await updates.put(self.delta_update(delta, op.iteration))
+                    delta = coalescer.flush()
+                    if delta:
+                        await updates.put(self.delta_update(delta, op.iteration))
+                    output = str(streaming.result)
+                self.record_stage(op.stage, model, time.perf_counter() - started, estimate_tokens(output))
+                return output
+
+    async def arun_crew(self, requirements):
+        """
+        Run the pipeline on the event loop, yielding update events.
+        Model calls use crewai's native async kickoff, so no thread is held per job.
+        """
+        inflight = asyncio.Semaphore(self.max_inflight)
+        races = []
+        self.trace_parent = current_span()
+        pipeline = self.pipeline(requirements)
+        value, error = None, None
+        try:
+            while True:
+                try:
+                    op = pipeline.throw(error) if error is not None else pipeline.send(value)
+                except StopIteration:
+                    return
+                value, error = None, None
+                if isinstance(op, Event):
+                    self.publish(op)
+                    with self.flush_span(op):
+                        yield op
+                    continue
+                try:
+                    if isinstance(op, Kickoff):
+                        if not op.stream:
+                            value = await self.akickoff(op, inflight)
+                            continue
+                        # Relay deltas while the kickoff runs
+                        deltas = asyncio.Queue()
+                        task = asyncio.ensure_future(self.akickoff(op, inflight, deltas))
+                        try:
+                            while not task.done() or not deltas.empty():
+                                getter = asyncio.ensure_future(deltas.get())
+                                await asyncio.wait({getter, task}, return_when=asyncio.FIRST_COMPLETED)
+                                if getter.done():
+                                    yield self.publish(getter.result())
+                                else:
+                                    getter.cancel()
+                            value = task.result()
+                        finally:
+                            task.cancel()
+                    elif isinstance(op, Race):
+                        value = AsyncRace([
+                            asyncio.ensure_future(self.akickoff(k, inflight)) for k in op.kickoffs
+                        ])
+                        races.append(value)
+                    elif isinstance(op, NextFinished):
+                        value = await op.race.next_finished()
+                    elif isinstance(op, CancelRace):
+                        await op.race.cancel()
+                    elif isinstance(op, Checkpoint):
+                        await asyncio.to_thread(self.checkpoint, op.state)
+                    elif isinstance(op, Checkout):
+                        value = self.checkout(op)
+                        if inspect.isawaitable(value):
+                            value = await value
+                except Exception as e:
+                    error = e
+        finally:
+            pipeline.close()
+            self.end_iteration()
+            if self.sink is not None:
+                self.sink.close()
+            for race in races:
+                await race.cancel()
+
+
+class SyncRace:
+    """Candidate kickoffs running on a thread pool"""
+
+    def __init__(self, executor, futures):
+        self.executor = executor
+        self.futures = futures
+        self._completed = as_completed(futures)
+
+    def next_finished(self):
+        """Block for the next finished kickoff: (index, output, error), or None when all are done"""
+        future = next(self._completed, None)
+        if future is None:
+            return None
+        try:
+            return self.futures[future], future.result(), None
+        except Exception as e:
+            return self.futures[future], None, e
+
+    def cancel(self):
+        # Queued kickoffs are cancelled; running ones can't be interrupted
+        for future in self.futures:
+            future.cancel()
+        self.executor.shutdown(wait=False)
+
+    def wait(self):
+        self.cancel()
+        for future in self.futures:
+            if not future.cancelled():
+                try:
+                    future.result()
+                except Exception:
+                    pass
+
+
+class AsyncRace:
+    """Candidate kickoffs running as tasks on the event loop"""
+
+    def __init__(self, tasks):
+        self.tasks = tasks
+        self._pending = set(tasks)
+        self._done = []
+
+    async def next_finished(self):
+        if not self._done:
+            if not self._pending:
+                return None
+            done, self._pending = await asyncio.wait(self._pending, return_when=asyncio.FIRST_COMPLETED)
+            self._done.extend(done)
+        task = self._done.pop()
+        index = self.tasks.index(task)
+        if task.cancelled():
+            return index, None, asyncio.CancelledError()
+        if task.exception() is not None:
+            return index, None, task.exception()
+        return index, task.result(), None
+
+    async def cancel(self):
+        # Unlike threads, tasks can be cancelled mid-request
+        for task in self.tasks:
+            task.cancel()
+        await asyncio.gather(*self.tasks, return_exceptions=True)
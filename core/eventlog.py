@@ -0,0 +1,83 @@
+"""
+Append-only event log that several readers can replay and tail at once.
+"""
+import asyncio
+import threading
+
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+
+class EventLog:
+    def __init__(self):
+        self._events = []
+        self._cond = threading.Condition()
+        # (loop, future) of async readers waiting for the next event
+        self._waiters = []
+        self.closed = False
+
+    def append(self, event):
+        """Add an event and wake up readers; returns its index"""
+        with self._cond:
+            if self.closed:
+                raise RuntimeError("Event log is closed")
+            self._events.append(event)
+            self._cond.notify_all()
+            self._wake_waiters_locked()
+            return len(self._events) - 1
+
+    def close(self):
+        """Mark the log complete; readers stop once they've caught up"""
+        with self._cond:
+            self.closed = True
+            self._cond.notify_all()
+            self._wake_waiters_locked()
+
+    def _wake_waiters_locked(self):
+        for loop, future in self._waiters:
+            loop.call_soon_threadsafe(_wake, future)
+        self._waiters = []
+
+    def __len__(self):
+        with self._cond:
+            return len(self._events)
+
+    def follow(self, start=0, timeout=None):
+        """
+        Yield events from index start onwards, waiting for new ones until the log is closed.
+        With a timeout, gives up after that many seconds without a new event.
+        """
+        position = start
+        while True:
+            with self._cond:
+                while position >= len(self._events) and not self.closed:
+                    if not self._cond.wait(timeout):
+                        return
+                if position >= len(self._events):
+                    return
+                batch = self._events[position:]
+            # Yield outside the lock so slow readers don't block writers
+            for event in batch:
+                yield event
+            position += len(batch)
+
+    async def afollow(self, start=0):
+        """Like follow, for readers on an event loop: waiting for new events doesn't hold a thread"""
+        loop = asyncio.get_running_loop()
+        position = start
+        while True:
+            with self._cond:
+                batch = self._events[position:]
+                if not batch:
+                    if self.closed:
+                        return
+                    future = loop.create_future()
+                    self._waiters.append((loop, future))
+            if not batch:
+                await future
+                continue
+            for event in batch:
+                yield event
+            position += len(batch)
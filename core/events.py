@@ -0,0 +1,188 @@
+"""
+Job events and where they go.
+The crew emits Event objects; an event's JSON payload and its SSE message are
+built once, the first time anything needs them, and then shared by every
+sink and subscriber, so ten dashboards watching a job cost one json.dumps per
+event rather than ten. Sinks deliver events somewhere (an SSE stream, stdout,
+an in-memory queue, a file) and an EventBus fans them out to several.
+"""
+import sys
+import json
+import queue
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Event:
+    """One update of a development job: status, message, progress and any extra fields"""
+
+    __slots__ = ("status", "message", "progress", "fields", "_json", "_sse", "_bytes")
+
+    def __init__(self, status, message, progress, **fields):
+        self.status = status
+        self.message = message
+        self.progress = progress
+        self.fields = fields
+        self._json = None
+        self._sse = None
+        self._bytes = None
+
+    @classmethod
+    def from_sse(cls, message):
+        """An event from its SSE message (e.g. one read back from the checkpoint store)"""
+        data = json.loads(message[message.index("data: ") + len("data: "):])
+        event = cls(data.pop("status"), data.pop("message"), data.pop("progress"), **data)
+        event._sse = message
+        return event
+
+    @property
+    def result(self):
+        return self.fields.get("result")
+
+    def to_dict(self):
+        update = {
+            "status": self.status,
+            "message": self.message,
+            "progress": self.progress
+        }
+        update.update(self.fields)
+        return update
+
+    @property
+    def json(self):
+        if self._json is None:
+            # Anything json can't encode (e.g. a CrewOutput) is sent as its string form
+            self._json = json.dumps(self.to_dict(), default=str)
+        return self._json
+
+    @property
+    def sse(self):
+        """The event as an SSE message"""
+        if self._sse is None:
+            self._sse = f"data: {self.json}\n\n"
+        return self._sse
+
+    def encode(self, encoding="utf-8"):
+        """The SSE message as bytes; like str.encode, so code handling either can call it"""
+        if self._bytes is None:
+            self._bytes = self.sse.encode(encoding)
+        return self._bytes
+
+    def __str__(self):
+        return self.sse
+
+    def __repr__(self):
+        return f"Event({self.status!r}, {self.message!r}, {self.progress!r})"
+
+
+def frame(index, update):
+    """An event (or its SSE text) as bytes with its index as the SSE id, for resumable streams"""
+    return b"id: %d\n" % index + update.encode("utf-8")
+
+
+class Sink:
+    """Somewhere events go. emit() is called for every event in order, close() once the job is over"""
+
+    def emit(self, event):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class SSESink(Sink):
+    """Writes events as SSE messages with a byte writer, e.g. a socket or a response body"""
+
+    def __init__(self, write):
+        self.write = write
+
+    def emit(self, event):
+        self.write(event.encode())
+
+
+class StdoutSink(Sink):
+    """Prints events as SSE messages, for command line runs and child processes"""
+
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+
+    def emit(self, event):
+        self.stream.write(event.sse)
+        self.stream.flush()
+
+
+class QueueSink(Sink):
+    """Collects events in memory for another thread; iterating yields them until the job is over"""
+
+    def __init__(self, maxsize=0):
+        self.queue = queue.Queue(maxsize)
+
+    def emit(self, event):
+        self.queue.put(event)
+
+    def close(self):
+        self.queue.put(None)
+
+    def __iter__(self):
+        while True:
+            event = self.queue.get()
+            if event is None:
+                return
+            yield event
+
+
+class FileSink(Sink):
+    """Appends events to a file as SSE messages"""
+
+    def __init__(self, path):
+        self.file = open(path, "ab")
+
+    def emit(self, event):
+        self.file.write(event.encode())
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class EventBus(Sink):
+    """
+    Fans events out to any number of sinks, which can come and go while the job runs.
+    A sink that raises is dropped so one broken subscriber can't stop the job.
+    """
+
+    def __init__(self, sinks=()):
+        self._sinks = list(sinks)
+        self._lock = threading.Lock()
+
+    def subscribe(self, sink):
+        with self._lock:
+            self._sinks.append(sink)
+        return sink
+
+    def unsubscribe(self, sink):
+        with self._lock:
+            if sink in self._sinks:
+                self._sinks.remove(sink)
+
+    def emit(self, event):
+        with self._lock:
+            sinks = list(self._sinks)
+        for sink in sinks:
+            try:
+                sink.emit(event)
+            except Exception as e:
+                # Logged, not printed: under the CLI stdout carries the event stream
+                logger.warning("Dropping event sink %s: %s", type(sink).__name__, e)
+                self.unsubscribe(sink)
+
+    def close(self):
+        with self._lock:
+            sinks, self._sinks = self._sinks, []
+        for sink in sinks:
+            try:
+                sink.close()
+            except Exception:
+                pass
@@ -1,36 +1,249 @@
 import os
 import sys
 import json
+from contextlib import ExitStack, AsyncExitStack, closing
 from dotenv import load_dotenv
-from core.crew import DevelopmentCrew
+from core.pool import get_agent_pool, PoolTimeout
+from core.cache import get_result_cache
+from core.jobs import get_job_manager, job_key
+from core.router import get_model_router
+from core.tracing import get_tracer
+from core.events import Event
+
+# Positional parameters of a development job, as stored with its checkpoints
+JOB_PARAMS = ("requirements", "max_iterations", "review_mode", "stream", "candidates", "max_inflight",
+              "repair_mode", "deploy_mode")
 
 class ExecutorClient:
     def __init__(self):
         # Load environment variables
         load_dotenv()
         self.api_key = os.getenv("SAMBANOVA_API_KEY") or "2cfa9823-371b-4dfa-a79f-f1cdf58905bf"
-        
-    def run_development_process(self, requirements, max_iterations=5):
+        self.pool = get_agent_pool(self.api_key)
+
+    def warm_up(self, count=None):
+        """
+        Pre-build pooled agents so the first request doesn't pay for construction
+        """
+        if count is None:
+            count = int(os.getenv("AGENT_POOL_PREWARM", "1"))
+        if count > 0:
+            self.pool.prewarm(count)
+
+    def format_update(self, status, message, progress, **fields):
+        return Event(status, message, progress, **fields)
+
+    def cache_variant(self, review_mode, deploy_mode):
+        """Everything besides the requirements that changes what a run produces"""
+        from core.crew import PROMPT_VERSION
+        return {
+            "prompt_version": PROMPT_VERSION,
+            "models": get_model_router().signature(),
+            "review_mode": review_mode,
+            "deploy_mode": deploy_mode
+        }
+
+    def replay_cached(self, entry, similarity):
+        """Replay a cached run as a short event sequence"""
+        yield self.format_update("started", "Starting development process...", 0)
+        if similarity < 1.0:
+            message = f"Found cached result for similar requirements (similarity {similarity:.2f})"
+        else:
+            message = "Found cached result for these requirements"
+        yield self.format_update("processing", message, 50)
+        yield self.format_update("completed", "Process completed successfully", 100,
+                                 result=entry["result"],
+                                 cache={"key": entry["key"], "similarity": round(similarity, 3)})
+
+    def submit(self, requirements, max_iterations=5, review_mode="hybrid", stream=False, candidates=1,
+               max_inflight=None, repair_mode="full", deploy_mode="local", use_cache=True, run_async=False):
+        """
+        Admit a development job.
+        Returns the job and a stream of its SSE events. Raises QueueFull when the job queue is at capacity.
+        With run_async the crew runs on the job queue's event loop (arun_crew) rather than a worker thread.
+        """
+        jobs = get_job_manager()
+        cache = get_result_cache() if use_cache else None
+        variant = self.cache_variant(review_mode, deploy_mode)
+        if cache is not None:
+            hit = cache.lookup(requirements, variant)
+            if hit is not None:
+                # Recorded as a finished job so the stream can be resumed like any other
+                job = jobs.record(self.replay_cached(*hit))
+                return job, jobs.follow(job)
+
+        args = (requirements, max_iterations, review_mode, stream, candidates, max_inflight, repair_mode, deploy_mode)
+        params = dict(zip(JOB_PARAMS, args), use_cache=use_cache, run_async=run_async)
+        # Identical jobs already queued or running are joined instead of started again
+        job = jobs.submit(self.job_runner(params), key=job_key(*args), params=params)
+        return job, jobs.follow(job)
+
+    def job_runner(self, params):
+        """Start function for a queued job described by params"""
+        params = dict(params)
+        use_cache = params.pop("use_cache", True)
+        run_async = params.pop("run_async", False)
+        args = [params[name] for name in JOB_PARAMS]
+
+        def start(job):
+            cache = get_result_cache() if use_cache else None
+            variant = self.cache_variant(params["review_mode"], params["deploy_mode"])
+            run = self.arun_and_cache if run_async else self.run_and_cache
+            return run(cache, variant, *args, job=job)
+        return start
+
+    def resume_jobs(self):
+        """
+        Requeue jobs a previous process left unfinished; they continue from their last checkpoint
+        """
+        return get_job_manager().recover(self.job_runner)
+
+    def run_development_process(self, requirements, max_iterations=5, **options):
         """
         Execute the development process with the given requirements
         """
+        _, updates = self.submit(requirements, max_iterations, **options)
+        for update in updates:
+            yield update.decode("utf-8")
+
+    def run_and_cache(self, cache, variant, requirements, *args, job=None):
+        """Run the crew and store the result if it was approved"""
+        updates = self.run_crew_process(requirements, *args, job=job)
+        for update in updates:
+            self.store_if_approved(cache, requirements, variant, update)
+            yield update
+
+    async def arun_and_cache(self, cache, variant, requirements, *args, job=None):
+        """run_and_cache on the event loop"""
+        updates = self.arun_crew_process(requirements, *args, job=job)
         try:
-            # Create and run the development crew
-            crew = DevelopmentCrew(self.api_key, max_iterations)
-            updates = crew.run_crew(requirements)
-            
-            # Yield each update
-            for update in updates:
+            async for update in updates:
+                self.store_if_approved(cache, requirements, variant, update)
                 yield update
+        finally:
+            await updates.aclose()
+
+    def store_if_approved(self, cache, requirements, variant, update):
+        if cache is None or update.status != "completed":
+            return
+        result = update.result
+        # Only approved runs are worth replaying
+        if isinstance(result, dict) and "status" not in result:
+            cache.store(requirements, variant, result)
+
+    def build_crew(self, developer, debugger, extra_developers, max_iterations, review_mode, stream, candidates,
+                   max_inflight, repair_mode, deploy_mode, job=None, agent_provider=None):
+        # Imported on first use so importing the servers doesn't load crewai (see core/warmup.py)
+        from core.crew import DevelopmentCrew
+        return DevelopmentCrew(
+            self.api_key,
+            max_iterations,
+            review_mode=review_mode,
+            stream=stream,
+            candidates=candidates,
+            max_inflight=max_inflight,
+            repair_mode=repair_mode,
+            deploy_mode=deploy_mode,
+            package_dir=os.getenv("PACKAGE_DIR"),
+            developer_agent=developer.agent,
+            debugger_agent=debugger.agent,
+            candidate_agents=[pooled.agent for pooled in extra_developers],
+            checkpoint=job.checkpoint if job is not None else None,
+            resume=job.resume_state if job is not None else None,
+            agent_provider=agent_provider
+        )
+
+    def job_span(self, requirements, max_iterations, review_mode, candidates, job=None):
+        """Root span of a job's trace; the trace ID is the job ID when there is one"""
+        return get_tracer().span("job", trace_id=job.id if job is not None else None,
+                                 job_id=job.id if job is not None else None, requirements_chars=len(requirements),
+                                 max_iterations=max_iterations, review_mode=review_mode, candidates=candidates)
+
+    def error_update(self, e):
+        return self.format_update("error", f"Error occurred during development process: {str(e)}", 0)
+
+    def run_crew_process(self, requirements, max_iterations, review_mode, stream, candidates, max_inflight,
+                         repair_mode, deploy_mode, job=None):
+        """
+        Run the development crew on pooled agents
+        """
+        try:
+            # Check warm agents out of the shared pool for the duration of this run
+            with ExitStack() as stack:
+                span = stack.enter_context(self.job_span(requirements, max_iterations, review_mode, candidates, job))
+                if job is not None:
+                    # Time between submission and a worker picking the job up
+                    get_tracer().record("queue", job.created_at, job.started_at, parent=span)
+                developer = stack.enter_context(self.pool.checkout("developer"))
+                debugger = stack.enter_context(self.pool.checkout("debugger"))
+                # Speculative candidates use spare pooled developers when there are any;
+                # the crew builds its own for the rest rather than waiting on other jobs
+                extra_developers = []
+                for _ in range(candidates - 1):
+                    try:
+                        extra_developers.append(stack.enter_context(self.pool.checkout("developer", timeout=0)))
+                    except PoolTimeout:
+                        break
+
+                def provide(role, model, optional):
+                    # Agents for models the router escalates to, held until the job ends
+                    try:
+                        return stack.enter_context(self.pool.checkout(role, 0 if optional else None, model)).agent
+                    except PoolTimeout:
+                        if optional:
+                            return None
+                        raise
+
+                crew = self.build_crew(developer, debugger, extra_developers, max_iterations, review_mode, stream,
+                                       candidates, max_inflight, repair_mode, deploy_mode, job, provide)
+                # Close the crew's generator before its agents go back to the pool
+                updates = stack.enter_context(closing(crew.run_crew(requirements)))
+
+                # Yield each update
+                for update in updates:
+                    yield update
                 
         except Exception as e:
             # Send error update
-            error_update = {
-                "status": "error",
-                "message": f"Error occurred during development process: {str(e)}",
-                "progress": 0
-            }
-            yield f"data: {json.dumps(error_update)}\n\n"
+            yield self.error_update(e)
+
+    async def arun_crew_process(self, requirements, max_iterations, review_mode, stream, candidates, max_inflight,
+                                repair_mode, deploy_mode, job=None):
+        """
+        run_crew_process on the event loop; model calls use crewai's async kickoff, so no thread is held
+        """
+        try:
+            async with AsyncExitStack() as stack:
+                span = stack.enter_context(self.job_span(requirements, max_iterations, review_mode, candidates, job))
+                if job is not None:
+                    get_tracer().record("queue", job.created_at, job.started_at, parent=span)
+                developer = await stack.enter_async_context(self.pool.acheckout("developer"))
+                debugger = await stack.enter_async_context(self.pool.acheckout("debugger"))
+                extra_developers = []
+                for _ in range(candidates - 1):
+                    try:
+                        extra_developers.append(await stack.enter_async_context(self.pool.acheckout("developer", timeout=0)))
+                    except PoolTimeout:
+                        break
+
+                async def provide(role, model, optional):
+                    try:
+                        pooled = await stack.enter_async_context(self.pool.acheckout(role, 0 if optional else None, model))
+                    except PoolTimeout:
+                        if optional:
+                            return None
+                        raise
+                    return pooled.agent
+
+                crew = self.build_crew(developer, debugger, extra_developers, max_iterations, review_mode, stream,
+                                       candidates, max_inflight, repair_mode, deploy_mode, job, provide)
+                updates = crew.arun_crew(requirements)
+                stack.push_async_callback(updates.aclose)
+                async for update in updates:
+                    yield update
+
+        except Exception as e:
+            yield self.error_update(e)
 
 # For direct CLI usage
 def main():
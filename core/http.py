@@ -0,0 +1,85 @@
+"""
+Shared HTTP clients for LLM traffic.
+LLMs handed out by the agent pool all talk to the model endpoint through the
+same keep-alive connection pools instead of opening new connections per job,
+and through the process-wide rate limiter (core/ratelimit.py). With a
+cassette configured (core/cassette.py), traffic under the rate limiter is
+recorded or replayed.
+"""
+import os
+import threading
+import httpx
+from core.ratelimit import get_rate_limiter, RateLimitedTransport, AsyncRateLimitedTransport
+from core.cassette import get_cassette, CassetteTransport, AsyncCassetteTransport
+
+_lock = threading.Lock()
+_client = None
+_async_client = None
+
+
+def http_limits():
+    """Connection limits for the shared clients, configurable from the environment"""
+    return httpx.Limits(
+        max_connections=int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("LLM_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "120"))
+    )
+
+
+def http_timeout():
+    return httpx.Timeout(float(os.getenv("LLM_HTTP_TIMEOUT", "600")), connect=10.0)
+
+
+def get_http_client():
+    """Return the process-wide synchronous HTTP client"""
+    global _client
+    with _lock:
+        if _client is None or _client.is_closed:
+            transport = httpx.HTTPTransport(limits=http_limits())
+            cassette = get_cassette()
+            if cassette is not None:
+                transport = CassetteTransport(transport, cassette)
+            transport = RateLimitedTransport(transport, get_rate_limiter())
+            _client = httpx.Client(transport=transport, timeout=http_timeout())
+        return _client
+
+
+def get_async_http_client():
+    """Return the process-wide asynchronous HTTP client"""
+    global _async_client
+    with _lock:
+        if _async_client is None or _async_client.is_closed:
+            transport = httpx.AsyncHTTPTransport(limits=http_limits())
+            cassette = get_cassette()
+            if cassette is not None:
+                transport = AsyncCassetteTransport(transport, cassette)
+            transport = AsyncRateLimitedTransport(transport, get_rate_limiter())
+            _async_client = httpx.AsyncClient(transport=transport, timeout=http_timeout())
+        return _async_client
+
+
+def bind_http_clients(llm):
+    """
+    Point an LLM's SDK clients at the shared HTTP clients.
+    Retries are left to the rate limiter, which coordinates them across jobs.
+    LLMs that don't expose OpenAI-style clients (e.g. the LiteLLM fallback) are left as they are.
+    """
+    client = getattr(llm, "client", None)
+    if client is not None and hasattr(client, "with_options"):
+        llm.client = client.with_options(http_client=get_http_client(), max_retries=0)
+    async_client = getattr(llm, "async_client", None)
+    if async_client is not None and hasattr(async_client, "with_options"):
+        llm.async_client = async_client.with_options(http_client=get_async_http_client(), max_retries=0)
+    return llm
+
+
+def close_http_clients():
+    """Close the shared clients (used on shutdown)"""
+    global _client, _async_client
+    with _lock:
+        if _client is not None:
+            _client.close()
+        # The async client is bound to whichever event loop used it and is
+        # simply dropped here; its connections close with that loop.
+        _client = None
+        _async_client = None
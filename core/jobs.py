@@ -0,0 +1,370 @@
+"""
+Job queue for development runs.
+A fixed number of worker threads run crews; further jobs wait in a bounded
+queue and stream `queued` events with their position, and submissions beyond
+the queue depth are refused with a retry hint instead of piling onto the API.
+Identical jobs that are already queued or running are joined rather than
+started again. Jobs run detached from the connections that follow them: every
+event is kept in the job's log with its index as the SSE id, so a client that
+drops can reconnect and resume from its Last-Event-ID. With a checkpoint store
+(core/checkpoint.py) jobs and their events also survive a restart.
+A job whose start function returns an async generator (the ASGI app's, see
+DevelopmentCrew.arun_crew) runs on a shared event loop instead and leaves its
+worker thread free; it still takes one of the worker slots.
+"""
+import os
+import json
+import math
+import time
+import uuid
+import asyncio
+import hashlib
+import inspect
+import threading
+from collections import deque
+from core.eventlog import EventLog
+from core.events import Event, frame
+from core.metrics import JOBS, JOB_SECONDS, JOB_QUEUE_SECONDS, JOB_STATES
+from core.checkpoint import get_checkpoint_store
+
+
+def job_key(*args, **kwargs):
+    """Stable key for a set of call arguments"""
+    payload = json.dumps({"args": args, "kwargs": kwargs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class QueueFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class Job:
+    """A queued or running pipeline and the events it has produced so far"""
+
+    def __init__(self, start, key=None, store=None, job_id=None):
+        self.id = job_id or uuid.uuid4().hex
+        self.key = key
+        # start(job) returns the generator (or async generator) of events the job runs
+        self.start = start
+        self.store = store
+        # Events framed with their SSE id and encoded once, shared by every follower
+        self.log = EventLog()
+        self._append_lock = threading.Lock()
+        self.state = "queued"
+        self.cancelled = threading.Event()
+        # Submissions that started or joined the job; it is cancelled once all of them have left
+        self.subscribers = 1
+        # Crew loop state to continue from when the job was recovered after a restart
+        self.resume_state = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+
+    def append(self, update):
+        """Add an event (or its SSE text) to the log; returns its index"""
+        with self._append_lock:
+            index = len(self.log)
+            self.log.append(frame(index, update))
+        if self.store is not None:
+            self.store.append_event(self.id, index, str(update))
+        return index
+
+    def checkpoint(self, state):
+        """Durably record the crew loop's state after a completed step"""
+        if self.store is not None:
+            self.store.save(self.id, state)
+
+    def to_dict(self):
+        return {
+            "job_id": self.id,
+            "state": self.state,
+            "events": len(self.log),
+            "subscribers": self.subscribers,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at
+        }
+
+    def queued_update(self, position):
+        return Event("queued", f"Waiting for a free worker ({position} ahead in queue)", 0,
+                     job_id=self.id, position=position)
+
+
+class JobManager:
+    def __init__(self, workers=4, max_queue=16, expected_duration=60.0, coalesce=True, retention=600, store=None):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.coalesce = coalesce
+        # How long finished jobs stay available for reconnecting clients
+        self.retention = retention
+        self.store = store
+        # Moving average of job run time, used for Retry-After estimates
+        self.average_duration = expected_duration
+        self._cond = threading.Condition()
+        self._queue = deque()
+        self._jobs = {}
+        self._by_key = {}
+        self._running = 0
+        self._threads = []
+        # Event loop that runs async jobs, started on first use
+        self._loop = None
+
+    def _event_loop(self):
+        with self._cond:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True, name="job-loop").start()
+            return self._loop
+
+    def _ensure_workers(self):
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def retry_after(self):
+        """Seconds until a queue slot is likely to free up"""
+        with self._cond:
+            return self._retry_after_locked()
+
+    def _retry_after_locked(self):
+        waiting = len(self._queue) + self._running
+        return max(1, math.ceil(self.average_duration * waiting / self.workers))
+
+    def submit(self, start, key=None, params=None):
+        """
+        Queue start(job) to run on a worker, or join the identical job already queued or running.
+        start must return a generator or an async generator of events. Raises QueueFull when there is no room.
+        params describe the job for the checkpoint store, so it can be recovered after a restart.
+        """
+        with self._cond:
+            self._prune_locked()
+            if self.coalesce and key is not None:
+                job = self._by_key.get(key)
+                if job is not None and not job.cancelled.is_set():
+                    job.subscribers += 1
+                    return job
+            if len(self._queue) >= self.max_queue:
+                raise QueueFull(self._retry_after_locked())
+
+            store = self.store if params is not None else None
+            job = Job(start, key, store)
+            if store is not None:
+                store.create_job(job.id, key, params)
+            self._enqueue_locked(job)
+            return job
+
+    def _enqueue_locked(self, job):
+        self._jobs[job.id] = job
+        if job.key is not None:
+            self._by_key[job.key] = job
+        self._queue.append(job)
+        job.append(job.queued_update(len(self._queue) - 1))
+        self._ensure_workers()
+        self._cond.notify()
+
+    def recover(self, runner):
+        """
+        Take over the jobs a dead process left in the checkpoint store.
+        Unfinished jobs are queued again with runner(params) as their start function and
+        continue from their last checkpoint; recently finished ones are kept for replay.
+        Returns the number of jobs requeued.
+        """
+        if self.store is None:
+            return 0
+        requeued = 0
+        for record in self.store.claim_orphans(self.retention):
+            job = Job(runner(record["params"]), record["key"], self.store, job_id=record["job_id"])
+            for index, update in enumerate(self.store.events(job.id)):
+                job.log.append(frame(index, update))
+            with self._cond:
+                if record["state"] in ("done", "cancelled"):
+                    job.state = record["state"]
+                    job.finished_at = record["updated_at"]
+                    job.log.close()
+                    self._jobs[job.id] = job
+                    continue
+                job.resume_state = record["checkpoint"]
+                self._enqueue_locked(job)
+                requeued += 1
+        return requeued
+
+    def record(self, updates):
+        """Register an already finished job made of the given events, e.g. a cache replay"""
+        job = Job(None)
+        for update in updates:
+            job.append(update)
+        job.started_at = job.created_at
+        with self._cond:
+            self._prune_locked()
+            self._jobs[job.id] = job
+        self._finish(job, "done")
+        return job
+
+    def _prune_locked(self):
+        now = time.time()
+        expired = [
+            job_id for job_id, job in self._jobs.items()
+            if job.finished_at is not None and now - job.finished_at > self.retention
+        ]
+        for job_id in expired:
+            del self._jobs[job_id]
+            if self.store is not None:
+                self.store.delete(job_id)
+
+    def _announce_positions(self):
+        for position, job in enumerate(self._queue):
+            job.append(job.queued_update(position))
+
+    def _work(self):
+        while True:
+            with self._cond:
+                # Slots are counted rather than threads, since async jobs give their thread back
+                while not self._queue or self._running >= self.workers:
+                    self._cond.wait()
+                job = self._queue.popleft()
+                job.state = "running"
+                job.started_at = time.time()
+                JOB_QUEUE_SECONDS.observe(job.started_at - job.created_at)
+                self._running += 1
+                self._announce_positions()
+            try:
+                updates = job.start(job)
+            except Exception as e:
+                self._fail(job, e)
+                self._done(job)
+                continue
+            if inspect.isasyncgen(updates):
+                asyncio.run_coroutine_threadsafe(self._arun(job, updates), self._event_loop())
+            else:
+                self._run(job, updates)
+
+    def _run(self, job, updates):
+        try:
+            for update in updates:
+                if job.cancelled.is_set():
+                    break
+                job.append(update)
+        except Exception as e:
+            self._fail(job, e)
+        finally:
+            # Closing the generator lets the pipeline release its agents
+            updates.close()
+            self._done(job)
+
+    async def _arun(self, job, updates):
+        """_run for an async job, on the job event loop; checkpoint writes happen off the loop"""
+        try:
+            async for update in updates:
+                if job.cancelled.is_set():
+                    break
+                await asyncio.to_thread(job.append, update)
+        except Exception as e:
+            await asyncio.to_thread(self._fail, job, e)
+        finally:
+            await updates.aclose()
+            await asyncio.to_thread(self._done, job)
+
+    def _fail(self, job, e):
+        job.append(Event("error", f"Job failed: {str(e)}", 0, job_id=job.id))
+        JOBS.inc(outcome="error")
+
+    def _done(self, job):
+        """Finish a job that ran and free its slot"""
+        self._finish(job, "cancelled" if job.cancelled.is_set() else "done")
+        with self._cond:
+            self._running -= 1
+            duration = job.finished_at - job.started_at
+            JOB_SECONDS.observe(duration, state=job.state)
+            self.average_duration = 0.8 * self.average_duration + 0.2 * duration
+            self._cond.notify_all()
+
+    def _finish(self, job, state):
+        if state == "cancelled":
+            JOBS.inc(outcome="cancelled")
+        job.state = state
+        job.finished_at = time.time()
+        job.log.close()
+        if job.store is not None:
+            job.store.finish(job.id, state)
+        with self._cond:
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    def follow(self, job, start=0):
+        """
+        Yield the job's events as encoded SSE messages from index start onwards, waiting for new
+        ones until the job finishes. Each event carries its index as the id, so clients can resume
+        with Last-Event-ID; leaving early does not affect the job. Every follower gets the same bytes.
+        """
+        return job.log.follow(start)
+
+    def afollow(self, job, start=0):
+        """follow for servers running on an event loop"""
+        return job.log.afollow(start)
+
+    def cancel(self, job):
+        """
+        Detach one subscriber from a job, stopping it when it was the last one; a running job
+        stops at its next event. Returns whether the job was cancelled.
+        """
+        with self._cond:
+            if job.log.closed:
+                return False
+            job.subscribers = max(0, job.subscribers - 1)
+            if job.subscribers:
+                return False
+            job.cancelled.set()
+            if job.key is not None and self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+            if job.state != "queued":
+                return True
+            self._queue.remove(job)
+            self._announce_positions()
+        self._finish(job, "cancelled")
+        return True
+
+    def get(self, job_id):
+        with self._cond:
+            self._prune_locked()
+            return self._jobs.get(job_id)
+
+    def gauge_values(self):
+        """Queued and running job counts, for the crew_jobs gauge"""
+        with self._cond:
+            return {("queued",): len(self._queue), ("running",): self._running}
+
+    def stats(self):
+        with self._cond:
+            return {
+                "workers": self.workers,
+                "running": self._running,
+                "queued": len(self._queue),
+                "max_queue": self.max_queue,
+                "average_duration": round(self.average_duration, 2)
+            }
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    """Return the process-wide job manager, creating it on first use"""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager(
+                workers=int(os.getenv("JOB_WORKERS", os.getenv("AGENT_POOL_SIZE", "4"))),
+                max_queue=int(os.getenv("JOB_QUEUE_DEPTH", "16")),
+                expected_duration=float(os.getenv("JOB_EXPECTED_SECONDS", "60")),
+                coalesce=os.getenv("SINGLE_FLIGHT", "1").lower() not in ("0", "false", "no", "off"),
+                retention=float(os.getenv("JOB_RETENTION", "600")),
+                store=get_checkpoint_store()
+            )
+            JOB_STATES.callback = _manager.gauge_values
+        return _manager
@@ -0,0 +1,185 @@
+"""
+Process-wide metrics in the Prometheus text exposition format.
+Counters, gauges and histograms are keyed by label values; gauges can also be
+backed by a callback that is read at scrape time (queue depth, pool sizes).
+"""
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; spans cheap local steps up to long model calls
+DEFAULT_BUCKETS = (0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+
+
+def format_labels(names, values):
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        escaped = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        pairs.append(f'{name}="{escaped}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self):
+        """(suffix, label names, label values, value) tuples"""
+        with self._lock:
+            return [("", self.labels, key, value) for key, value in self._values.items()]
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for suffix, names, values, value in self.samples():
+            lines.append(f"{self.name}{suffix}{format_labels(names, values)} {value:g}")
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, help, labels=(), callback=None):
+        super().__init__(name, help, labels)
+        # callback() returns {label values tuple: value}, read at scrape time
+        self.callback = callback
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self.key(labels)] = value
+
+    def inc(self, amount=1, **labels):
+        key = self.key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    @contextmanager
+    def track(self, **labels):
+        """Count something as in progress for the duration of the block"""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def samples(self):
+        if self.callback is None:
+            return super().samples()
+        try:
+            values = self.callback()
+        except Exception:
+            return []
+        return [("", self.labels, key, value) for key, value in values.items()]
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self.key(labels)
+        with self._lock:
+            counts, total, observations = self._values.get(key, ((0,) * len(self.buckets), 0.0, 0))
+            counts = tuple(count + (value <= bound) for count, bound in zip(counts, self.buckets))
+            self._values[key] = (counts, total + value, observations + 1)
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = list(self._values.items())
+        names = self.labels + ("le",)
+        for key, (counts, total, observations) in items:
+            for bound, count in zip(self.buckets, counts):
+                samples.append(("_bucket", names, key + (f"{bound:g}",), count))
+            samples.append(("_bucket", names, key + ("+Inf",), observations))
+            samples.append(("_sum", self.labels, key, total))
+            samples.append(("_count", self.labels, key, observations))
+        return samples
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def gauge(self, name, help, labels=(), callback=None):
+        return self.register(Gauge(name, help, labels, callback))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "crew_stage_seconds", "Time spent per pipeline stage", ("stage", "model"))
+STAGE_TOKENS = REGISTRY.counter(
+    "crew_stage_output_tokens_total", "Estimated tokens generated per pipeline stage", ("stage", "model"))
+STAGE_INFLIGHT = REGISTRY.gauge(
+    "crew_stage_inflight", "Kickoffs currently running per pipeline stage", ("stage", "model"))
+LLM_TOKENS = REGISTRY.counter(
+    "llm_tokens_total", "Tokens reported by the model API", ("model", "kind"))
+LLM_REQUESTS = REGISTRY.counter(
+    "llm_requests_total", "Model API responses by status code", ("model", "status"))
+LLM_INFLIGHT = REGISTRY.gauge(
+    "llm_inflight_requests", "Model API requests in flight", ("model",))
+REVIEWS = REGISTRY.counter(
+    "crew_reviews_total", "Code reviews by verdict and reviewer", ("verdict", "source"))
+ITERATIONS = REGISTRY.histogram(
+    "crew_iterations", "Iterations used per job", ("outcome",), buckets=(1, 2, 3, 4, 5, 7, 10))
+JOBS = REGISTRY.counter(
+    "crew_jobs_total", "Finished jobs by outcome (approved, max_iterations, not_converging, error, cancelled)", ("outcome",))
+STALLS = REGISTRY.counter(
+    "crew_convergence_stalls_total", "Stalled development loops by what was done about it", ("action",))
+JOB_SECONDS = REGISTRY.histogram(
+    "crew_job_seconds", "Time from a job starting to run until it finished", ("state",))
+JOB_QUEUE_SECONDS = REGISTRY.histogram(
+    "crew_job_queue_seconds", "Time jobs waited in the queue before a worker picked them up")
+# Read from the job manager and agent pool at scrape time
+JOB_STATES = REGISTRY.gauge(
+    "crew_jobs", "Jobs currently queued or running", ("state",))
+POOL_AGENTS = REGISTRY.gauge(
+    "agent_pool_agents", "Pooled agents by role, model and whether they are idle", ("role", "model", "state"))
+
+
+def get_registry():
+    """Return the process-wide metrics registry"""
+    return REGISTRY
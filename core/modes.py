@@ -0,0 +1,21 @@
+"""
+Modes a development run can be configured with.
+Kept apart from core/crew.py so requests can be validated without importing crewai.
+"""
+
+# How generated code is reviewed each iteration:
+#   llm    - always ask the debugger agent
+#   local  - only run the local structural validator
+#   hybrid - run the local validator and only ask the debugger agent when it passes
+REVIEW_MODES = ("llm", "local", "hybrid")
+
+# How rejected code is fixed:
+#   full  - regenerate the whole page from the requirements, code and feedback
+#   patch - ask for a search/replace edit script against the previous code,
+#           falling back to full regeneration when it doesn't apply
+REPAIR_MODES = ("full", "patch")
+
+# How approved code is prepared for deployment:
+#   local - minify, hash and precompress it in-process (see core/packager.py)
+#   llm   - hand it to the debugger agent to package
+DEPLOY_MODES = ("local", "llm")
@@ -0,0 +1,55 @@
+"""
+Parsing of /generate request bodies, shared by the Flask and ASGI apps.
+"""
+import os
+from core.modes import REVIEW_MODES, REPAIR_MODES, DEPLOY_MODES
+
+
+class OptionsError(ValueError):
+    """Raised when a request body has missing or invalid fields"""
+
+
+def parse_generate_request(data):
+    """
+    Validate a /generate request body.
+    Returns the requirements and the keyword options for run_development_process.
+    """
+    if not isinstance(data, dict):
+        raise OptionsError("Request body must be a JSON object")
+    requirements = data.get('requirements', '')
+    max_iterations = data.get('max_iterations', 5)
+    review_mode = data.get('review_mode', os.environ.get('REVIEW_MODE', 'hybrid'))
+    repair_mode = data.get('repair_mode', os.environ.get('REPAIR_MODE', 'full'))
+    deploy_mode = data.get('deploy_mode', os.environ.get('DEPLOY_MODE', 'local'))
+    stream = bool(data.get('stream', False))
+    use_cache = bool(data.get('cache', True))
+    max_candidates = int(os.environ.get('MAX_CANDIDATES', 5))
+    try:
+        candidates = int(data.get('candidates', 1))
+        max_inflight = int(data['max_inflight']) if data.get('max_inflight') else None
+    except (TypeError, ValueError):
+        raise OptionsError('candidates and max_inflight must be integers')
+
+    if not requirements:
+        raise OptionsError('No requirements provided')
+    if review_mode not in REVIEW_MODES:
+        raise OptionsError(f"review_mode must be one of: {', '.join(REVIEW_MODES)}")
+    if repair_mode not in REPAIR_MODES:
+        raise OptionsError(f"repair_mode must be one of: {', '.join(REPAIR_MODES)}")
+    if deploy_mode not in DEPLOY_MODES:
+        raise OptionsError(f"deploy_mode must be one of: {', '.join(DEPLOY_MODES)}")
+    if not 1 <= candidates <= max_candidates:
+        raise OptionsError(f'candidates must be between 1 and {max_candidates}')
+    if max_inflight is not None and max_inflight < 1:
+        raise OptionsError('max_inflight must be at least 1')
+
+    return requirements, {
+        "max_iterations": max_iterations,
+        "review_mode": review_mode,
+        "stream": stream,
+        "candidates": candidates,
+        "max_inflight": max_inflight,
+        "repair_mode": repair_mode,
+        "deploy_mode": deploy_mode,
+        "use_cache": use_cache
+    }
@@ -0,0 +1,118 @@
+"""
+Local deployment packager.
+Turns approved code into a deployable bundle (minified page, content hash,
+precompressed variants and a manifest) without another LLM round-trip.
+"""
+import os
+import re
+import gzip
+import json
+import hashlib
+
+try:
+    import brotli
+except ImportError:  # in requirements.txt; without it bundles just skip the .br variant
+    brotli = None
+
+# Blocks whose contents must not be touched by HTML whitespace collapsing
+RAW_BLOCK = re.compile(r"(<(script|style|pre|textarea)\b[^>]*>)(.*?)(</\2\s*>)", re.IGNORECASE | re.DOTALL)
+HTML_COMMENT = re.compile(r"<!--(?!\[if).*?-->", re.DOTALL)
+# Strings are matched alongside comments so neither is mistaken for the other
+CSS_STRING_OR_COMMENT = re.compile(r"(\"(?:\\.|[^\"\\])*\"|'(?:\\.|[^'\\])*')|/\*.*?\*/", re.DOTALL)
+CSS_PUNCTUATION = re.compile(r"([{};])")
+
+
+def minify_css(css):
+    """
+    Drop comments and collapse whitespace. Selectors keep a single space wherever they had
+    any, since it can be a descendant combinator (".card :hover" is not ".card:hover");
+    only declarations lose the space around their colon. Strings are left untouched.
+    """
+    strings = []
+
+    def stash(match):
+        if match.group(1) is None:
+            return " "
+        strings.append(match.group(1))
+        return f"\x00{len(strings) - 1}\x00"
+
+    parts = CSS_PUNCTUATION.split(CSS_STRING_OR_COMMENT.sub(stash, css))
+    output = []
+    for index in range(0, len(parts), 2):
+        text = " ".join(parts[index].split())
+        after = parts[index + 1] if index + 1 < len(parts) else ""
+        if after in (";", "}") and ":" in text:
+            name, _, value = text.partition(":")
+            text = f"{name.strip()}:{value.strip()}"
+        output.append(text + after)
+    css = "".join(output).replace(";}", "}")
+    return re.sub(r"\x00(\d+)\x00", lambda m: strings[int(m.group(1))], css).strip()
+
+
+def minify_html(html):
+    blocks = []
+
+    def stash(match):
+        open_tag, name, body, close_tag = match.groups()
+        name = name.lower()
+        # Scripts are kept as they are: without a tokenizer, comments can't be told from strings
+        if name == "style":
+            body = minify_css(body)
+        blocks.append(open_tag + body + close_tag)
+        return f"\x00{len(blocks) - 1}\x00"
+
+    html = RAW_BLOCK.sub(stash, html)
+    html = HTML_COMMENT.sub("", html)
+    html = re.sub(r"\s+", " ", html)
+    html = re.sub(r"\x00(\d+)\x00", lambda m: blocks[int(m.group(1))], html)
+    return html.strip()
+
+
+class Bundle:
+    """A packaged page: file contents keyed by path plus a manifest describing them"""
+
+    def __init__(self, files, manifest):
+        self.files = files
+        self.manifest = manifest
+
+    def write(self, directory):
+        """Write the bundle to directory/<hash>/ and return that path"""
+        target = os.path.join(directory, self.manifest["hash"])
+        os.makedirs(target, exist_ok=True)
+        for path, content in self.files.items():
+            with open(os.path.join(target, path), "wb") as f:
+                f.write(content)
+        with open(os.path.join(target, "manifest.json"), "w") as f:
+            json.dump(self.manifest, f, indent=2)
+        return target
+
+
+def package_code(code, entry="index.html"):
+    """Build a deterministic bundle from approved code"""
+    source = str(code).strip()
+    page = minify_html(source).encode("utf-8")
+    digest = hashlib.sha256(page).hexdigest()
+
+    files = {entry: page}
+    # mtime=0 keeps the gzip bytes identical for identical input
+    files[entry + ".gz"] = gzip.compress(page, compresslevel=9, mtime=0)
+    if brotli is not None:
+        files[entry + ".br"] = brotli.compress(page, quality=11)
+
+    encodings = {entry: "identity", entry + ".gz": "gzip", entry + ".br": "br"}
+    manifest = {
+        "entry": entry,
+        "hash": digest[:16],
+        "etag": f'"{digest[:32]}"',
+        "source_size": len(source.encode("utf-8")),
+        "files": [
+            {
+                "path": path,
+                "encoding": encodings[path],
+                "size": len(content),
+                "sha256": hashlib.sha256(content).hexdigest()
+            }
+            for path, content in files.items()
+        ]
+    }
+    return Bundle(files, manifest)
@@ -0,0 +1,71 @@
+"""
+Search/replace edit scripts for repair iterations.
+Instead of regenerating a whole page to fix a small issue, the developer returns
+a list of hunks that are applied to the previous code locally.
+"""
+import re
+
+EDIT_FORMAT = """\
+<<<<<<< SEARCH
+exact lines copied from the current code
+=======
+replacement lines
+>>>>>>> REPLACE"""
+
+HUNK = re.compile(
+    r"<{5,9} ?SEARCH[ \t]*\r?\n(.*?)\r?\n?={5,9}[ \t]*\r?\n(.*?)\r?\n?>{5,9} ?REPLACE",
+    re.DOTALL
+)
+
+
+class PatchError(Exception):
+    """Raised when an edit script can't be parsed or applied"""
+
+
+def parse_edit_script(text):
+    """Extract (search, replace) hunks from the developer's response"""
+    hunks = HUNK.findall(str(text or ""))
+    if not hunks:
+        raise PatchError("No SEARCH/REPLACE hunks found in the response")
+    return hunks
+
+
+def _find_lines(code, search):
+    """
+    Locate search in code line by line ignoring surrounding whitespace.
+    Returns the (start, end) character span or None.
+    """
+    wanted = [line.strip() for line in search.strip("\n").splitlines()]
+    if not wanted:
+        return None
+    lines = code.splitlines(keepends=True)
+    stripped = [line.strip() for line in lines]
+    matches = [
+        i for i in range(len(lines) - len(wanted) + 1)
+        if stripped[i:i + len(wanted)] == wanted
+    ]
+    if len(matches) != 1:
+        return None
+    start = sum(len(line) for line in lines[:matches[0]])
+    end = start + sum(len(line) for line in lines[matches[0]:matches[0] + len(wanted)])
+    return start, end
+
+
+def apply_edit_script(code, hunks):
+    """Apply hunks in order; every search block must match exactly one place"""
+    for number, (search, replace) in enumerate(hunks, 1):
+        if not search.strip():
+            raise PatchError(f"Hunk {number} has an empty SEARCH block")
+        count = code.count(search)
+        if count == 1:
+            code = code.replace(search, replace, 1)
+            continue
+        if count > 1:
+            raise PatchError(f"Hunk {number} matches {count} places in the code")
+        span = _find_lines(code, search)
+        if span is None:
+            raise PatchError(f"Hunk {number} does not match the current code")
+        start, end = span
+        trailing = "\n" if code[start:end].endswith("\n") and not replace.endswith("\n") else ""
+        code = code[:start] + replace + trailing + code[end:]
+    return code
@@ -0,0 +1,210 @@
+"""
+Process-wide pool of ready-to-use agents.
+Building an agent means building its LLM and SDK clients, so agents are created
+once, checked out per job and returned afterwards instead of rebuilt per request.
+Agents are pooled per role and model, since the model router (core/router.py)
+can move a job to a different model mid-run.
+"""
+import os
+import time
+import asyncio
+import threading
+from contextlib import contextmanager, asynccontextmanager
+from core.http import bind_http_clients
+from core.router import get_model_router
+from core.metrics import STAGE_SECONDS, POOL_AGENTS
+from core.tracing import get_tracer
+
+ROLES = ("developer", "debugger")
+
+
+class PoolTimeout(Exception):
+    """Raised when no agent becomes available within the checkout timeout"""
+
+
+class PooledAgent:
+    """An agent checked out of the pool together with the LLM it runs on"""
+
+    def __init__(self, role, model, agent, llm):
+        self.role = role
+        self.model = model
+        self.agent = agent
+        self.llm = llm
+        self.created_at = time.monotonic()
+        self.uses = 0
+        self.broken = False
+
+    def mark_broken(self):
+        """Flag the agent so it is evicted instead of returned to the pool"""
+        self.broken = True
+
+
+class AgentPool:
+    def __init__(self, api_key, max_size=4, max_uses=200, max_age=3600, checkout_timeout=60):
+        self.api_key = api_key
+        self.max_size = max_size
+        self.max_uses = max_uses
+        self.max_age = max_age
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        # Keyed by (role, model); each key is bounded by max_size separately
+        self._idle = {}
+        self._total = {}
+        self._evicted = 0
+
+    def _build(self, role, model):
+        # Imported here: loading crewai is the slowest part of startup (see core/warmup.py)
+        from agents.developer_agent import DeveloperAgent
+        from agents.debugger_agent import DebuggerAgent
+        route = get_model_router().find(role, model)
+        if role == "developer":
+            factory = DeveloperAgent(self.api_key, model=model, temperature=route.temperature, timeout=route.timeout)
+            bind_http_clients(factory.llm)
+            return PooledAgent(role, model, factory.create_developer_agent(), factory.llm)
+        if role == "debugger":
+            factory = DebuggerAgent(self.api_key, model=model, temperature=route.temperature, timeout=route.timeout)
+            bind_http_clients(factory.llm)
+            return PooledAgent(role, model, factory.create_debugger_agent(), factory.llm)
+        raise ValueError(f"Unknown agent role: {role}")
+
+    def _healthy(self, pooled):
+        if pooled.broken:
+            return False
+        if self.max_uses and pooled.uses >= self.max_uses:
+            return False
+        if self.max_age and time.monotonic() - pooled.created_at > self.max_age:
+            return False
+        return True
+
+    def acquire(self, role, timeout=None, model=None):
+        """
+        Take an idle agent, building a new one if the pool has room.
+        model defaults to the first model of the role's cascade.
+        """
+        with get_tracer().span("agent_checkout", role=role, model=model) as span:
+            pooled = self._acquire(role, timeout, model)
+            span.set(model=pooled.model, uses=pooled.uses)
+            return pooled
+
+    def _acquire(self, role, timeout, model):
+        if role not in ROLES:
+            raise ValueError(f"Unknown agent role: {role}")
+        if model is None:
+            model = get_model_router().routes[role][0].model
+        if timeout is None:
+            timeout = self.checkout_timeout
+        key = (role, model)
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                idle = self._idle.setdefault(key, [])
+                while idle:
+                    pooled = idle.pop()
+                    if self._healthy(pooled):
+                        pooled.uses += 1
+                        return pooled
+                    self._total[key] -= 1
+                    self._evicted += 1
+                if self._total.get(key, 0) < self.max_size:
+                    # Reserve the slot before building outside the lock
+                    self._total[key] = self._total.get(key, 0) + 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise PoolTimeout(f"No {role} agent for {model} available after {timeout}s")
+                self._cond.wait(remaining)
+
+        started = time.perf_counter()
+        try:
+            pooled = self._build(role, model)
+        except Exception:
+            with self._cond:
+                self._total[key] -= 1
+                self._cond.notify()
+            raise
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage="agent_build", model=model)
+        pooled.uses += 1
+        return pooled
+
+    def release(self, pooled):
+        """Return an agent to the pool, evicting it if it is no longer healthy"""
+        key = (pooled.role, pooled.model)
+        with self._cond:
+            if self._healthy(pooled):
+                self._idle[key].append(pooled)
+            else:
+                self._total[key] -= 1
+                self._evicted += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def checkout(self, role, timeout=None, model=None):
+        """Context manager around acquire/release; errors mark the agent as broken"""
+        pooled = self.acquire(role, timeout, model)
+        try:
+            yield pooled
+        except Exception:
+            pooled.mark_broken()
+            raise
+        finally:
+            self.release(pooled)
+
+    @asynccontextmanager
+    async def acheckout(self, role, timeout=None, model=None):
+        """Async checkout; waiting for a free agent happens off the event loop"""
+        pooled = await asyncio.to_thread(self.acquire, role, timeout, model)
+        try:
+            yield pooled
+        except Exception:
+            pooled.mark_broken()
+            raise
+        finally:
+            self.release(pooled)
+
+    def prewarm(self, count=1):
+        """Build agents for the first model of each role ahead of the first request"""
+        for role in ROLES:
+            warmed = [self.acquire(role) for _ in range(min(count, self.max_size))]
+            for pooled in warmed:
+                pooled.uses -= 1
+                self.release(pooled)
+
+    def gauge_values(self):
+        """Idle and busy agents per (role, model), for the agent_pool_agents gauge"""
+        values = {}
+        with self._cond:
+            for (role, model), total in self._total.items():
+                idle = len(self._idle.get((role, model), []))
+                values[(role, model, "idle")] = idle
+                values[(role, model, "busy")] = total - idle
+        return values
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "evicted": self._evicted,
+                "agents": {
+                    f"{role}:{model}": {"total": total, "idle": len(self._idle.get((role, model), []))}
+                    for (role, model), total in self._total.items()
+                }
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_agent_pool(api_key):
+    """Return the process-wide agent pool, creating it on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = AgentPool(
+                api_key,
+                max_size=int(os.getenv("AGENT_POOL_SIZE", "4")),
+                max_uses=int(os.getenv("AGENT_POOL_MAX_USES", "200")),
+                max_age=float(os.getenv("AGENT_POOL_MAX_AGE", "3600"))
+            )
+            POOL_AGENTS.callback = _pool.gauge_values
+        return _pool
@@ -0,0 +1,372 @@
+"""
+Client-side rate limiting for LLM traffic.
+Every chat completion request in the process passes through a per-model pair
+of token buckets (requests and tokens per minute) before it goes out, is
+retried with jittered exponential backoff on 429/5xx, and can optionally be
+hedged: when a request is slower than the model's recent p95 latency a
+duplicate is sent and whichever answers first wins.
+The limiter is an httpx transport, so it sits under the OpenAI SDK clients
+shared through core/http.py.
+"""
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+import httpx
+from core.metrics import LLM_TOKENS, LLM_REQUESTS, LLM_INFLIGHT
+from core.tracing import get_tracer
+
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+RETRY_ERRORS = (httpx.ConnectError, httpx.RemoteProtocolError)
+# Completion size assumed when a request doesn't set max_tokens
+DEFAULT_COMPLETION_TOKENS = 4096
+
+
+class TokenBucket:
+    """
+    Bucket refilled at rate units per second up to capacity.
+    reserve() debits immediately and returns how long the caller must wait,
+    so the same bucket serves threads (time.sleep) and coroutines (asyncio.sleep).
+    """
+
+    def __init__(self, rate, capacity, clock=time.monotonic):
+        self.rate = rate
+        self.capacity = capacity
+        self.clock = clock
+        self._level = capacity
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        with self._lock:
+            now = self.clock()
+            self._level = min(self.capacity, self._level + (now - self._updated) * self.rate)
+            self._updated = now
+            self._level -= min(amount, self.capacity)
+            return 0.0 if self._level >= 0 else -self._level / self.rate
+
+    def refund(self, amount):
+        """Return units reserved but not used (e.g. a completion shorter than estimated)"""
+        with self._lock:
+            self._level = min(self.capacity, self._level + amount)
+
+
+class LatencyTracker:
+    """Rolling window of response times"""
+
+    def __init__(self, size=200, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """The q-th percentile, or None until there are enough samples"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            samples = sorted(self._samples)
+        return samples[min(len(samples) - 1, int(q / 100 * len(samples)))]
+
+
+class ModelLimits:
+    """Request and token budgets plus latency stats for one model"""
+
+    def __init__(self, requests_per_minute=0, tokens_per_minute=0):
+        self.requests = TokenBucket(requests_per_minute / 60, requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute / 60, tokens_per_minute) if tokens_per_minute else None
+        self.latency = LatencyTracker()
+
+    def reserve(self, tokens):
+        """Debit one request and the estimated tokens; returns the seconds to wait"""
+        delay = 0.0
+        if self.requests is not None:
+            delay = max(delay, self.requests.reserve(1))
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        return delay
+
+    def settle(self, estimated, used):
+        """Give back the difference when a response reports fewer tokens than were reserved"""
+        if self.tokens is not None and used is not None and used < estimated:
+            self.tokens.refund(estimated - used)
+
+
+class RateLimiter:
+    def __init__(self, limits=None, default_rpm=0, default_tpm=0, max_retries=5, backoff_base=0.5,
+                 backoff_max=30.0, hedge=False, hedge_percentile=95):
+        # {"model": {"rpm": ..., "tpm": ...}}; models not listed use the defaults
+        self.limits = limits or {}
+        self.default_rpm = default_rpm
+        self.default_tpm = default_tpm
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge = hedge
+        self.hedge_percentile = hedge_percentile
+        self._models = {}
+        self._lock = threading.Lock()
+
+    def model(self, name):
+        with self._lock:
+            if name not in self._models:
+                config = self.limits.get(name, {})
+                self._models[name] = ModelLimits(
+                    config.get("rpm", self.default_rpm),
+                    config.get("tpm", self.default_tpm)
+                )
+            return self._models[name]
+
+    def backoff(self, attempt, response=None):
+        """Full-jitter exponential backoff, honoring Retry-After when the server sends one"""
+        if response is not None:
+            retry_after = response.headers.get("retry-after")
+            try:
+                return min(self.backoff_max, float(retry_after))
+            except (TypeError, ValueError):
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def hedge_delay(self, limits):
+        return limits.latency.percentile(self.hedge_percentile) if self.hedge else None
+
+    def stats(self):
+        with self._lock:
+            models = dict(self._models)
+        return {
+            name: {
+                "p50": limits.latency.percentile(50),
+                "p95": limits.latency.percentile(95)
+            }
+            for name, limits in models.items()
+        }
+
+
+def describe_request(request):
+    """(model, estimated tokens, streaming) for a chat completion request, or None for other traffic"""
+    if request.method != "POST" or not request.url.path.endswith("/chat/completions"):
+        return None
+    try:
+        body = json.loads(request.content)
+    except ValueError:
+        return None
+    prompt_chars = sum(len(str(message.get("content", ""))) for message in body.get("messages", []))
+    completion = body.get("max_tokens") or body.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    # ~4 characters per token is close enough for budgeting
+    return body.get("model", ""), prompt_chars // 4 + completion, bool(body.get("stream"))
+
+
+def token_usage(response):
+    """The usage block of a chat completion response, or None (e.g. for streams)"""
+    try:
+        return json.loads(response.content)["usage"]
+    except (ValueError, KeyError, TypeError):
+        return None
+
+
+def used_tokens(response):
+    usage = token_usage(response)
+    try:
+        return usage["total_tokens"]
+    except (KeyError, TypeError):
+        return None
+
+
+def record_response(model, response, streaming):
+    """Count the response in the metrics; returns its token usage as span attributes"""
+    LLM_REQUESTS.inc(model=model, status=response.status_code)
+    if streaming or response.status_code >= 400:
+        return {}
+    usage = token_usage(response) or {}
+    attributes = {}
+    for kind in ("prompt", "completion"):
+        tokens = usage.get(f"{kind}_tokens")
+        if isinstance(tokens, int):
+            LLM_TOKENS.inc(tokens, model=model, kind=kind)
+            attributes[f"{kind}_tokens"] = tokens
+    return attributes
+
+
+def close_response(future):
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+class RateLimitedTransport(httpx.BaseTransport):
+    """httpx transport applying a RateLimiter to chat completion requests"""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+        self._hedges = ThreadPoolExecutor(max_workers=64, thread_name_prefix="llm-hedge")
+
+    def send(self, request, limits, estimated, streaming):
+        """One rate-limited attempt; non-streaming bodies are read so hedges compare complete responses"""
+        delay = limits.reserve(estimated)
+        if delay:
+            with get_tracer().span("rate_limit_wait", seconds=round(delay, 3)):
+                time.sleep(delay)
+        started = time.monotonic()
+        response = self.transport.handle_request(request)
+        if not streaming:
+            response.read()
+            if response.status_code < 400:
+                limits.latency.record(time.monotonic() - started)
+                limits.settle(estimated, used_tokens(response))
+        return response
+
+    def send_hedged(self, request, limits, estimated, streaming):
+        delay = None if streaming else self.limiter.hedge_delay(limits)
+        if delay is None:
+            return self.send(request, limits, estimated, streaming)
+        # Copy the context so spans opened on the hedge threads nest under this request
+        primary = self._hedges.submit(contextvars.copy_context().run, self.send, request, limits, estimated, streaming)
+        done, _ = wait([primary], timeout=delay)
+        if done:
+            return primary.result()
+        # Slower than p95: race a duplicate and keep whichever finishes first
+        get_tracer().start("hedge", after=round(delay, 3)).end()
+        hedge = self._hedges.submit(contextvars.copy_context().run, self.send, request, limits, estimated, streaming)
+        done, _ = wait([primary, hedge], return_when=FIRST_COMPLETED)
+        winner = done.pop()
+        loser = hedge if winner is primary else primary
+        loser.add_done_callback(close_response)
+        return winner.result()
+
+    def handle_request(self, request):
+        described = describe_request(request)
+        if described is None:
+            return self.transport.handle_request(request)
+        model, estimated, streaming = described
+        limits = self.limiter.model(model)
+        tracer = get_tracer()
+        with tracer.span("llm_request", model=model, estimated_tokens=estimated, streaming=streaming) as span:
+            attempt = 0
+            while True:
+                try:
+                    with LLM_INFLIGHT.track(model=model), tracer.span("llm_attempt", attempt=attempt) as attempt_span:
+                        response = self.send_hedged(request, limits, estimated, streaming)
+                        attempt_span.set(status=response.status_code)
+                except RETRY_ERRORS:
+                    if attempt >= self.limiter.max_retries:
+                        raise
+                    delay = self.limiter.backoff(attempt)
+                    with tracer.span("backoff", attempt=attempt, seconds=round(delay, 3)):
+                        time.sleep(delay)
+                    attempt += 1
+                    continue
+                span.set(status=response.status_code, attempts=attempt + 1,
+                         **record_response(model, response, streaming))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.limiter.max_retries:
+                    return response
+                response.close()
+                delay = self.limiter.backoff(attempt, response)
+                with tracer.span("backoff", attempt=attempt, seconds=round(delay, 3)):
+                    time.sleep(delay)
+                attempt += 1
+
+    def close(self):
+        self._hedges.shutdown(wait=False)
+        self.transport.close()
+
+
+class AsyncRateLimitedTransport(httpx.AsyncBaseTransport):
+    """Async counterpart of RateLimitedTransport"""
+
+    def __init__(self, transport, limiter):
+        self.transport = transport
+        self.limiter = limiter
+
+    async def send(self, request, limits, estimated, streaming):
+        delay = limits.reserve(estimated)
+        if delay:
+            with get_tracer().span("rate_limit_wait", seconds=round(delay, 3)):
+                await asyncio.sleep(delay)
+        started = time.monotonic()
+        response = await self.transport.handle_async_request(request)
+        if not streaming:
+            await response.aread()
+            if response.status_code < 400:
+                limits.latency.record(time.monotonic() - started)
+                limits.settle(estimated, used_tokens(response))
+        return response
+
+    async def send_hedged(self, request, limits, estimated, streaming):
+        delay = None if streaming else self.limiter.hedge_delay(limits)
+        if delay is None:
+            return await self.send(request, limits, estimated, streaming)
+        primary = asyncio.ensure_future(self.send(request, limits, estimated, streaming))
+        done, _ = await asyncio.wait({primary}, timeout=delay)
+        if done:
+            return primary.result()
+        get_tracer().start("hedge", after=round(delay, 3)).end()
+        hedge = asyncio.ensure_future(self.send(request, limits, estimated, streaming))
+        done, pending = await asyncio.wait({primary, hedge}, return_when=asyncio.FIRST_COMPLETED)
+        for task in pending:
+            task.cancel()
+        return done.pop().result()
+
+    async def handle_async_request(self, request):
+        described = describe_request(request)
+        if described is None:
+            return await self.transport.handle_async_request(request)
+        model, estimated, streaming = described
+        limits = self.limiter.model(model)
+        tracer = get_tracer()
+        with tracer.span("llm_request", model=model, estimated_tokens=estimated, streaming=streaming) as span:
+            attempt = 0
+            while True:
+                try:
+                    with LLM_INFLIGHT.track(model=model), tracer.span("llm_attempt", attempt=attempt) as attempt_span:
+                        response = await self.send_hedged(request, limits, estimated, streaming)
+                        attempt_span.set(status=response.status_code)
+                except RETRY_ERRORS:
+                    if attempt >= self.limiter.max_retries:
+                        raise
+                    delay = self.limiter.backoff(attempt)
+                    with tracer.span("backoff", attempt=attempt, seconds=round(delay, 3)):
+                        await asyncio.sleep(delay)
+                    attempt += 1
+                    continue
+                span.set(status=response.status_code, attempts=attempt + 1,
+                         **record_response(model, response, streaming))
+                if response.status_code not in RETRY_STATUSES or attempt >= self.limiter.max_retries:
+                    return response
+                await response.aclose()
+                delay = self.limiter.backoff(attempt, response)
+                with tracer.span("backoff", attempt=attempt, seconds=round(delay, 3)):
+                    await asyncio.sleep(delay)
+                attempt += 1
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter, configured from the environment"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(
+                limits=json.loads(os.getenv("LLM_RATE_LIMITS", "{}")),
+                default_rpm=float(os.getenv("LLM_RPM", "0")),
+                default_tpm=float(os.getenv("LLM_TPM", "0")),
+                max_retries=int(os.getenv("LLM_MAX_RETRIES", "5")),
+                backoff_base=float(os.getenv("LLM_BACKOFF_BASE", "0.5")),
+                backoff_max=float(os.getenv("LLM_BACKOFF_MAX", "30")),
+                hedge=os.getenv("LLM_HEDGE", "0").lower() in ("1", "true", "yes", "on"),
+                hedge_percentile=float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+            )
+        return _limiter
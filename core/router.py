@@ -0,0 +1,141 @@
+"""
+Model cascade routing.
+Each role has an ordered list of models. By default each role has a single
+model; the "cheap-first" preset (MODEL_ROUTES=cheap-first) starts the
+developer on a faster model instead. Jobs start on the first model and move
+down the list only when it isn't good enough: the developer escalates after
+a number of rejections at its current model, the debugger after a verdict it
+wasn't clear about.
+"""
+import os
+import json
+import threading
+from agents.models import DEVELOPER_MODEL, DEBUGGER_MODEL
+
+DEFAULT_ROUTES = {
+    "developer": [
+        {"model": DEVELOPER_MODEL, "timeout": 300}
+    ],
+    "debugger": [
+        {"model": DEBUGGER_MODEL, "timeout": 60}
+    ]
+}
+
+# Named cascades MODEL_ROUTES can select instead of giving JSON
+ROUTE_PRESETS = {
+    "default": DEFAULT_ROUTES,
+    # First drafts go to the debugger's Llama model, which is much faster (and cheaper) than DeepSeek
+    "cheap-first": {
+        "developer": [
+            {"model": DEBUGGER_MODEL, "timeout": 120},
+            {"model": DEVELOPER_MODEL, "timeout": 300}
+        ],
+        "debugger": [
+            {"model": DEBUGGER_MODEL, "timeout": 60}
+        ]
+    }
+}
+
+
+class ModelRoute:
+    """One model in a role's cascade"""
+
+    def __init__(self, model, timeout=None, temperature=None):
+        self.model = model
+        self.timeout = timeout
+        self.temperature = temperature
+
+
+class Route:
+    """Where one job currently is in each role's cascade"""
+
+    def __init__(self, router, levels=None, rejections=0):
+        self.router = router
+        self.levels = dict(levels or {role: 0 for role in router.routes})
+        # Rejections since the developer last changed model
+        self.rejections = rejections
+
+    def current(self, role):
+        return self.router.routes[role][self.levels[role]]
+
+    def models(self):
+        return {role: self.current(role).model for role in self.levels}
+
+    def escalate(self, role):
+        """Move role to its next model; returns the new route, or None at the end of the cascade"""
+        if self.levels[role] + 1 >= len(self.router.routes[role]):
+            return None
+        self.levels[role] += 1
+        return self.current(role)
+
+    def record_review(self, approved, confidence):
+        """
+        Update the cascade after a review. Returns the roles that escalated.
+        Low-confidence verdicts escalate the debugger; repeated rejections escalate the developer.
+        """
+        escalated = []
+        if confidence < self.router.min_confidence and self.escalate("debugger"):
+            escalated.append("debugger")
+        if approved:
+            return escalated
+        self.rejections += 1
+        if self.rejections >= self.router.escalate_after and self.escalate("developer"):
+            self.rejections = 0
+            escalated.append("developer")
+        return escalated
+
+    def to_dict(self):
+        return {"levels": self.levels, "rejections": self.rejections}
+
+
+class ModelRouter:
+    def __init__(self, routes=None, escalate_after=2, min_confidence=0.5):
+        routes = routes or DEFAULT_ROUTES
+        self.routes = {
+            role: [ModelRoute(**entry) if isinstance(entry, dict) else ModelRoute(entry) for entry in entries]
+            for role, entries in routes.items()
+        }
+        for role in ("developer", "debugger"):
+            if not self.routes.get(role):
+                raise ValueError(f"No models configured for the {role} role")
+        self.escalate_after = escalate_after
+        self.min_confidence = min_confidence
+
+    def start(self, state=None):
+        """A new job's route, or one restored from Route.to_dict()"""
+        if state:
+            return Route(self, state["levels"], state["rejections"])
+        return Route(self)
+
+    def find(self, role, model):
+        """The route entry for model in role's cascade"""
+        for route in self.routes[role]:
+            if route.model == model:
+                return route
+        return ModelRoute(model)
+
+    def signature(self):
+        """Everything about the cascade that changes what a job produces"""
+        return {role: [route.model for route in routes] for role, routes in self.routes.items()}
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_model_router():
+    """Return the process-wide model router, configured from the environment"""
+    global _router
+    with _router_lock:
+        if _router is None:
+            routes = os.getenv("MODEL_ROUTES")
+            if routes in ROUTE_PRESETS:
+                routes = ROUTE_PRESETS[routes]
+            elif routes:
+                routes = json.loads(routes)
+            _router = ModelRouter(
+                routes=routes or None,
+                escalate_after=int(os.getenv("ROUTER_ESCALATE_AFTER", "2")),
+                min_confidence=float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.5"))
+            )
+        return _router
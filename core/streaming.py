@@ -0,0 +1,70 @@
+"""
+Helpers for relaying LLM token streams as SSE delta events.
+"""
+import re
+import time
+
+# Generated pages start here; anything the model emits before it (agent
+# "Thought:" / "Final Answer:" framing) is not part of the page
+PAGE_START = re.compile(r"<!doctype html|<html", re.IGNORECASE)
+
+
+class DeltaCoalescer:
+    """
+    Buffers streamed token chunks and releases them in size/time windows
+    so clients get a handful of delta events per second instead of one per token.
+    """
+
+    def __init__(self, max_chars=512, max_interval=0.25, start_pattern=PAGE_START, max_hold=2048, clock=time.monotonic):
+        self.max_chars = max_chars
+        self.max_interval = max_interval
+        self.start_pattern = start_pattern
+        self.max_hold = max_hold
+        self.clock = clock
+        self._buffer = []
+        self._size = 0
+        self._last_flush = clock()
+        self._started = start_pattern is None
+        self._held = ""
+
+    def push(self, text):
+        """Add a chunk; returns coalesced text when a window closes, otherwise None"""
+        if not text:
+            return None
+        if not self._started:
+            text = self._skip_preamble(text)
+            if not text:
+                return None
+        self._buffer.append(text)
+        self._size += len(text)
+        if self._size >= self.max_chars or self.clock() - self._last_flush >= self.max_interval:
+            return self.flush()
+        return None
+
+    def flush(self):
+        """Release whatever is buffered"""
+        if not self._started and self._held:
+            # Never found the page start; pass the text through unfiltered
+            self._started = True
+            self._buffer.insert(0, self._held)
+            self._held = ""
+        self._last_flush = self.clock()
+        if not self._buffer:
+            return None
+        text = "".join(self._buffer)
+        self._buffer = []
+        self._size = 0
+        return text
+
+    def _skip_preamble(self, text):
+        self._held += text
+        match = self.start_pattern.search(self._held)
+        if match:
+            text = self._held[match.start():]
+        elif len(self._held) >= self.max_hold:
+            text = self._held
+        else:
+            return ""
+        self._started = True
+        self._held = ""
+        return text
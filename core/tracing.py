@@ -0,0 +1,234 @@
+"""
+Per-job trace timelines.
+Spans cover a job, its time in the queue, each iteration, each agent kickoff,
+each LLM HTTP request (with its attempts, backoffs and rate limit waits) and
+each SSE event handed to the client. Finished spans are appended to a rotating
+JSONL file, one object per line, and can be converted to the Chrome trace
+format (chrome://tracing, Perfetto) with:
+
+    python -m core.tracing chrome -o trace.json [--trace JOB_ID]
+
+The current span is tracked in a context variable, so spans opened while
+another is active (e.g. HTTP requests made during a kickoff) become its children.
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import logging
+import argparse
+import threading
+import contextvars
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+_current = contextvars.ContextVar("current_span", default=None)
+
+
+def new_id():
+    return uuid.uuid4().hex[:16]
+
+
+def current_span():
+    """The span active in this thread or task, or None"""
+    return _current.get()
+
+
+class Span:
+    def __init__(self, tracer, name, trace_id, parent_id=None, start=None, attributes=None):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_id()
+        self.parent_id = parent_id
+        self.start = time.time() if start is None else start
+        self.finish = None
+        self.thread = threading.current_thread().name
+        self.attributes = dict(attributes or {})
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self, finish=None):
+        """Close the span and write it out; later calls are ignored"""
+        if self.finish is not None:
+            return
+        self.finish = time.time() if finish is None else finish
+        self.tracer.write(self)
+
+    def to_dict(self):
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": self.start,
+            "end": self.finish,
+            "duration": round(self.finish - self.start, 6),
+            "thread": self.thread,
+            "attributes": self.attributes
+        }
+
+
+class NullSpan:
+    """Stands in for spans when tracing is disabled"""
+    trace_id = None
+    span_id = None
+
+    def set(self, **attributes):
+        pass
+
+    def end(self, finish=None):
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Tracer:
+    def __init__(self, path=None, max_bytes=10 * 1024 * 1024, backups=3):
+        self.path = path
+        self._logger = None
+        if path:
+            directory = os.path.dirname(path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            handler = RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, delay=True)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            self._logger = logging.getLogger(f"{__name__}.{id(self)}")
+            self._logger.propagate = False
+            self._logger.setLevel(logging.INFO)
+            self._logger.addHandler(handler)
+
+    @property
+    def enabled(self):
+        return self._logger is not None
+
+    def start(self, name, parent=None, trace_id=None, start=None, **attributes):
+        """
+        Open a span without making it current. parent defaults to the current span;
+        a span without a parent starts a new trace (trace_id, e.g. the job ID).
+        """
+        if not self.enabled:
+            return NULL_SPAN
+        if parent is None:
+            parent = current_span()
+        if parent is not None and parent.trace_id is not None:
+            return Span(self, name, parent.trace_id, parent.span_id, start, attributes)
+        return Span(self, name, trace_id or new_id(), None, start, attributes)
+
+    @contextmanager
+    def activate(self, span):
+        """Make span the current span for the duration of the block"""
+        previous = _current.get()
+        _current.set(span)
+        try:
+            yield span
+        finally:
+            # Set rather than reset: generators may be closed from another context
+            _current.set(previous)
+
+    @contextmanager
+    def span(self, name, parent=None, trace_id=None, **attributes):
+        """Open a span, make it current and close it when the block exits"""
+        span = self.start(name, parent, trace_id, **attributes)
+        try:
+            with self.activate(span):
+                yield span
+        except BaseException as e:
+            span.set(error=type(e).__name__)
+            raise
+        finally:
+            span.end()
+
+    def record(self, name, start, finish, parent=None, **attributes):
+        """Write a span for something that already happened (e.g. time spent queued)"""
+        span = self.start(name, parent, start=start, **attributes)
+        span.end(finish)
+
+    def write(self, span):
+        self._logger.info(json.dumps(span.to_dict(), default=str))
+
+
+def read_spans(path):
+    """Spans from a trace file and its rotated backups, oldest first"""
+    paths = []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        paths.insert(0, f"{path}.{index}")
+        index += 1
+    if os.path.exists(path):
+        paths.append(path)
+    for name in paths:
+        with open(name, encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+def to_chrome_trace(spans):
+    """Chrome trace event format: one process per trace, one thread lane per OS thread"""
+    events = []
+    processes = {}
+    threads = {}
+    for span in spans:
+        if span["trace_id"] not in processes:
+            pid = processes[span["trace_id"]] = len(processes) + 1
+            events.append({"ph": "M", "name": "process_name", "pid": pid, "tid": 0,
+                           "args": {"name": f"trace {span['trace_id']}"}})
+        pid = processes[span["trace_id"]]
+        if (pid, span["thread"]) not in threads:
+            tid = threads[(pid, span["thread"])] = len(threads) + 1
+            events.append({"ph": "M", "name": "thread_name", "pid": pid, "tid": tid,
+                           "args": {"name": span["thread"]}})
+        events.append({
+            "ph": "X",
+            "name": span["name"],
+            "cat": span["name"],
+            "pid": pid,
+            "tid": threads[(pid, span["thread"])],
+            "ts": span["start"] * 1e6,
+            "dur": span["duration"] * 1e6,
+            "args": dict(span["attributes"], span_id=span["span_id"], parent_id=span["parent_id"])
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+
+def get_tracer():
+    """Return the process-wide tracer; tracing is off when TRACE_FILE is set empty"""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer(
+                os.getenv("TRACE_FILE", ".cache/traces.jsonl"),
+                max_bytes=int(float(os.getenv("TRACE_MAX_MB", "10")) * 1024 * 1024),
+                backups=int(os.getenv("TRACE_BACKUPS", "3"))
+            )
+        return _tracer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert job traces to the Chrome trace format")
+    parser.add_argument("command", choices=["chrome"])
+    parser.add_argument("--file", default=os.getenv("TRACE_FILE") or ".cache/traces.jsonl",
+                        help="trace file (rotated backups are read too)")
+    parser.add_argument("--trace", help="only include this trace (job) ID")
+    parser.add_argument("-o", "--output", help="output file (default: stdout)")
+    args = parser.parse_args()
+
+    spans = [span for span in read_spans(args.file) if args.trace is None or span["trace_id"] == args.trace]
+    trace = json.dumps(to_chrome_trace(spans))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(trace)
+    else:
+        sys.stdout.write(trace)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,267 @@
+"""
+Local structural validator for generated pages.
+Runs the same mechanical checks as the debugger agent in-process so that
+structurally broken pages can be rejected without an LLM round-trip.
+"""
+import re
+from html.parser import HTMLParser
+
+# Elements that never take a closing tag
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input", "link",
+    "meta", "param", "source", "track", "wbr"
+}
+
+# Elements whose closing tag may legally be omitted
+OPTIONAL_CLOSE = {
+    "p", "li", "dt", "dd", "option", "optgroup", "tr", "td", "th",
+    "thead", "tbody", "tfoot", "colgroup", "rt", "rp", "caption"
+}
+
+PLACEHOLDER_IMAGE = re.compile(
+    r"placeholder\.com|placehold\.(?:it|co)|dummyimage\.com|lorempixel|"
+    r"example\.com|via\.placeholder|your[-_]?image|image[-_]?url|"
+    r"photo-x{3,}|/path/to/",
+    re.IGNORECASE
+)
+UNSPLASH_PHOTO = re.compile(r"images\.unsplash\.com/photo-([^?\s\"')]+)", re.IGNORECASE)
+UNSPLASH_ID = re.compile(r"^\d{10,13}-[0-9a-f]{12}$")
+CSS_RULE = re.compile(r"[.#]?[A-Za-z][\w-]*(?:\s*[,>+~ ]\s*[.#]?[\w-]+)*\s*\{[^{}]*?:[^{}]*?\}")
+JS_STATEMENT = re.compile(
+    r"\bfunction\s+\w+\s*\(|\bdocument\.(?:querySelector|getElementById|addEventListener)|"
+    r"\b(?:const|let|var)\s+\w+\s*=|\bwindow\.addEventListener\s*\("
+)
+
+# Elements whose text is code shown to the reader, not code that leaked out of <style>/<script>
+CODE_ELEMENTS = {"pre", "code", "kbd", "samp"}
+
+# CSS rules or JS statements one run of text needs before it counts as leaked code, so prose
+# that mentions a rule or a statement isn't reported
+STRAY_CODE_MIN_MATCHES = 2
+
+CHECK_DOCTYPE = "doctype"
+CHECK_CLOSING = "closing_html"
+CHECK_TAGS = "balanced_tags"
+CHECK_IMAGES = "image_urls"
+CHECK_CSS = "css_in_style"
+CHECK_JS = "js_in_script"
+
+
+class ValidationResult:
+    """Outcome of a local validation run"""
+
+    def __init__(self, issues):
+        self.issues = issues
+
+    @property
+    def approved(self):
+        return not self.issues
+
+    @property
+    def verdict(self):
+        return "-11" if self.approved else "-00"
+
+    @property
+    def reasons(self):
+        return [issue["reason"] for issue in self.issues]
+
+    @property
+    def patches(self):
+        return [issue["patch"] for issue in self.issues]
+
+    def feedback(self):
+        """Render the result in the same format the debugger agent uses"""
+        if self.approved:
+            return "-11"
+        lines = ["-00"]
+        for issue in self.issues:
+            lines.append(f"Reason: {issue['reason']}")
+            lines.append(f"Patch: {issue['patch']}")
+        return "\n".join(lines)
+
+    def to_dict(self):
+        return {
+            "verdict": self.verdict,
+            "approved": self.approved,
+            "issues": list(self.issues)
+        }
+
+    def __str__(self):
+        return self.feedback()
+
+
+class _StructureParser(HTMLParser):
+    """HTML parser that tracks open elements and out-of-place CSS/JS"""
+
+    def __init__(self, on_issue):
+        super().__init__(convert_charrefs=True)
+        self.on_issue = on_issue
+        self.stack = []
+        self.image_urls = []
+        self.stray_text = []
+
+    def handle_starttag(self, tag, attrs):
+        attrs = dict(attrs)
+        if tag == "img":
+            self.image_urls.append(attrs.get("src") or "")
+        elif tag == "link" and "stylesheet" in (attrs.get("rel") or "").lower():
+            href = attrs.get("href") or ""
+            if not href.startswith(("http://", "https://", "//")):
+                self.on_issue(
+                    CHECK_CSS,
+                    f"External stylesheet '{href}' is referenced instead of inline CSS",
+                    "Move the stylesheet contents into the <style> tag in <head>"
+                )
+        elif tag == "script" and attrs.get("src"):
+            src = attrs["src"]
+            if not src.startswith(("http://", "https://", "//")):
+                self.on_issue(
+                    CHECK_JS,
+                    f"External script '{src}' is referenced instead of inline JavaScript",
+                    "Move the script contents into the <script> tag before </body>"
+                )
+
+        if tag in VOID_ELEMENTS:
+            return
+        self.stack.append((tag, self.getpos()[0]))
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS and self.stack and self.stack[-1][0] == tag:
+            self.stack.pop()
+
+    def handle_endtag(self, tag):
+        if tag in VOID_ELEMENTS:
+            return
+        open_tags = [name for name, _ in self.stack]
+        if tag not in open_tags:
+            self.on_issue(
+                CHECK_TAGS,
+                f"Closing tag </{tag}> on line {self.getpos()[0]} has no matching opening tag",
+                f"Remove the stray </{tag}> or add the missing <{tag}>"
+            )
+            return
+        while self.stack:
+            name, line = self.stack.pop()
+            if name == tag:
+                break
+            if name not in OPTIONAL_CLOSE:
+                self.report_unclosed(name, line)
+
+    def handle_data(self, data):
+        if not data.strip():
+            return
+        current = self.stack[-1][0] if self.stack else None
+        if current in ("style", "script"):
+            return
+        if any(name in CODE_ELEMENTS for name, _ in self.stack):
+            return
+        self.stray_text.append(data)
+
+    def report_unclosed(self, name, line):
+        self.on_issue(
+            CHECK_TAGS,
+            f"<{name}> opened on line {line} is never closed",
+            f"Add </{name}> after the content of the <{name}> element"
+        )
+
+
+class HTMLValidator:
+    """
+    Streaming validator for a single HTML document.
+    Feed chunks as they arrive with feed() and call close() for the result.
+    """
+
+    def __init__(self):
+        self.issues = []
+        self._seen = set()
+        self._parser = _StructureParser(self._add_issue)
+        self._head = ""
+        self._tail = ""
+
+    def _add_issue(self, check, reason, patch):
+        key = (check, reason)
+        if key in self._seen:
+            return
+        self._seen.add(key)
+        self.issues.append({"check": check, "reason": reason, "patch": patch})
+
+    def feed(self, chunk):
+        if not chunk:
+            return
+        if len(self._head) < 64:
+            self._head = (self._head + chunk)[:64]
+        self._tail = (self._tail + chunk)[-64:]
+        self._parser.feed(chunk)
+
+    def close(self):
+        self._parser.close()
+        parser = self._parser
+
+        if not self._head.lstrip().lower().startswith("<!doctype html"):
+            self._add_issue(
+                CHECK_DOCTYPE,
+                "Code does not start with <!DOCTYPE html>",
+                "Remove any text or markdown fences before the document and start with <!DOCTYPE html>"
+            )
+        if not self._tail.rstrip().lower().endswith("</html>"):
+            self._add_issue(
+                CHECK_CLOSING,
+                "Code does not end with </html>",
+                "Remove any text after the document and end it with </html>"
+            )
+
+        for name, line in reversed(parser.stack):
+            if name not in OPTIONAL_CLOSE and name not in ("html", "body", "head"):
+                parser.report_unclosed(name, line)
+        open_tags = {name for name, _ in parser.stack}
+        for name in ("head", "body", "html"):
+            if name in open_tags:
+                parser.report_unclosed(name, dict(parser.stack)[name])
+
+        for url in parser.image_urls:
+            self._check_image(url)
+
+        if any(len(CSS_RULE.findall(text)) >= STRAY_CODE_MIN_MATCHES for text in parser.stray_text):
+            self._add_issue(
+                CHECK_CSS,
+                "CSS rules appear outside of a <style> tag",
+                "Move all CSS rules into the <style> tag in <head>"
+            )
+        if any(len(JS_STATEMENT.findall(text)) >= STRAY_CODE_MIN_MATCHES for text in parser.stray_text):
+            self._add_issue(
+                CHECK_JS,
+                "JavaScript code appears outside of a <script> tag",
+                "Move all JavaScript into the <script> tag before </body>"
+            )
+        return ValidationResult(self.issues)
+
+    def _check_image(self, url):
+        if not url.strip():
+            self._add_issue(
+                CHECK_IMAGES,
+                "An <img> tag has an empty src attribute",
+                "Use one of the real Unsplash URLs from the developer instructions"
+            )
+            return
+        if PLACEHOLDER_IMAGE.search(url):
+            self._add_issue(
+                CHECK_IMAGES,
+                f"Image URL '{url}' is a placeholder",
+                "Replace it with one of the real Unsplash URLs from the developer instructions"
+            )
+            return
+        match = UNSPLASH_PHOTO.search(url)
+        if match and not UNSPLASH_ID.match(match.group(1)):
+            self._add_issue(
+                CHECK_IMAGES,
+                f"Image URL '{url}' uses a fake Unsplash photo ID",
+                "Replace it with one of the real Unsplash URLs from the developer instructions"
+            )
+
+
+def validate_html(code):
+    """Validate a complete document in one call"""
+    validator = HTMLValidator()
+    validator.feed(str(code or ""))
+    return validator.close()
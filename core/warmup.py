@@ -0,0 +1,130 @@
+"""
+Background start-up.
+Importing the servers only loads light modules; crewai, the crew and the agent
+pool are loaded by a pre-warm thread started once the server is up, so the
+port binds (and /health answers) within a fraction of a second. /ready
+reports when the warm-up has finished, with how long each step took.
+
+Run the warm-up in the foreground and print the breakdown with:
+
+    python -m core.warmup
+"""
+import time
+import importlib
+import threading
+from contextlib import contextmanager
+
+
+class Startup:
+    """Start-up phases of this process and whether the pre-warm has finished"""
+
+    def __init__(self):
+        self.started_at = time.time()
+        self.ready_at = None
+        self.phases = []
+        self.error = None
+        self.preloaded = False
+        self.ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self.phases.append((name, round(seconds, 4)))
+
+    @contextmanager
+    def phase(self, name):
+        started = time.monotonic()
+        try:
+            yield
+        finally:
+            self.record(name, time.monotonic() - started)
+
+    def preload(self):
+        """
+        Import crewai and the crew. Call it in the process that serves requests: crewai starts
+        threads on import, so a pre-forking server must not load it before forking.
+        """
+        if self.preloaded:
+            return
+        with self.phase("import_crewai"):
+            importlib.import_module("crewai")
+        with self.phase("import_crew"):
+            importlib.import_module("core.crew")
+        self.preloaded = True
+
+    def after_fork(self):
+        """In a forked worker: time readiness from the fork, keeping the phases the parent recorded"""
+        self.started_at = time.time()
+        self.ready_at = None
+        self.ready = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def warm(self, resume_jobs=True):
+        """Load the heavy modules and build the agent pool; sets ready when done"""
+        try:
+            self.preload()
+            from core.executor_client import ExecutorClient
+            with self.phase("agent_pool"):
+                ExecutorClient().warm_up()
+            if resume_jobs:
+                # Pick up jobs a previous deploy was still running
+                with self.phase("resume_jobs"):
+                    ExecutorClient().resume_jobs()
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"Warm-up failed, agents will be built on first use: {self.error}")
+            return
+        self.ready_at = time.time()
+        self.ready.set()
+        print(self.report())
+
+    def start(self, resume_jobs=True):
+        """Start the warm-up thread unless it was already started"""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self.warm, args=(resume_jobs,), daemon=True, name="warm-up")
+                self._thread.start()
+            return self._thread
+
+    def to_dict(self):
+        with self._lock:
+            phases = dict(self.phases)
+        return {
+            "ready": self.ready.is_set(),
+            "error": self.error,
+            "phases": phases,
+            "ready_after": round(self.ready_at - self.started_at, 4) if self.ready_at else None,
+            "uptime": round(time.time() - self.started_at, 4)
+        }
+
+    def report(self):
+        state = self.to_dict()
+        phases = ", ".join(f"{name} {seconds:.2f}s" for name, seconds in state["phases"].items())
+        return f"Ready after {state['ready_after']:.2f}s ({phases})"
+
+
+_startup = None
+_startup_lock = threading.Lock()
+
+
+def get_startup():
+    """Return the process-wide start-up tracker"""
+    global _startup
+    with _startup_lock:
+        if _startup is None:
+            _startup = Startup()
+        return _startup
+
+
+def main():
+    startup = get_startup()
+    # Leave unfinished jobs to the server
+    startup.warm(resume_jobs=False)
+    if startup.error:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Production serving: one worker process serving requests from a thread pool.
+This uses one core for Python code: running a worker per core is not supported
+until job state moves to a store all workers share.
+
+    gunicorn -c gunicorn.conf.py api:app
+
+Jobs, their queue and their event logs live in the memory of the process that
+accepted them, so every request for a job (its status, its resumable event
+stream, cancelling it) has to reach that process; coalescing and the queue
+limits only hold within it too. The worker therefore runs alone, with enough
+threads that an open event stream holds one thread rather than a process.
+Raise WEB_CONCURRENCY only once jobs are served from a store every worker
+shares. On SIGTERM the worker stops accepting connections and gets
+WEB_GRACEFUL_TIMEOUT seconds to finish the streams it is serving; jobs cut off
+after that resume from their last checkpoint in the next process. crewai is
+imported by the worker's warm-up after the fork (see core/warmup.py).
+"""
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8000')}"
+
+# Job state is per process (see above), so one worker unless asked for more
+workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+worker_class = "gthread"
+threads = int(os.getenv("WEB_THREADS", "16"))
+
+# Only the app is imported before forking; it doesn't load crewai, whose event bus
+# starts threads (and an event loop) that a forked worker would inherit only half of
+preload_app = True
+
+# gthread workers report liveness from their main loop, so long streams don't trip this
+timeout = int(os.getenv("WEB_TIMEOUT", "60"))
+graceful_timeout = int(os.getenv("WEB_GRACEFUL_TIMEOUT", "300"))
+keepalive = int(os.getenv("WEB_KEEPALIVE", "5"))
+
+accesslog = "-"
+
+
+def post_fork(server, worker):
+    from core.warmup import get_startup
+    startup = get_startup()
+    startup.after_fork()
+    # Imports crewai, builds this worker's agent pool and claims jobs left behind by dead processes
+    startup.start()
+
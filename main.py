@@ -1,7 +1,10 @@
 import os
 import sys
 import json
+import argparse
 from core.executor_client import ExecutorClient
+from core.options import OptionsError
+from core.batch import Batch, BatchBusy, read_items
 
 def main():
     """
@@ -10,6 +13,8 @@ def main():
     # Check if running in command line mode
     if len(sys.argv) > 1 and sys.argv[1] == "--cli":
         run_cli_mode()
+    elif len(sys.argv) > 1 and sys.argv[1] == "--batch":
+        sys.exit(run_batch_mode(sys.argv[2:]))
     else:
         # When imported or run without --cli, don't do anything
         # This allows the API to work without terminal interaction
@@ -70,5 +75,44 @@ def run_cli_mode():
     print("Results:")
     print(result)
 
+def run_batch_mode(args):
+    """
+    Run every requirement set in a JSONL file, printing NDJSON progress records.
+    Running the same file into the same output directory again resumes the batch.
+    """
+    parser = argparse.ArgumentParser(prog="main.py --batch", description="Generate a page for each line of a JSONL file")
+    parser.add_argument("file", help="JSONL file, one /generate request body per line (with an optional id)")
+    parser.add_argument("--output", help="directory for pages and the manifest (default: <file>.out next to the file)")
+    parser.add_argument("--concurrency", type=int, help="items to run at once (at most BATCH_CONCURRENCY)")
+    parser.add_argument("--max-iterations", type=int, help="default max_iterations for items that don't set it")
+    parser.add_argument("--review-mode", help="default review_mode for items that don't set it")
+    options = parser.parse_args(args)
+
+    defaults = {}
+    if options.max_iterations is not None:
+        defaults["max_iterations"] = options.max_iterations
+    if options.review_mode:
+        defaults["review_mode"] = options.review_mode
+    try:
+        items = read_items(options.file, defaults)
+    except (OSError, OptionsError) as e:
+        print(f"Invalid batch file: {e}", file=sys.stderr)
+        return 2
+
+    output_dir = options.output or os.path.splitext(options.file)[0] + ".out"
+    failed = 0
+    batch = Batch(ExecutorClient(), items, output_dir, concurrency=options.concurrency)
+    try:
+        batch.acquire()
+    except BatchBusy as e:
+        print(str(e), file=sys.stderr)
+        return 2
+    for record in batch.run():
+        print(json.dumps(record))
+        sys.stdout.flush()
+        if record["status"] == "batch_finished":
+            failed = record["failed"]
+    return 1 if failed else 0
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -1,75 +1,425 @@
 #!/usr/bin/env python3
 """
 Stream handler for Render deployment - provides continuous updates for Vercel app
+Runs crews in child processes, so crewai's memory growth dies with each child
+instead of accumulating in the API server, and relays their SSE events.
+
+One supervisor thread watches every child's stdout with a selector: there is
+no polling loop, it sleeps until output arrives or a limit needs checking.
+Output is framed into SSE events (lines that aren't SSE fields, such as
+library logging, are dropped) and handed to readers as the bytes the child
+wrote, without re-encoding. Each child has a wall-clock timeout, an optional
+memory limit and a bounded event buffer; a child whose reader falls behind
+stops being read until the reader catches up, so its pipe fills and it blocks.
+
+    python stream_handler.py --requirements "Landing page for a bakery" --requirements "Portfolio site"
 """
+import os
 import sys
 import json
-import select
+import time
+import signal
+import argparse
+import selectors
+import threading
 import subprocess
-from threading import Thread
-from queue import Queue, Empty
+from collections import deque
 
-def stream_subprocess(command):
-    """
-    Run a subprocess and stream its output line by line
-    """
+SSE_FIELDS = (b"data", b"id", b"event", b"retry")
+
+
+class EventTooLarge(Exception):
+    """Raised when a child writes an event bigger than the relay allows"""
+
+
+def error_event(message):
+    update = {
+        "status": "error",
+        "message": message,
+        "progress": 0
+    }
+    return f"data: {json.dumps(update)}\n\n".encode("utf-8")
+
+
+def rss_mb(pid):
+    """Resident memory of a process in MB (Linux only; None elsewhere)"""
     try:
-        # Start the subprocess
-        process = subprocess.Popen(
-            command,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
-        )
-        
-        # Read output line by line
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+
+class SSEFramer:
+    """Splits a byte stream into SSE events, each returned as bytes ending in a blank line"""
+
+    def __init__(self, max_event_bytes):
+        self.max_event_bytes = max_event_bytes
+        self.buffer = bytearray()
+        self.lines = []
+        self.size = 0
+        self.dropped = 0
+
+    def feed(self, chunk):
+        """Add output; returns the events it completed"""
+        self.buffer += chunk
+        events = []
+        start = 0
         while True:
-            # Check if process has terminated
-            if process.poll() is not None:
+            end = self.buffer.find(b"\n", start)
+            if end < 0:
                 break
-                
-            # Read line with timeout
+            line = bytes(self.buffer[start:end]).rstrip(b"\r")
+            start = end + 1
+            if not line:
+                # A blank line ends the event
+                if self.lines:
+                    events.append(b"\n".join(self.lines) + b"\n\n")
+                    self.lines = []
+                    self.size = 0
+            elif line.split(b":", 1)[0] in SSE_FIELDS:
+                self.lines.append(line)
+                self.size += len(line) + 1
+            else:
+                self.dropped += 1
+        del self.buffer[:start]
+        if self.size + len(self.buffer) > self.max_event_bytes:
+            raise EventTooLarge(f"Event larger than {self.max_event_bytes} bytes")
+        return events
+
+    def close(self):
+        """An event the child left without its closing blank line, if any"""
+        events = self.feed(b"\n") if self.buffer else []
+        return events + self.feed(b"\n")
+
+
+class Child:
+    """A supervised child process and the events it has written that haven't been read yet"""
+
+    def __init__(self, supervisor, command, timeout, memory_mb, max_events, max_event_bytes, env=None):
+        self.supervisor = supervisor
+        self.command = command
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_events = max_events
+        self.framer = SSEFramer(max_event_bytes)
+        # Its own session, so a kill also reaches anything the child started
+        self.process = subprocess.Popen(command, stdout=subprocess.PIPE, env=env, start_new_session=True)
+        os.set_blocking(self.process.stdout.fileno(), False)
+        self.started = time.monotonic()
+        self.deadline = self.started + timeout if timeout else None
+        self.peak_mb = None
+        self.completed = False
+        self.reason = None
+        self.returncode = None
+        self.paused = False
+        self.cancelled = False
+        self.closed = False
+        self._events = deque()
+        self._cond = threading.Condition()
+
+    @property
+    def pid(self):
+        return self.process.pid
+
+    def push(self, events):
+        """Queue events for the reader; returns False, marking the child paused, once the buffer is full"""
+        with self._cond:
+            for event in events:
+                if b'"status": "completed"' in event:
+                    self.completed = True
+                self._events.append(event)
+            self._cond.notify_all()
+            if len(self._events) >= self.max_events and not self.closed:
+                self.paused = True
+                return False
+            return True
+
+    def finish(self, returncode, reason=None):
+        with self._cond:
+            self.returncode = returncode
+            self.reason = self.reason or reason
+            self.closed = True
+            self._cond.notify_all()
+
+    def follow(self):
+        """
+        Yield the child's events as bytes, waiting for new ones until it has exited.
+        Leaving early kills the child.
+        """
+        try:
+            while True:
+                with self._cond:
+                    while not self._events and not self.closed:
+                        self._cond.wait()
+                    if not self._events:
+                        return
+                    event = self._events.popleft()
+                    # Start reading a paused child again once half its buffer has drained
+                    resume = self.paused and len(self._events) <= self.max_events // 2
+                    if resume:
+                        self.paused = False
+                if resume:
+                    self.supervisor.resume(self)
+                yield event
+        finally:
+            if not self.closed:
+                self.cancelled = True
+                self.supervisor.resume(self)
+
+    def kill(self):
+        try:
+            os.killpg(self.process.pid, signal.SIGKILL)
+        except (ProcessLookupError, PermissionError):
+            pass
+
+
+class Supervisor:
+    """Runs and relays many child processes from one selector thread"""
+
+    def __init__(self, timeout=900.0, memory_mb=0, max_events=64, max_event_bytes=8 * 1024 * 1024,
+                 memory_interval=1.0):
+        self.timeout = timeout
+        self.memory_mb = memory_mb
+        self.max_events = max_events
+        self.max_event_bytes = max_event_bytes
+        self.memory_interval = memory_interval
+        self._selector = selectors.DefaultSelector()
+        self._children = set()
+        self._pending = []
+        self._lock = threading.Lock()
+        # Other threads wake the selector by writing to this pipe
+        self._wake_read, self._wake_write = os.pipe()
+        os.set_blocking(self._wake_read, False)
+        os.set_blocking(self._wake_write, False)
+        self._selector.register(self._wake_read, selectors.EVENT_READ)
+        self._next_memory_check = 0.0
+        self._thread = None
+
+    def spawn(self, command, timeout=None, memory_mb=None, env=None):
+        """Start a child; its events are read with child.follow()"""
+        child = Child(self, command, self.timeout if timeout is None else timeout,
+                      self.memory_mb if memory_mb is None else memory_mb,
+                      self.max_events, self.max_event_bytes, env)
+        with self._lock:
+            self._pending.append(child)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._loop, daemon=True, name="stream-supervisor")
+                self._thread.start()
+        self._wake()
+        return child
+
+    def resume(self, child):
+        with self._lock:
+            self._pending.append(child)
+        self._wake()
+
+    def _wake(self):
+        try:
+            os.write(self._wake_write, b"\0")
+        except BlockingIOError:
+            # The pipe is full, so a wake-up is already pending
+            pass
+
+    def _register_pending(self):
+        with self._lock:
+            pending, self._pending = self._pending, []
+        for child in pending:
+            if child.closed:
+                continue
+            self._children.add(child)
+            if child.cancelled:
+                self._stop(child, "cancelled", "Crew process cancelled")
+                continue
             try:
-                line = process.stdout.readline()
-                if line:
-                    print(line.rstrip())
-                    sys.stdout.flush()
-            except:
-                break
-                
-        # Read any remaining output
-        remaining = process.stdout.read()
-        if remaining:
-            print(remaining.rstrip())
-            sys.stdout.flush()
-            
-        process.wait()
-        
-    except Exception as e:
-        error_msg = {
-            "status": "error",
-            "message": f"Failed to start process: {str(e)}",
-            "progress": 0
-        }
-        print(f"data: {json.dumps(error_msg)}")
-        sys.stdout.flush()
+                self._selector.register(child.process.stdout, selectors.EVENT_READ, child)
+            except KeyError:
+                # Already registered
+                pass
+
+    def _select_timeout(self):
+        """Seconds until the next timeout or memory check, or None to wait for output only"""
+        now = time.monotonic()
+        checks = [child.deadline for child in self._children if child.deadline is not None]
+        if self.memory_mb or any(child.memory_mb for child in self._children):
+            checks.append(self._next_memory_check)
+        if not checks:
+            return None
+        return max(0.0, min(checks) - now)
+
+    def _loop(self):
+        while True:
+            self._register_pending()
+            for key, _ in self._selector.select(self._select_timeout()):
+                if key.data is None:
+                    try:
+                        while os.read(self._wake_read, 4096):
+                            pass
+                    except BlockingIOError:
+                        pass
+                    continue
+                self._read(key.data)
+            self._enforce_limits()
+
+    def _read(self, child):
+        try:
+            chunk = os.read(child.process.stdout.fileno(), 65536)
+        except BlockingIOError:
+            return
+        if not chunk:
+            self._close(child)
+            return
+        try:
+            events = child.framer.feed(chunk)
+        except EventTooLarge as e:
+            self._stop(child, "event_too_large", str(e))
+            return
+        if not child.push(events):
+            # The reader is behind: stop reading until it catches up (limits still apply)
+            self._selector.unregister(child.process.stdout)
+
+    def _enforce_limits(self):
+        now = time.monotonic()
+        for child in list(self._children):
+            if child.deadline is not None and now >= child.deadline:
+                self._stop(child, "timeout", f"Crew process timed out after {child.timeout:.0f}s")
+        if now < self._next_memory_check:
+            return
+        self._next_memory_check = now + self.memory_interval
+        for child in list(self._children):
+            if not child.memory_mb:
+                continue
+            rss = rss_mb(child.pid)
+            if rss is None:
+                continue
+            child.peak_mb = max(child.peak_mb or 0, rss)
+            if rss > child.memory_mb:
+                self._stop(child, "memory", f"Crew process exceeded its {child.memory_mb} MB memory limit")
+
+    def _detach(self, child):
+        self._children.discard(child)
+        try:
+            self._selector.unregister(child.process.stdout)
+        except KeyError:
+            # Paused
+            pass
+        child.process.stdout.close()
+
+    def _stop(self, child, reason, message):
+        """Kill a child over a limit; events it already wrote are still delivered"""
+        child.reason = reason
+        child.kill()
+        self._detach(child)
+        child.push([error_event(message)])
+        child.finish(child.process.wait(), reason)
+
+    def _close(self, child):
+        """The child closed its output, normally by exiting"""
+        self._detach(child)
+        try:
+            events = child.framer.close()
+        except EventTooLarge:
+            events = []
+        try:
+            returncode = child.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            child.kill()
+            returncode = child.process.wait()
+        if returncode != 0 and not child.completed:
+            events.append(error_event(f"Crew process exited with code {returncode}"))
+        child.push(events)
+        child.finish(returncode, "exit")
+
+
+def crew_command(requirements, **options):
+    """Command that runs one development job in a child process, writing its SSE events to stdout"""
+    return [sys.executable, os.path.abspath(__file__), "--crew", json.dumps(dict(options, requirements=requirements))]
+
+
+def run_crew_child(params):
+    """Child side of crew_command"""
+    # Keep the real stdout for events; anything else printing (e.g. crewai's verbose output) goes to stderr
+    events = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    from core.executor_client import ExecutorClient, JOB_PARAMS
+    defaults = {"max_iterations": 5, "review_mode": "hybrid", "stream": False, "candidates": 1, "max_inflight": None,
+                "repair_mode": "full", "deploy_mode": "local"}
+    args = [params.get(name, defaults.get(name)) for name in JOB_PARAMS]
+    for update in ExecutorClient().run_crew_process(*args):
+        events.write(update.encode("utf-8"))
+        events.flush()
+
+
+_supervisor = None
+_supervisor_lock = threading.Lock()
+
+
+def get_supervisor():
+    """Return the process-wide supervisor, configured from the environment"""
+    global _supervisor
+    with _supervisor_lock:
+        if _supervisor is None:
+            _supervisor = Supervisor(
+                timeout=float(os.getenv("CREW_CHILD_TIMEOUT", "900")),
+                memory_mb=float(os.getenv("CREW_CHILD_MEMORY_MB", "0")),
+                max_events=int(os.getenv("CREW_CHILD_MAX_EVENTS", "64")),
+                max_event_bytes=int(float(os.getenv("CREW_CHILD_MAX_EVENT_MB", "8")) * 1024 * 1024)
+            )
+        return _supervisor
+
 
 def main():
     """
     Main entry point for streaming handler
     """
+    parser = argparse.ArgumentParser(description="Run crews in child processes and relay their events")
+    parser.add_argument("--requirements", action="append", help="run a crew for these requirements (repeatable)")
+    parser.add_argument("--max-iterations", type=int, default=5)
+    parser.add_argument("--timeout", type=float, help="seconds before a child is killed")
+    parser.add_argument("--memory-mb", type=float, help="resident memory before a child is killed")
+    parser.add_argument("--crew", help=argparse.SUPPRESS)
+    parser.add_argument("command", nargs="*", help="command to run instead of crews (default: main.py)")
+    args = parser.parse_args()
+
+    if args.crew:
+        run_crew_child(json.loads(args.crew))
+        return
+
     # Send initial connection message
     init_msg = {
         "status": "connected",
         "message": "Stream handler connected",
         "progress": 0
     }
-    print(f"data: {json.dumps(init_msg)}")
+    print(f"data: {json.dumps(init_msg)}\n")
     sys.stdout.flush()
-    
-    # Run the main application with streaming
-    stream_subprocess([sys.executable, "main.py"])
+
+    if args.requirements:
+        commands = [crew_command(requirements, max_iterations=args.max_iterations) for requirements in args.requirements]
+    else:
+        commands = [args.command or [sys.executable, "main.py"]]
+    supervisor = get_supervisor()
+    children = [supervisor.spawn(command, args.timeout, args.memory_mb) for command in commands]
+
+    # Events from several children are told apart by their SSE event name
+    output = sys.stdout.buffer
+    output_lock = threading.Lock()
+
+    def relay(index, child):
+        prefix = f"event: child-{index}\n".encode() if len(children) > 1 else b""
+        for event in child.follow():
+            with output_lock:
+                output.write(prefix + event)
+                output.flush()
+
+    threads = [threading.Thread(target=relay, args=(index, child)) for index, child in enumerate(children)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()